@@ -0,0 +1,39 @@
+from django import forms
+from django.core.exceptions import ValidationError
+
+from posts.forms import PostForm
+
+
+class PrefetchedChoiceField(forms.ModelChoiceField):
+    """Выбирает объект из заранее загруженного словаря {pk: объект}
+    вместо отдельного запроса к базе на каждое значение."""
+
+    def __init__(self, objects, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.objects = objects
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            return self.objects[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError(self.error_messages['invalid_choice'],
+                                  code='invalid_choice')
+
+
+class BulkPostForm(PostForm):
+    def __init__(self, *args, groups, **kwargs):
+        super().__init__(*args, **kwargs)
+        field = self.fields['group']
+        self.fields['group'] = PrefetchedChoiceField(
+            groups,
+            queryset=field.queryset,
+            required=field.required,
+            label=field.label,
+        )
+
+    def _get_validation_exclusions(self):
+        # Группа уже найдена среди загруженных заранее, повторная проверка
+        # внешнего ключа моделью стоила бы запроса на каждый пост.
+        return super()._get_validation_exclusions() + ['group']
@@ -0,0 +1,46 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from posts.paginators import CursorPaginator
+
+
+class FeedCursorPagination(BasePagination):
+    """Keyset-пагинация лент тем же CursorPaginator, что и на сайте.
+
+    Параметры сортировки берутся из атрибута cursor_options view.
+    """
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.paginator = CursorPaginator(
+            queryset, settings.POSTS_PER_PAGE,
+            **getattr(view, 'cursor_options', {}))
+        self.page = self.paginator.get_page(
+            request.query_params.get(self.cursor_query_param))
+        return list(self.page)
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_link(self.page.next_cursor)),
+            ('previous', self.get_link(self.page.previous_cursor)),
+            ('results', data),
+        ]))
+
+
+class SearchPagination(PageNumberPagination):
+    """Результаты поиска упорядочены по релевантности, поэтому страницы
+    нумерованные."""
+
+    def get_page_size(self, request):
+        return settings.POSTS_PER_PAGE
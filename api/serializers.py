@@ -0,0 +1,49 @@
+from rest_framework import serializers
+from rest_framework.utils.urls import replace_query_param
+
+from posts.models import Comment, Post
+
+
+class PostSerializer(serializers.ModelSerializer):
+    author = serializers.SlugRelatedField(slug_field='username',
+                                          read_only=True)
+    group = serializers.SlugRelatedField(slug_field='slug', read_only=True)
+    thumbnail = serializers.ImageField(source='image_thumbnail',
+                                       read_only=True)
+
+    class Meta:
+        model = Post
+        fields = ('id', 'text', 'pub_date', 'author', 'group', 'image',
+                  'thumbnail', 'comments_count')
+
+
+class CommentSerializer(serializers.ModelSerializer):
+    author = serializers.SlugRelatedField(slug_field='username',
+                                          read_only=True)
+
+    class Meta:
+        model = Comment
+        fields = ('id', 'author', 'text', 'created')
+
+
+class PostDetailSerializer(PostSerializer):
+    """Пост с первой страницей комментариев из comments_page; следующая
+    страница — по ссылке comments_next."""
+    comments = CommentSerializer(source='comments_page', many=True,
+                                 read_only=True)
+    comments_next = serializers.SerializerMethodField()
+
+    class Meta(PostSerializer.Meta):
+        fields = PostSerializer.Meta.fields + ('comments', 'comments_next')
+
+    def get_comments_next(self, post):
+        cursor = post.comments_page.next_cursor
+        if cursor is None:
+            return None
+        url = self.context['request'].build_absolute_uri()
+        return replace_query_param(url, 'cursor', cursor)
+
+
+class SearchHitSerializer(serializers.Serializer):
+    post = PostSerializer(read_only=True)
+    highlight = serializers.CharField(read_only=True)
@@ -0,0 +1,294 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.search import get_backend
+from posts.task_queue import run_pending
+from posts.timeline import fan_out_post
+
+
+class FeedApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+        self.user_igor = User.objects.create_user(username='Igor')
+        self.user_olga = User.objects.create_user(username='Olga')
+        self.group = Group.objects.create(
+            title='Test Group',
+            slug='group',
+            description='Description',
+        )
+        self.posts = [
+            Post.objects.create(text=f'Пост {number}', author=self.user_igor,
+                                group=self.group)
+            for number in range(3)
+        ]
+        Comment.objects.create(post=self.posts[0], author=self.user_olga,
+                               text='Комментарий')
+
+    def test_feeds(self):
+        """Ленты отдают посты в том же порядке, что и сайт."""
+        expected = [post.id for post in reversed(self.posts)]
+        urls = {
+            'index': reverse('api_posts'),
+            'group': reverse('api_group_posts', args=[self.group.slug]),
+            'profile': reverse('api_profile_posts',
+                               args=[self.user_igor.username]),
+        }
+        for name, url in urls.items():
+            with self.subTest(feed=name):
+                response = self.client.get(url)
+                ids = [post['id'] for post in response.data['results']]
+                msg = f'Лента {name} в API отличается от сайта'
+                self.assertEqual(ids, expected, msg)
+
+    def test_post_detail(self):
+        """Пост отдаётся вместе с комментариями."""
+        post = self.posts[0]
+        response = self.client.get(
+            reverse('api_post', args=[self.user_igor.username, post.id]))
+
+        self.assertEqual(response.data['text'], post.text)
+        self.assertEqual(response.data['author'], self.user_igor.username)
+        self.assertEqual(response.data['comments'][0]['author'],
+                         self.user_olga.username)
+
+    @override_settings(COMMENTS_PER_PAGE=1)
+    def test_post_detail_comment_pages(self):
+        """Комментарии отдаются постранично, и число запросов не зависит
+        от их числа."""
+        post = self.posts[0]
+        url = reverse('api_post', args=[self.user_igor.username, post.id])
+        with CaptureQueriesContext(connection) as expected:
+            self.client.get(url)
+        Comment.objects.create(post=post, author=self.user_igor,
+                               text='Ответ')
+
+        with CaptureQueriesContext(connection) as actual:
+            first = self.client.get(url).data
+        self.assertEqual(len(actual), len(expected))
+        second = self.client.get(first['comments_next']).data
+
+        texts = [comment['text']
+                 for comment in first['comments'] + second['comments']]
+        self.assertEqual(texts, ['Ответ', 'Комментарий'])
+        self.assertIsNone(second['comments_next'])
+
+    def test_unknown_group_and_user(self):
+        """Несуществующие группа и автор дают 404."""
+        for url in (reverse('api_group_posts', args=['unknown']),
+                    reverse('api_profile_posts', args=['unknown'])):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    @override_settings(POSTS_PER_PAGE=2)
+    def test_cursor_pages(self):
+        """Следующая страница берётся по ссылке next."""
+        first = self.client.get(reverse('api_posts')).data
+        second = self.client.get(first['next']).data
+
+        ids = [post['id'] for post in first['results'] + second['results']]
+        msg = 'Курсорные страницы API теряют или повторяют посты'
+        self.assertEqual(ids, [post.id for post in reversed(self.posts)], msg)
+        self.assertIsNone(second['next'])
+        self.assertIsNotNone(second['previous'])
+
+    def test_not_modified(self):
+        """Неизменная лента отвечает 304 без запросов к базе, а новый пост
+        меняет ETag."""
+        url = reverse('api_posts')
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(text='Новый пост', author=self.user_olga)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        msg = 'Лента с новым постом отвечает 304'
+        self.assertEqual(response.status_code, 200, msg)
+
+    def test_follow_feed(self):
+        """Лента подписок доступна по токену и поддерживает ETag."""
+        url = reverse('api_follow_posts')
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+        Follow.objects.create(user=self.user_olga, author=self.user_igor)
+        token = Token.objects.create(user=self.user_olga)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        post = Post.objects.create(text='Пост для подписчиков',
+                                   author=self.user_igor)
+        fan_out_post(post)
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['results'][0]['id'], post.id)
+
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+        Comment.objects.create(post=post, author=self.user_olga, text='Да')
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        msg = 'Новый комментарий не меняет ETag ленты подписок'
+        self.assertEqual(changed.status_code, 200, msg)
+
+    @override_settings(TIMELINE_FAN_OUT_LIMIT=0)
+    def test_follow_feed_etag_is_read_only(self):
+        """Проверка ETag ленты с популярным автором ничего не пишет."""
+        Follow.objects.create(user=self.user_olga, author=self.user_igor)
+        self.client.force_authenticate(self.user_olga)
+        url = reverse('api_follow_posts')
+        etag = self.client.get(url)['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        writes = [query['sql'] for query in queries
+                  if not query['sql'].startswith('SELECT')]
+        self.assertEqual(writes, [], 'Проверка ETag пишет в базу')
+
+
+class BulkApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user_igor = User.objects.create_user(username='Igor')
+        self.user_olga = User.objects.create_user(username='Olga')
+        self.group = Group.objects.create(
+            title='Test Group',
+            slug='group',
+            description='Description',
+        )
+        self.client = APIClient()
+        token = Token.objects.create(user=self.user_igor)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def post(self, name, items):
+        return self.client.post(reverse(name), items, format='json')
+
+    def test_token_required(self):
+        """Пакетное API доступно только по токену."""
+        client = APIClient()
+        response = client.post(reverse('api_posts_bulk'), [], format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_posts(self):
+        """Посты пачки проверяются правилами формы, ошибки возвращаются
+        по каждому элементу, а число запросов не зависит от размера
+        пачки."""
+        Follow.objects.create(user=self.user_olga, author=self.user_igor)
+        items = [
+            {'text': 'Первый', 'group': self.group.id},
+            {'text': ''},
+            {'text': 'Третий', 'group': 100500},
+            {'text': 'Четвёртый'},
+        ]
+        with self.assertNumQueries(16), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.post('api_posts_bulk', items)
+
+        self.assertEqual(response.status_code, 207)
+        results = response.data['results']
+        self.assertEqual(set(results[1]['errors']), {'text'})
+        self.assertEqual(set(results[2]['errors']), {'group'})
+        first = Post.objects.get(pk=results[0]['id'])
+        self.assertEqual((first.text, first.group), ('Первый', self.group))
+        self.assertEqual(Post.objects.get(pk=results[3]['id']).text,
+                         'Четвёртый')
+
+        self.user_igor.counters.refresh_from_db()
+        msg = 'Пакетное создание не обновляет счётчик постов'
+        self.assertEqual(self.user_igor.counters.posts_count, 2, msg)
+        msg = 'Ленты подписчиков заполняются в запросе'
+        self.assertEqual(self.user_olga.timeline.count(), 0, msg)
+
+        self.assertEqual(run_pending(), 2)
+        msg = 'Посты пачки не попадают в ленту подписчиков'
+        self.assertEqual(self.user_olga.timeline.count(), 2, msg)
+        msg = 'Посты пачки не попадают в поиск'
+        self.assertEqual(get_backend().count('четвёртый'), 1, msg)
+
+    def test_comments(self):
+        """Комментарии к несуществующим постам не создаются, счётчик
+        поста растёт на число созданных."""
+        post = Post.objects.create(text='Пост', author=self.user_olga)
+        response = self.post('api_comments_bulk', [
+            {'post': post.id, 'text': 'Первый'},
+            {'post': post.id, 'text': 'Второй'},
+            {'post': 100500, 'text': 'Мимо'},
+        ])
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(set(response.data['results'][2]['errors']),
+                         {'post'})
+        post.refresh_from_db()
+        msg = 'Пакетное создание не обновляет счётчик комментариев'
+        self.assertEqual(post.comments_count, 2, msg)
+        self.assertEqual(post.comments.count(), 2)
+
+    def test_follows(self):
+        """Подписки пачки создаются один раз и доносят посты в ленту."""
+        Post.objects.create(text='Пост', author=self.user_olga)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post('api_follows_bulk', [
+                {'author': 'Olga'},
+                {'author': 'Olga'},
+                {'author': 'Igor'},
+                {'author': 'Nobody'},
+            ])
+
+        results = response.data['results']
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(
+            Follow.objects.get(user=self.user_igor).pk, results[0]['id'])
+        for result in results[1:]:
+            self.assertIn('author', result['errors'])
+        self.user_olga.counters.refresh_from_db()
+        self.assertEqual(self.user_olga.counters.followers_count, 1)
+        self.assertEqual(self.user_igor.timeline.count(), 0)
+        run_pending()
+        self.assertEqual(self.user_igor.timeline.count(), 1)
+
+    def test_follows_author_not_string(self):
+        """Автор не строкой — ошибка элемента, а не всего запроса."""
+        response = self.post('api_follows_bulk', [
+            {'author': 'Olga'},
+            {'author': ['Olga']},
+            {'author': {'username': 'Olga'}},
+        ])
+
+        results = response.data['results']
+        self.assertEqual(response.status_code, 207)
+        for result in results[1:]:
+            self.assertEqual(result['errors']['author'][0]['code'],
+                             'invalid')
+
+    def test_invalid_body(self):
+        """Тело не из массива объектов отклоняется целиком."""
+        for body in ({'text': 'Не массив'}, ['строка']):
+            with self.subTest(body=body):
+                response = self.post('api_posts_bulk', body)
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Post.objects.exists())
+
+
+class SearchApiTest(TestCase):
+    def test_search(self):
+        """API поиска отдаёт посты с подсвеченными совпадениями."""
+        user = User.objects.create_user(username='Igor')
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(text='Кот спит', author=user)
+            Post.objects.create(text='Собака гуляет', author=user)
+        run_pending()
+
+        response = APIClient().get(reverse('api_search'), {'q': 'кот'})
+
+        results = response.data['results']
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(results[0]['post']['id'], post.id)
+        self.assertEqual(results[0]['highlight'], '<mark>Кот</mark> спит')
@@ -0,0 +1,22 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('posts/', views.PostList.as_view(), name='api_posts'),
+    path('posts/bulk/', views.BulkPostCreate.as_view(),
+         name='api_posts_bulk'),
+    path('comments/bulk/', views.BulkCommentCreate.as_view(),
+         name='api_comments_bulk'),
+    path('follows/bulk/', views.BulkFollowCreate.as_view(),
+         name='api_follows_bulk'),
+    path('group/<slug:slug>/posts/', views.GroupPostList.as_view(),
+         name='api_group_posts'),
+    path('search/', views.PostSearch.as_view(), name='api_search'),
+    path('follow/posts/', views.FollowPostList.as_view(),
+         name='api_follow_posts'),
+    path('users/<str:username>/posts/', views.ProfilePostList.as_view(),
+         name='api_profile_posts'),
+    path('users/<str:username>/posts/<int:post_id>/',
+         views.PostDetail.as_view(), name='api_post'),
+]
@@ -0,0 +1,291 @@
+import hashlib
+
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from rest_framework import generics, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from posts.bulk import create_comments, create_follows, create_posts
+from posts.caching import get_generation, group_namespace, profile_namespace
+from posts.forms import CommentForm
+from posts.models import Follow, Group, Post, User
+from posts.search import get_backend
+from posts.timeline import (TIMELINE_CURSOR_KEYS, TIMELINE_ORDERING,
+                            timeline_posts)
+from posts.views import comments_page
+
+from .forms import BulkPostForm
+from .pagination import FeedCursorPagination, SearchPagination
+from .serializers import (PostDetailSerializer, PostSerializer,
+                          SearchHitSerializer)
+
+
+class ConditionalGetMixin:
+    """Отвечает 304 на If-None-Match, не сериализуя ответ.
+
+    ETag строится из адреса запроса, формата ответа и списка, который
+    возвращает метод get_etag_parts() view.
+    """
+
+    def get_etag(self):
+        parts = [
+            self.request.get_full_path(),
+            self.request.accepted_renderer.format,
+            *self.get_etag_parts(),
+        ]
+        digest = hashlib.md5(':'.join(map(str, parts)).encode())
+        return quote_etag(digest.hexdigest())
+
+    def get(self, request, *args, **kwargs):
+        etag = self.get_etag()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        response['ETag'] = etag
+        return response
+
+
+class NamespacedFeedMixin(ConditionalGetMixin):
+    """ETag ленты меняется вместе с поколением кэша её страниц, поэтому
+    проверка неизменной ленты не обращается к базе.
+
+    namespace — пространство имён кэша ленты или, если задан
+    namespace_kwarg, функция, которая строит его из этого аргумента
+    адреса.
+    """
+    namespace = 'index'
+    namespace_kwarg = None
+
+    def get_etag_parts(self):
+        namespace = self.namespace
+        if self.namespace_kwarg is not None:
+            namespace = namespace(self.kwargs[self.namespace_kwarg])
+        return [get_generation(namespace)]
+
+
+class PostList(NamespacedFeedMixin, generics.ListAPIView):
+    serializer_class = PostSerializer
+    pagination_class = FeedCursorPagination
+
+    def get_queryset(self):
+        return Post.objects.feed()
+
+
+class GroupPostList(PostList):
+    namespace = staticmethod(group_namespace)
+    namespace_kwarg = 'slug'
+
+    def get_queryset(self):
+        group = get_object_or_404(Group, slug=self.kwargs['slug'])
+        return Post.objects.feed().filter(group=group)
+
+
+class ProfilePostList(PostList):
+    namespace = staticmethod(profile_namespace)
+    namespace_kwarg = 'username'
+
+    def get_queryset(self):
+        author = get_object_or_404(User, username=self.kwargs['username'])
+        return Post.objects.feed().filter(author=author)
+
+
+class PostDetail(NamespacedFeedMixin, generics.RetrieveAPIView):
+    serializer_class = PostDetailSerializer
+    lookup_url_kwarg = 'post_id'
+    # Комментарии сбрасывают поколение профиля автора поста.
+    namespace = staticmethod(profile_namespace)
+    namespace_kwarg = 'username'
+
+    def get_queryset(self):
+        return Post.objects.feed().filter(
+            author__username=self.kwargs['username'])
+
+    def get_object(self):
+        post = super().get_object()
+        # Комментарии постранично, как на странице поста: ответ стоит
+        # одинаково при любом их числе.
+        post.comments_page = comments_page(self.request, post.id)
+        return post
+
+
+class FollowPostList(ConditionalGetMixin, generics.ListAPIView):
+    """Лента подписок своя у каждого читателя, поэтому ETag считается
+    по версиям постов страницы: запрос к базе есть, сериализации нет."""
+    serializer_class = PostSerializer
+    pagination_class = FeedCursorPagination
+    permission_classes = [IsAuthenticated]
+    cursor_options = {
+        'ordering': TIMELINE_ORDERING,
+        'keys': TIMELINE_CURSOR_KEYS,
+    }
+
+    def get_queryset(self):
+        return timeline_posts(self.request.user)
+
+    def get_etag_parts(self):
+        self.page_posts = self.paginate_queryset(self.get_queryset())
+        page = self.paginator.page
+        return [
+            self.request.user.pk,
+            page.has_next(),
+            page.has_previous(),
+            *[(post.pk, post.card_version) for post in self.page_posts],
+        ]
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer(self.page_posts, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class PostSearch(generics.ListAPIView):
+    serializer_class = SearchHitSerializer
+    pagination_class = SearchPagination
+
+    def get_queryset(self):
+        query = self.request.query_params.get('q', '').strip()
+        return get_backend().search(query)
+
+
+def _id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _ids(values):
+    return {_id(value) for value in values} - {None}
+
+
+def _username(value):
+    return value if isinstance(value, str) else None
+
+
+def _error(field, message, code):
+    return {field: [{'message': message, 'code': code}]}
+
+
+class BulkCreateView(APIView):
+    """Создаёт объекты из массива в теле запроса.
+
+    Каждый элемент проверяется отдельно, все прошедшие проверку
+    сохраняются одной транзакцией. results[i] описывает i-й элемент:
+    {'id': ...} для созданного объекта или {'errors': ...}.
+
+    validate(user, items) возвращает для каждого элемента пару (объект,
+    ошибки), create(user, objects) сохраняет объекты пачкой.
+    """
+    permission_classes = [IsAuthenticated]
+    validate = None
+    create = None
+
+    def post(self, request):
+        items = request.data
+        if (not isinstance(items, list)
+                or not all(isinstance(item, dict) for item in items)):
+            return Response({'detail': 'Ожидается массив объектов.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.API_BULK_MAX_ITEMS:
+            return Response(
+                {'detail': 'Не больше {} объектов за запрос.'.format(
+                    settings.API_BULK_MAX_ITEMS)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        validated = self.validate(request.user, items)
+        objects = [obj for obj, errors in validated if obj is not None]
+        if objects:
+            self.create(request.user, objects)
+
+        results = [
+            {'id': obj.pk} if obj is not None else {'errors': errors}
+            for obj, errors in validated
+        ]
+        if len(objects) == len(items):
+            code = status.HTTP_201_CREATED
+        elif objects:
+            code = status.HTTP_207_MULTI_STATUS
+        else:
+            code = status.HTTP_400_BAD_REQUEST
+        return Response({'results': results}, status=code)
+
+
+def validate_posts(user, items):
+    groups = Group.objects.in_bulk(
+        _ids(item.get('group') for item in items))
+    validated = []
+    for item in items:
+        form = BulkPostForm(data=item, groups=groups)
+        if form.is_valid():
+            validated.append((form.save(commit=False), None))
+        else:
+            validated.append((None, form.errors.get_json_data()))
+    return validated
+
+
+def validate_comments(user, items):
+    posts = Post.objects.in_bulk(
+        _ids(item.get('post') for item in items))
+    validated = []
+    for item in items:
+        form = CommentForm(data=item)
+        errors = {}
+        if not form.is_valid():
+            errors.update(form.errors.get_json_data())
+        post = posts.get(_id(item.get('post')))
+        if post is None:
+            errors.update(_error('post', 'Пост не найден.', 'invalid'))
+        if errors:
+            validated.append((None, errors))
+            continue
+        comment = form.save(commit=False)
+        comment.post = post
+        validated.append((comment, None))
+    return validated
+
+
+def validate_follows(user, items):
+    usernames = {_username(item.get('author')) for item in items} - {None}
+    authors = {
+        author.username: author
+        for author in User.objects.filter(username__in=usernames)
+    }
+    followed = set(Follow.objects.filter(
+        user=user, author__in=authors.values(),
+    ).values_list('author_id', flat=True))
+
+    validated = []
+    for item in items:
+        author = authors.get(_username(item.get('author')))
+        if author is None:
+            error = _error('author', 'Пользователь не найден.', 'invalid')
+        elif author == user:
+            error = _error('author', 'Нельзя подписаться на себя.',
+                           'self_follow')
+        elif author.id in followed:
+            error = _error('author', 'Подписка уже есть.', 'unique')
+        else:
+            followed.add(author.id)
+            validated.append((Follow(user=user, author=author), None))
+            continue
+        validated.append((None, error))
+    return validated
+
+
+class BulkPostCreate(BulkCreateView):
+    validate = staticmethod(validate_posts)
+    create = staticmethod(create_posts)
+
+
+class BulkCommentCreate(BulkCreateView):
+    validate = staticmethod(validate_comments)
+    create = staticmethod(create_comments)
+
+
+class BulkFollowCreate(BulkCreateView):
+    validate = staticmethod(validate_follows)
+    create = staticmethod(create_follows)
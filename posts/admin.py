@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Group, Post
+from .models import Group, Post, Task
+from .search import get_backend
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -9,6 +10,11 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return get_backend().filter(queryset, search_term), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('pk', 'title', 'slug', 'description')
@@ -16,5 +22,12 @@ class GroupAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'priority', 'run_at', 'attempts')
+    list_filter = ('name',)
+    empty_value_display = '-пусто-'
+
+
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Post, PostAdmin)
+admin.site.register(Task, TaskAdmin)
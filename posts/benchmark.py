@@ -0,0 +1,136 @@
+"""Замеры страниц лент на синтетических данных.
+
+Каждая страница запрашивается несколько раз на разной глубине ленты:
+для нумерованных страниц это ?page=N, для курсорных — страница, до
+которой дошли по ссылкам «Следующая». Запросы к базе считаются
+CaptureQueriesContext на всех соединениях, включая реплики и
+соединения потоков gather_queries.
+"""
+import re
+import statistics
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+NEXT_CURSOR = re.compile(r'href="\?cursor=([^"]+)">Следующая')
+CURRENT_PAGE = re.compile(
+    r'class="page-item active">\s*<span class="page-link">(\d+)')
+PAGE_VIEWS = ('index', 'group_posts', 'profile', 'follow_index')
+PAGINATIONS = ('pages', 'cursor')
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def view_urls(dataset):
+    return {
+        'index': reverse('index'),
+        'group_posts': reverse('group', args=[dataset.group.slug]),
+        'profile': reverse('profile', args=[dataset.author.username]),
+        'follow_index': reverse('follow_index'),
+        'post_view': reverse('post', args=[dataset.post.author.username,
+                                           dataset.post.id]),
+    }
+
+
+def get(client, url):
+    """Ответ и число запросов к базе, которые он сделал. Потоки
+    gather_queries открывают свои соединения уже во время запроса,
+    поэтому их запросы ловятся по сигналу connection_created."""
+    with ExitStack() as stack:
+        captured = [stack.enter_context(CaptureQueriesContext(connection))
+                    for connection in connections.all()]
+
+        def capture(sender, connection, **kwargs):
+            captured.append(
+                stack.enter_context(CaptureQueriesContext(connection)))
+
+        connection_created.connect(capture)
+        stack.callback(connection_created.disconnect, capture)
+        response = client.get(url)
+    return response, sum(len(queries) for queries in captured)
+
+
+def measure(client, url, repeat, warmup=2):
+    for _ in range(warmup):
+        client.get(url)
+    latencies, queries = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response, count = get(client, url)
+        latencies.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} ответил {response.status_code}')
+        queries.append(count)
+    return {
+        'p50': percentile(latencies, 0.5) * 1000,
+        'p90': percentile(latencies, 0.9) * 1000,
+        'p99': percentile(latencies, 0.99) * 1000,
+        'mean': statistics.mean(latencies) * 1000,
+        'queries': max(queries),
+    }
+
+
+def depth_url(client, url, pagination, depth):
+    """Адрес страницы номер depth или None, если лента короче."""
+    if pagination == 'pages':
+        page_url = f'{url}?page={depth}'
+        match = CURRENT_PAGE.search(client.get(page_url).content.decode())
+        number = int(match.group(1)) if match else 1
+        # Номер за концом ленты отдаёт последнюю страницу.
+        return page_url if number == depth else None
+    page_url = url
+    for _ in range(depth - 1):
+        match = NEXT_CURSOR.search(client.get(page_url).content.decode())
+        if match is None:
+            return None
+        page_url = f'{url}?cursor={match.group(1)}'
+    return page_url
+
+
+def run(client, dataset, depths=(1, 10, 50), repeat=20, warmup=2):
+    """Результаты вида {'index:pages:10': {'p50': мс, ..., 'queries': N}}.
+    client должен быть авторизован как dataset.reader: страницы
+    авторизованных не берутся из кэша страниц."""
+    urls = view_urls(dataset)
+    results = {
+        'post_view': measure(client, urls['post_view'], repeat, warmup),
+    }
+    for pagination in PAGINATIONS:
+        with override_settings(FEED_PAGINATION=pagination):
+            for view in PAGE_VIEWS:
+                for depth in depths:
+                    url = depth_url(client, urls[view], pagination, depth)
+                    if url is None:
+                        continue
+                    results[f'{view}:{pagination}:{depth}'] = measure(
+                        client, url, repeat, warmup)
+    return results
+
+
+def compare(results, baseline, threshold=0.25, min_delta=2.0):
+    """Регрессии относительно baseline: задержка выросла больше чем на
+    долю threshold и больше чем на min_delta мс или выросло число
+    запросов. Возвращает список строк с описанием."""
+    regressions = []
+    for key, old in sorted(baseline.items()):
+        new = results.get(key)
+        if new is None:
+            continue
+        for metric in ('p50', 'p90'):
+            if (new[metric] > old[metric] * (1 + threshold)
+                    and new[metric] - old[metric] > min_delta):
+                regressions.append(
+                    f'{key} {metric}: {old[metric]:.1f} → '
+                    f'{new[metric]:.1f} мс')
+        if new['queries'] > old['queries']:
+            regressions.append(
+                f'{key} queries: {old["queries"]} → {new["queries"]}')
+    return regressions
@@ -0,0 +1,86 @@
+"""Пакетное создание постов, комментариев и подписок.
+
+bulk_create не вызывает сигналы, поэтому счётчики, лента подписок и
+поколения кэша страниц обновляются здесь сразу для всей пачки. Раскладка
+постов по лентам, поисковый индекс и посты новых подписок в ленте, как
+и для одного объекта, ставятся в очередь задач одной задачей на пачку.
+"""
+from collections import Counter
+from functools import partial
+
+from django.db import connection, transaction
+from django.db.models import Max
+
+from .caching import invalidate_posts, invalidate_profiles
+from .counters import (change_comments_count, change_group_posts_count,
+                       increase_user_counters, increase_users_counters)
+from .group_feed import groups_changed
+from .live import publish_posts
+from .models import Comment, Follow, Post
+from .tasks import backfill_timeline, fan_out, index_posts
+
+BATCH_SIZE = 500
+
+
+def _bulk_create(model, objects, **owner):
+    """bulk_create, после которого у объектов есть pk.
+
+    SQLite не возвращает ключи вставленных строк, поэтому они читаются
+    заново: все объекты пачки принадлежат одному владельцу, и внутри
+    транзакции его строки с большим pk — только что вставленные.
+    """
+    if connection.features.can_return_rows_from_bulk_insert:
+        return model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+
+    rows = model.objects.filter(**owner)
+    last_pk = rows.aggregate(last=Max('pk'))['last'] or 0
+    model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+    pks = rows.filter(pk__gt=last_pk).order_by('pk').values_list(
+        'pk', flat=True)
+    for obj, pk in zip(objects, pks):
+        obj.pk = pk
+    return objects
+
+
+def create_posts(author, posts):
+    for post in posts:
+        post.author = author
+    with transaction.atomic():
+        _bulk_create(Post, posts, author=author)
+        increase_user_counters(author.id, posts_count=len(posts))
+        group_counts = Counter(post.group_id for post in posts)
+        for group_id, count in group_counts.items():
+            change_group_posts_count(group_id, count)
+        post_ids = [post.pk for post in posts]
+        fan_out.enqueue(*post_ids)
+        index_posts.enqueue(*post_ids)
+        transaction.on_commit(partial(publish_posts, post_ids))
+    groups_changed(group_counts)
+    invalidate_posts(posts)
+    return posts
+
+
+def create_comments(author, comments):
+    for comment in comments:
+        comment.author = author
+    with transaction.atomic():
+        _bulk_create(Comment, comments, author=author)
+        counts = Counter(comment.post_id for comment in comments)
+        for post_id, count in counts.items():
+            change_comments_count(post_id, count)
+    invalidate_posts({comment.post for comment in comments})
+    return comments
+
+
+def create_follows(user, follows):
+    authors = [follow.author for follow in follows]
+    for follow in follows:
+        follow.user = user
+    with transaction.atomic():
+        _bulk_create(Follow, follows, user=user)
+        increase_user_counters(user.id, following_count=len(authors))
+        increase_users_counters(
+            [author.id for author in authors], followers_count=1)
+        backfill_timeline.enqueue(user.id, *[author.id for author in authors])
+    invalidate_profiles(user.id, *[author.id for author in authors])
+    return follows
@@ -0,0 +1,136 @@
+"""Кэш целых страниц для гостей.
+
+Ключ страницы включает поколение её пространства имён (лента, группа,
+профиль). При изменении данных поколение увеличивается, и все старые
+страницы пространства становятся недостижимыми без перебора ключей.
+"""
+import asyncio
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from yatube.replicas import primary_reads
+
+from .models import Group, User
+
+
+def _generation_key(namespace):
+    return f'page-generation:{namespace}'
+
+
+def get_generation(namespace):
+    key = _generation_key(namespace)
+    generation = cache.get(key)
+    if generation is None:
+        # Начинаем со случайного числа, чтобы после вытеснения счётчика
+        # не попасть в поколение, под которым уже лежат старые страницы.
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def _bump_generations(namespaces):
+    for namespace in namespaces:
+        try:
+            cache.incr(_generation_key(namespace))
+        except ValueError:
+            pass
+
+
+def invalidate(*namespaces):
+    """Сдвигает поколения после фиксации транзакции: иначе гость успел
+    бы собрать страницу из старых данных и положить её под новым
+    поколением."""
+    namespaces = set(namespaces)
+    transaction.on_commit(lambda: _bump_generations(namespaces))
+
+
+def group_namespace(slug):
+    return f'group:{slug}'
+
+
+def profile_namespace(username):
+    return f'profile:{username}'
+
+
+def invalidate_posts(posts, previous_group_ids=()):
+    group_ids = {post.group_id for post in posts} | set(previous_group_ids)
+    slugs = Group.objects.filter(pk__in=group_ids - {None}).values_list(
+        'slug', flat=True)
+    usernames = User.objects.filter(
+        pk__in={post.author_id for post in posts},
+    ).values_list('username', flat=True)
+    invalidate(
+        'index',
+        'hot',
+        *[profile_namespace(username) for username in usernames],
+        *[group_namespace(slug) for slug in slugs],
+    )
+
+
+def invalidate_post(post, previous_group_id=None):
+    invalidate_posts([post], [previous_group_id])
+
+
+def invalidate_profiles(*user_ids):
+    usernames = User.objects.filter(pk__in=user_ids).values_list(
+        'username', flat=True)
+    invalidate(*[profile_namespace(username) for username in usernames])
+
+
+def _page_key(request, page_namespace):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'page:{page_namespace}:{get_generation(page_namespace)}:{path}'
+
+
+def _cached_page(request, namespace, kwargs):
+    """Возвращает ключ и закэшированный ответ; ключ None, если ответ
+    кэшировать нельзя."""
+    if request.method != 'GET' or request.user.is_authenticated:
+        return None, None
+    key = _page_key(request, namespace(**kwargs))
+    return key, cache.get(key)
+
+
+def _store_page(key, response):
+    if response.status_code == 200 and not response.streaming:
+        cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+
+
+def cache_anonymous_page(namespace):
+    """Кэширует ответы гостям; namespace(**kwargs) даёт пространство имён
+    страницы по аргументам view. Подходит и для async view.
+
+    Страница для кэша собирается с основной базы, а не с реплики."""
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                key, response = await sync_to_async(_cached_page)(
+                    request, namespace, kwargs)
+                if response is None and key is None:
+                    response = await view(request, *args, **kwargs)
+                elif response is None:
+                    with primary_reads():
+                        response = await view(request, *args, **kwargs)
+                    await sync_to_async(_store_page)(key, response)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key, response = _cached_page(request, namespace, kwargs)
+            if response is None and key is None:
+                response = view(request, *args, **kwargs)
+            elif response is None:
+                with primary_reads():
+                    response = view(request, *args, **kwargs)
+                _store_page(key, response)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,32 @@
+"""Параллельное выполнение независимых запросов из async view.
+
+Каждая функция выполняется в своём потоке со своим соединением с базой,
+поэтому запросы страницы не ждут друг друга. Соединения закрываются по
+правилам CONN_MAX_AGE, как после обычного запроса.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connection
+
+
+def _with_connection_cleanup(function):
+    def wrapper():
+        try:
+            return function()
+        finally:
+            close_old_connections()
+    return wrapper
+
+
+async def gather_queries(*functions):
+    """Выполняет функции без аргументов и возвращает их результаты."""
+    # У базы в памяти своя копия на каждое соединение (в тестах — общая,
+    # но с блокировками таблиц), поэтому с ней работаем в одном потоке.
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        return [await sync_to_async(function)() for function in functions]
+    return await asyncio.gather(*[
+        sync_to_async(_with_connection_cleanup(function),
+                      thread_sensitive=False)()
+        for function in functions
+    ])
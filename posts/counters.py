@@ -0,0 +1,93 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Group, Post, UserCounters
+
+
+def change_user_counters(user_id, **deltas):
+    """Атомарно сдвигает счётчики пользователя, возвращает число строк."""
+    changes = {name: F(name) + delta for name, delta in deltas.items()}
+    # Не уводим счётчик в минус, если он уже разошёлся с данными.
+    limits = {
+        f'{name}__gte': -delta for name, delta in deltas.items() if delta < 0
+    }
+    return UserCounters.objects.filter(user_id=user_id, **limits).update(
+        **changes)
+
+
+def increase_user_counters(user_id, **deltas):
+    if not change_user_counters(user_id, **deltas):
+        recount_users(UserCounters.objects.filter(user_id=user_id),
+                      create_user_ids=[user_id])
+
+
+def increase_users_counters(user_ids, **deltas):
+    """Увеличивает счётчики сразу нескольких пользователей одним UPDATE."""
+    user_ids = set(user_ids)
+    changes = {name: F(name) + delta for name, delta in deltas.items()}
+    counters = UserCounters.objects.filter(user_id__in=user_ids)
+    if counters.update(**changes) < len(user_ids):
+        recount_users(counters, create_user_ids=user_ids)
+
+
+def change_comments_count(post_id, delta):
+    limits = {'comments_count__gte': -delta} if delta < 0 else {}
+    Post.objects.filter(pk=post_id, **limits).update(
+        comments_count=F('comments_count') + delta,
+        card_version=F('card_version') + 1,
+    )
+
+
+def change_group_posts_count(group_id, delta):
+    if group_id is None:
+        return
+    limits = {'posts_count__gte': -delta} if delta < 0 else {}
+    Group.objects.filter(pk=group_id, **limits).update(
+        posts_count=F('posts_count') + delta)
+
+
+def _count(queryset, field):
+    counts = (
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def actual_user_counts():
+    return {
+        'followers_count': _count(Follow.objects.all(), 'author'),
+        'following_count': _count(Follow.objects.all(), 'user'),
+        'posts_count': _count(Post.objects.all(), 'author'),
+    }
+
+
+def actual_post_counts():
+    return {
+        'comments_count': _count(Comment.objects.all(), 'post'),
+    }
+
+
+def actual_group_counts():
+    return {
+        'posts_count': _count(Post.objects.all(), 'group'),
+    }
+
+
+def recount_users(queryset, create_user_ids=()):
+    UserCounters.objects.bulk_create(
+        [UserCounters(user_id=user_id) for user_id in create_user_ids],
+        ignore_conflicts=True,
+    )
+    return queryset.update(**actual_user_counts())
+
+
+def recount_posts(queryset):
+    return queryset.update(**actual_post_counts())
+
+
+def recount_groups(queryset):
+    return queryset.update(**actual_group_counts())
@@ -1,5 +1,6 @@
 from django import forms
 
+from .images import prepare_image
 from .models import Comment, Post
 
 
@@ -18,6 +19,13 @@ class PostForm(forms.ModelForm):
             'image': 'Выберите файл изображения',
         }
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        # Новая загрузка несёт открытую Pillow картинку в атрибуте image.
+        if image and hasattr(image, 'image'):
+            return prepare_image(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,137 @@
+"""Шапка группы и кольцо её последних постов в кэше.
+
+Страница группы берёт из кэша шапку (название, описание, число записей)
+по slug и номера GROUP_RECENT_POSTS последних постов группы. Страницы
+в пределах кольца собираются по этим номерам одним запросом по
+первичному ключу, а число записей для пагинатора берётся из шапки
+вместо COUNT(*). Более глубокие страницы читаются из базы как обычно.
+
+Кольцо перечитывается одним запросом по индексу (group, pub_date)
+после коммита транзакции, в которой пост создан, перенесён в другую
+группу или удалён; шапка в этот момент сбрасывается. Шапку и кольцо
+читают с основной базы, чтобы не закэшировать отставшую реплику.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import transaction
+
+from yatube.replicas import primary_reads
+
+from .models import Group, Post
+from .paginators import CursorPage, CursorPaginator
+
+HEADER_FIELDS = ('id', 'title', 'slug', 'description', 'posts_count')
+
+
+def _header_key(slug):
+    return f'group-header:{slug}'
+
+
+def _recent_key(group_id):
+    return f'group-recent:{group_id}'
+
+
+def group_header(slug):
+    """Группа с полями шапки или None, если такой группы нет."""
+    key = _header_key(slug)
+    fields = cache.get(key)
+    if fields is None:
+        with primary_reads():
+            fields = Group.objects.filter(slug=slug).values(
+                *HEADER_FIELDS).first()
+        if fields is None:
+            return None
+        cache.set(key, fields, settings.GROUP_CACHE_TIMEOUT)
+    return Group(**fields)
+
+
+def forget_headers(*slugs):
+    cache.delete_many([_header_key(slug) for slug in slugs])
+
+
+def refresh_recent(group_id):
+    with primary_reads():
+        ids = list(Post.objects.filter(group_id=group_id).order_by(
+            *Post._meta.ordering).values_list(
+            'id', flat=True)[:settings.GROUP_RECENT_POSTS])
+    cache.set(_recent_key(group_id), ids, settings.GROUP_CACHE_TIMEOUT)
+    return ids
+
+
+def recent_post_ids(group_id):
+    ids = cache.get(_recent_key(group_id))
+    if ids is None:
+        ids = refresh_recent(group_id)
+    return ids
+
+
+def _refresh_groups(group_ids):
+    for group_id in group_ids:
+        refresh_recent(group_id)
+    forget_headers(*Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True))
+
+
+def groups_changed(group_ids):
+    """Посты групп созданы, перенесены или удалены. Кольца и шапки
+    обновляются после коммита: внутри транзакции писателя кольцо
+    запомнило бы посты, которые ещё могут откатиться, а читатель успел
+    бы положить в кэш шапку со старым числом записей."""
+    group_ids = set(group_ids) - {None}
+    if group_ids:
+        transaction.on_commit(lambda: _refresh_groups(group_ids))
+
+
+def recent_posts(ids):
+    # Без условия на группу: иначе SQLite читает индекс (group, pub_date)
+    # по всей группе, а не ищет посты по первичному ключу. Кольцо
+    # упорядочено как лента, порядок queryset тот же.
+    return Post.objects.feed().filter(pk__in=ids)
+
+
+def forget_group(group):
+    forget_headers(group.slug)
+    cache.delete(_recent_key(group.id))
+
+
+class RecentPaginator(Paginator):
+    """Нумерованные страницы ленты группы. Число записей известно из
+    шапки, а посты страниц внутри кольца читаются по номерам."""
+
+    def __init__(self, object_list, per_page, count, recent_ids):
+        super().__init__(object_list, per_page)
+        # Счётчик мог разойтись с данными, кольцо точнее.
+        self.count = max(count, len(recent_ids))
+        self.recent_ids = recent_ids
+        self.complete = len(recent_ids) < settings.GROUP_RECENT_POSTS
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if top > len(self.recent_ids) and not self.complete:
+            return super().page(number)
+        return self._get_page(recent_posts(self.recent_ids[bottom:top]),
+                              number, self)
+
+
+def group_page(request, group):
+    """Страница и пагинатор ленты группы, как у paginate()."""
+    post_list = Post.objects.feed().filter(group_id=group.id)
+    recent_ids = recent_post_ids(group.id)
+    per_page = settings.POSTS_PER_PAGE
+    cursor = request.GET.get('cursor')
+    if cursor is None and settings.FEED_PAGINATION != 'cursor':
+        paginator = RecentPaginator(post_list, per_page, group.posts_count,
+                                    recent_ids)
+        return paginator.get_page(request.GET.get('page')), paginator
+
+    paginator = CursorPaginator(post_list, per_page)
+    if cursor:
+        return paginator.get_page(cursor), paginator
+    # Кольцо длиннее страницы, поэтому следующая страница есть, если
+    # в кольце больше постов, чем помещается на первую.
+    page = CursorPage(list(recent_posts(recent_ids[:per_page])),
+                      paginator, len(recent_ids) > per_page, False)
+    return page, paginator
@@ -0,0 +1,72 @@
+"""Проверка и уменьшение загружаемых картинок.
+
+Большие загрузки Django пишет во временный файл кусками
+(FILE_UPLOAD_MAX_MEMORY_SIZE), а здесь картинка открывается только по
+заголовку: размеры проверяются до декодирования, а JPEG декодируется
+сразу в уменьшенном масштабе через Image.draft().
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+# Pillow сам отказывается открывать картинки больше удвоенного лимита.
+Image.MAX_IMAGE_PIXELS = settings.IMAGE_MAX_PIXELS
+
+
+def _needs_reencoding(image, size):
+    return (max(image.size) > settings.IMAGE_MAX_DIMENSION
+            or size > settings.IMAGE_REENCODE_SIZE)
+
+
+def _reencode(image, name):
+    max_size = (settings.IMAGE_MAX_DIMENSION, settings.IMAGE_MAX_DIMENSION)
+    image.draft('RGB', max_size)
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(max_size, Image.LANCZOS, reducing_gap=3.0)
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info)
+    buffer = io.BytesIO()
+    stem = os.path.splitext(os.path.basename(name))[0]
+    if has_alpha:
+        image.convert('RGBA').save(buffer, 'PNG', optimize=True)
+        return SimpleUploadedFile(f'{stem}.png', buffer.getvalue(),
+                                  content_type='image/png')
+    image.convert('RGB').save(buffer, 'JPEG', quality=85,
+                              optimize=True, progressive=True)
+    return SimpleUploadedFile(f'{stem}.jpg', buffer.getvalue(),
+                              content_type='image/jpeg')
+
+
+def prepare_image(uploaded):
+    """Отклоняет слишком большие картинки и уменьшает крупные до
+    IMAGE_MAX_DIMENSION по большей стороне."""
+    if uploaded.size > settings.IMAGE_MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            'Файл больше %(limit)s.',
+            code='file_too_large',
+            params={'limit': filesizeformat(settings.IMAGE_MAX_UPLOAD_SIZE)},
+        )
+
+    uploaded.seek(0)
+    try:
+        image = Image.open(uploaded)
+    except Image.DecompressionBombError:
+        image = None
+    if image is None or (
+            image.size[0] * image.size[1] > settings.IMAGE_MAX_PIXELS):
+        raise ValidationError(
+            'Слишком большое разрешение изображения.',
+            code='image_too_large',
+        )
+
+    with image:
+        if not _needs_reencoding(image, uploaded.size):
+            uploaded.seek(0)
+            return uploaded
+        return _reencode(image, uploaded.name)
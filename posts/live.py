@@ -0,0 +1,226 @@
+"""Живое обновление лент через Server-Sent Events.
+
+new_post после коммита один раз рисует карточку поста и публикует её в
+каналы лент, где пост виден: общая лента, лента группы и канал автора,
+на который подписаны ленты подписок. add_comment публикует туда же новое
+число комментариев. Открытые потоки LIVE_PREFIX... получают карточки и
+счётчик новых записей, так что клиенту не нужно перезагружать страницу.
+
+Потоки обслуживает только ASGI-приложение yatube.asgi, поэтому страницы
+подключают их, лишь когда сами отданы ASGI-сервером.
+
+Рассылка живёт в памяти процесса: потоки и публикации должны
+обслуживаться одним процессом ASGI-сервера.
+"""
+import asyncio
+import json
+import threading
+from importlib import import_module
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.handlers.asgi import ASGIRequest
+from django.http import parse_cookie
+from django.template.loader import render_to_string
+
+from .models import Follow, Post
+
+# Адреса вида /<username>/ заняты профилями, поэтому потоки живут под
+# префиксом API, который не может совпасть с именем пользователя.
+LIVE_PREFIX = '/api/v1/live/'
+
+
+def live_context(request):
+    """Контекстный процессор: префикс потоков или None под WSGI."""
+    if isinstance(request, ASGIRequest):
+        return {'live_prefix': LIVE_PREFIX}
+    return {'live_prefix': None}
+
+
+def format_event(event, data):
+    data = json.dumps(data, ensure_ascii=False)
+    return f'event: {event}\ndata: {data}\n\n'.encode()
+
+
+class Subscription:
+    def __init__(self, channels, loop):
+        self.channels = channels
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=settings.LIVE_QUEUE_SIZE)
+
+    def put(self, message):
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        # Медленный клиент теряет карточки, но не копит их в памяти.
+        if not self.queue.full():
+            self.queue.put_nowait(message)
+
+
+class Broker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, channels):
+        subscription = Subscription(
+            set(channels), asyncio.get_running_loop())
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscriptions.setdefault(channel, set()).add(
+                    subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscriptions.get(channel, set())
+                subscribers.discard(subscription)
+                if not subscribers:
+                    self._subscriptions.pop(channel, None)
+
+    def subscribers(self, channels):
+        with self._lock:
+            return set().union(*[
+                self._subscriptions.get(channel, ()) for channel in channels
+            ])
+
+    def publish(self, channels, event, data):
+        subscribers = self.subscribers(channels)
+        if not subscribers:
+            return 0
+        message = (event, format_event(event, data))
+        for subscription in subscribers:
+            subscription.put(message)
+        return len(subscribers)
+
+
+broker = Broker()
+
+
+def post_channels(post):
+    channels = ['index', f'author:{post.author_id}']
+    if post.group_id is not None:
+        channels.append(f'group:{post.group.slug}')
+    return channels
+
+
+def publish_posts(post_ids):
+    """Публикует карточки постов одним запросом на всю пачку."""
+    for post in Post.objects.feed().filter(pk__in=post_ids):
+        channels = post_channels(post)
+        # Карточку рисуем один раз на все открытые потоки и только если
+        # они есть.
+        if not broker.subscribers(channels):
+            continue
+        html = render_to_string('posts/post_item.html', {'post': post})
+        broker.publish(channels, 'post', {'id': post.pk, 'html': html})
+
+
+def publish_post(post_id):
+    publish_posts([post_id])
+
+
+def publish_comment(post_id):
+    post = Post.objects.select_related('group').filter(pk=post_id).first()
+    if post is None:
+        return
+    broker.publish(post_channels(post), 'update', {
+        'id': post.pk,
+        'comments_count': post.comments_count,
+    })
+
+
+def _session_user(scope):
+    headers = dict(scope.get('headers', ()))
+    cookies = parse_cookie(headers.get(b'cookie', b'').decode('latin-1'))
+    engine = import_module(settings.SESSION_ENGINE)
+    session = engine.SessionStore(cookies.get(settings.SESSION_COOKIE_NAME))
+    return get_user(SimpleNamespace(session=session))
+
+
+@sync_to_async
+def feed_channels(scope):
+    """Каналы потока по адресу или None, если поток недоступен."""
+    parts = scope['path'][len(LIVE_PREFIX):].strip('/').split('/')
+    if parts == ['index']:
+        return ['index']
+    if len(parts) == 2 and parts[0] == 'group':
+        return [f'group:{parts[1]}']
+    if parts == ['follow']:
+        user = _session_user(scope)
+        if not user.is_authenticated:
+            return None
+        authors = Follow.objects.filter(user=user).values_list(
+            'author_id', flat=True)
+        return [f'author:{author_id}' for author_id in authors]
+    return None
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _respond(send, status, body=b''):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'text/plain; charset=utf-8')],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def live_application(scope, receive, send):
+    """ASGI-приложение потоков LIVE_PREFIX + index/, group/<slug>/ и
+    follow/."""
+    if scope['method'] != 'GET':
+        return await _respond(send, 405)
+    channels = await feed_channels(scope)
+    if channels is None:
+        return await _respond(send, 404)
+
+    subscription = broker.subscribe(channels)
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': b'retry: 5000\n\n',
+            'more_body': True,
+        })
+        new_posts = 0
+        while not disconnected.done():
+            message = asyncio.ensure_future(subscription.queue.get())
+            done, _ = await asyncio.wait(
+                {message, disconnected},
+                timeout=settings.LIVE_KEEPALIVE,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if message not in done:
+                message.cancel()
+                if not disconnected.done():
+                    await send({'type': 'http.response.body',
+                                'body': b': keepalive\n\n',
+                                'more_body': True})
+                continue
+
+            event, body = message.result()
+            if event == 'post':
+                new_posts += 1
+                body += format_event('new_posts', {'count': new_posts})
+            await send({'type': 'http.response.body', 'body': body,
+                        'more_body': True})
+    finally:
+        disconnected.cancel()
+        broker.unsubscribe(subscription)
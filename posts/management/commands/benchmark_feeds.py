@@ -0,0 +1,110 @@
+import json
+import os
+import platform
+import shutil
+import tempfile
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+
+from posts import benchmark, synthetic
+
+
+class Command(BaseCommand):
+    help = ('Замеряет страницы лент на синтетических данных во временной '
+            'базе, сохраняет результаты в JSON и падает, если они хуже '
+            'сохранённой базовой линии.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=300)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=6000)
+        parser.add_argument('--comments', type=int, default=12000)
+        parser.add_argument('--follows', type=int, default=30,
+                            help='Среднее число подписок пользователя.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--depths', type=int, nargs='+',
+                            default=[1, 10, 50],
+                            help='Номера страниц лент для замеров.')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Сколько раз запрашивать каждую страницу.')
+        parser.add_argument('--output', default='benchmark-results.json',
+                            help='Куда записать результаты.')
+        parser.add_argument('--baseline',
+                            help='Результаты прошлого запуска для '
+                                 'сравнения.')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Допустимый рост задержки, доля.')
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp(prefix='yatube-benchmark-')
+        # Все псевдонимы, включая реплики-зеркала, смотрят во временную
+        # базу раньше, чем что-либо откроет соединение с рабочей.
+        connections.close_all()
+        connections['default'].settings_dict['TEST'].update(
+            NAME=os.path.join(directory, 'db.sqlite3'), SERIALIZE=False)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(
+                MEDIA_ROOT=os.path.join(directory, 'media'),
+                CACHES={'default': {
+                    'BACKEND': 'yatube.backends.cache.FileBasedCache',
+                    'LOCATION': os.path.join(directory, 'cache'),
+                }},
+            ):
+                report = self.benchmark(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            shutil.rmtree(directory, ignore_errors=True)
+
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты записаны в {options["output"]}')
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                baseline = json.load(baseline)
+            regressions = benchmark.compare(
+                report['results'], baseline['results'], options['threshold'])
+            if regressions:
+                raise CommandError(
+                    'Замеры хуже базовой линии:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS(
+                'Регрессий относительно базовой линии нет.'))
+
+    def benchmark(self, options):
+        dataset = synthetic.generate(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+            seed=options['seed'],
+        )
+        cache.clear()
+        client = Client()
+        client.force_login(dataset.reader)
+        results = benchmark.run(client, dataset, depths=options['depths'],
+                                repeat=options['repeat'])
+
+        for key, result in results.items():
+            self.stdout.write(
+                f'{key:28} p50 {result["p50"]:7.1f} мс  '
+                f'p90 {result["p90"]:7.1f} мс  '
+                f'p99 {result["p99"]:7.1f} мс  '
+                f'запросов {result["queries"]}'
+            )
+        return {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'seed': options['seed'],
+            'dataset': dataset.counts,
+            'repeat': options['repeat'],
+            'results': results,
+        }
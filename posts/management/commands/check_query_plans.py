@@ -0,0 +1,131 @@
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from posts.group_feed import HEADER_FIELDS, recent_posts
+from posts.models import Comment, Follow, Group, Post, User, UserCounters
+from posts.paginators import CursorPaginator
+from posts.ranking import HOT_CURSOR_KEYS, HOT_ORDERING, hot_posts
+from posts.suggestions import follow_suggestions
+from posts.timeline import (TIMELINE_CURSOR_KEYS, TIMELINE_ORDERING,
+                            timeline_posts)
+
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?(?!CONSTANT ROW)\S+( AS \S+)?$')
+INDEX_SCAN = re.compile(
+    r'^SCAN (TABLE )?\S+( AS \S+)? USING (COVERING )?INDEX \S+$')
+TEMP_SORT = 'USE TEMP B-TREE'
+# Запросы, которые сортируют не больше страницы строк, найденных по
+# первичному ключу.
+BOUNDED_SORTS = {'group_posts: recent page'}
+# Запросы, которые обходят индекс целиком в порядке страницы. Обход
+# останавливается на LIMIT, только если подходит почти каждая строка.
+ORDERED_SCANS = {
+    # Без фильтров: подходит каждая строка индекса.
+    'index',
+    'hot',
+    # Фильтрует посты по ленте читателя, но популярными считаются
+    # авторы с больше чем TIMELINE_FAN_OUT_LIMIT подписчиками: их посты
+    # составляют заметную долю общей ленты, и страница набирается
+    # быстро. Без популярных авторов лента читается по своему индексу.
+    'follow_index: popular',
+}
+
+
+def view_queries():
+    user = User(pk=1, username='user')
+    group = Group(pk=1, slug='group')
+    post = Post(pk=1, author=user)
+    limit = settings.POSTS_PER_PAGE
+    position = [timezone.now(), 1]
+    timeline = CursorPaginator(timeline_posts(user), limit,
+                               ordering=TIMELINE_ORDERING,
+                               keys=TIMELINE_CURSOR_KEYS)
+    merged = CursorPaginator(timeline_posts(user, popular=[2]), limit,
+                             ordering=TIMELINE_ORDERING,
+                             keys=TIMELINE_CURSOR_KEYS)
+    hot = CursorPaginator(hot_posts(), limit, ordering=HOT_ORDERING,
+                          keys=HOT_CURSOR_KEYS)
+    comments = CursorPaginator(
+        Comment.objects.filter(post_id=post.id).select_related('author'),
+        settings.COMMENTS_PER_PAGE, ordering=Comment._meta.ordering)
+
+    def cursor_page(queryset):
+        return CursorPaginator(queryset, limit).window(position)
+
+    return {
+        'index': Post.objects.feed()[:limit],
+        'index: cursor': cursor_page(Post.objects.feed()),
+        'hot': hot.window(),
+        'hot: cursor': hot.window([1.0, 1]),
+        'group_posts': Post.objects.feed().filter(
+            group_id=group.id)[limit:limit * 2],
+        'group_posts: cursor': cursor_page(
+            Post.objects.feed().filter(group_id=group.id)),
+        'group_posts: header': Group.objects.filter(
+            slug=group.slug).values(*HEADER_FIELDS),
+        'group_posts: recent': Post.objects.filter(
+            group_id=group.id).order_by(*Post._meta.ordering).values_list(
+            'id', flat=True)[:settings.GROUP_RECENT_POSTS],
+        'group_posts: recent page': recent_posts(range(1, limit + 1)),
+        'profile': Post.objects.feed().filter(
+            author__username=user.username)[:limit],
+        'profile: cursor': cursor_page(
+            Post.objects.feed().filter(author__username=user.username)),
+        'profile: is_follow': Follow.objects.filter(
+            user=user, author__username=user.username),
+        'post_view': Post.objects.feed().filter(
+            author__username=user.username, id=post.id).order_by(),
+        'post_view: comments': comments.window(),
+        'post_comments': comments.window(position),
+        'post_view: counters': UserCounters.objects.filter(
+            user__username=user.username),
+        'follow_index': timeline_posts(user)[:limit],
+        'follow_index: cursor': timeline.window(position),
+        'follow_index: popular': merged.window(),
+        'follow_index: popular cursor': merged.window(position),
+        'follow_suggestions': follow_suggestions(user),
+        'profile_follow: followers': Follow.objects.filter(
+            author=user).values_list('user_id', flat=True),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN QUERY PLAN для запросов страниц и падает, '
+            'если запрос читает таблицу или индекс целиком или сортирует '
+            'во временном B-дереве.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            default='default',
+            help='Алиас базы данных для проверки.',
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError('Проверка планов поддерживает только SQLite.')
+
+        problems = []
+        for name, queryset in view_queries().items():
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = [row[-1] for row in cursor.fetchall()]
+
+            self.stdout.write(name)
+            for detail in plan:
+                self.stdout.write(f'    {detail}')
+                sorts = TEMP_SORT in detail and name not in BOUNDED_SORTS
+                scans = (INDEX_SCAN.match(detail)
+                         and name not in ORDERED_SCANS)
+                if FULL_SCAN.match(detail) or sorts or scans:
+                    problems.append(f'{name}: {detail}')
+
+        if problems:
+            raise CommandError(
+                'Неэффективные планы запросов:\n' + '\n'.join(problems))
+        self.stdout.write(self.style.SUCCESS('Все планы используют индексы'))
@@ -0,0 +1,126 @@
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from functools import partial
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from posts import synthetic
+
+
+def init_worker():
+    # Нужно при запуске процессов через spawn; при fork Django уже
+    # настроен, а соединения родитель закрыл до запуска пула.
+    django.setup()
+
+
+def create_chunk(plan, kind, start, stop):
+    try:
+        return synthetic.create_chunk(plan, kind, start, stop)
+    finally:
+        connections.close_all()
+
+
+class InlineFuture(Future):
+    """Выполняет кусок сразу, без пула процессов."""
+
+    def __init__(self, function, *args):
+        super().__init__()
+        self.set_result(function(*args))
+
+
+class Command(BaseCommand):
+    help = ('Наполняет базу большим синтетическим набором пользователей, '
+            'групп, постов, комментариев и подписок для профилирования.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--groups', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=3000000)
+        parser.add_argument('--follows', type=int, default=50,
+                            help='Среднее число подписок пользователя.')
+        parser.add_argument('--exponent', type=float, default=1.1,
+                            help='Показатель степенного закона '
+                                 'популярности авторов и групп.')
+        parser.add_argument('--burst', type=float, default=5,
+                            help='Средняя длина серии постов автора.')
+        parser.add_argument('--images', type=float, default=0.1,
+                            help='Доля постов с картинками.')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней распределить посты.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Сколько строк создаёт одна задача.')
+        parser.add_argument('--workers', type=int,
+                            default=os.cpu_count() or 1,
+                            help='Число процессов.')
+        parser.add_argument('--skip-timelines', action='store_true',
+                            help='Не раскладывать ленты подписок.')
+        parser.add_argument('--skip-search', action='store_true',
+                            help='Не пересобирать поисковый индекс.')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if (workers > 1 and connection.vendor == 'sqlite'
+                and connection.is_in_memory_db()):
+            raise CommandError(
+                'У базы в памяти своя копия в каждом процессе, '
+                'используйте --workers 1.')
+
+        plan = synthetic.Plan(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+            images=options['images'],
+            days=options['days'],
+            seed=options['seed'],
+            exponent=options['exponent'],
+            burst=options['burst'],
+            chunk_size=options['chunk_size'],
+        )
+        synthetic.prepare(plan)
+        if workers > 1:
+            connections.close_all()
+            with ProcessPoolExecutor(workers, initializer=init_worker) as pool:
+                for phase in synthetic.PHASES:
+                    self.run_phase(partial(pool.submit, create_chunk),
+                                   plan, phase)
+        else:
+            for phase in synthetic.PHASES:
+                self.run_phase(
+                    partial(InlineFuture, synthetic.create_chunk),
+                    plan, phase)
+
+        started = time.perf_counter()
+        synthetic.reset_sequences()
+        synthetic.rebuild_derived(
+            plan,
+            timelines=not options['skip_timelines'],
+            search=not options['skip_search'],
+        )
+        self.stdout.write(
+            f'Счётчики, ленты и индекс: {time.perf_counter() - started:.1f} с')
+
+    def run_phase(self, submit, plan, phase):
+        started = time.perf_counter()
+        chunks = [chunk for kind in phase for chunk in plan.chunks(kind)]
+        futures = [submit(plan, *chunk) for chunk in chunks]
+        created = dict.fromkeys(phase, 0)
+        for number, future in enumerate(as_completed(futures), 1):
+            kind, count = future.result()
+            created[kind] += count
+            self.stdout.write(
+                f'\r{", ".join(phase)}: {number}/{len(chunks)}', ending='')
+            self.stdout.flush()
+
+        elapsed = max(time.perf_counter() - started, 1e-6)
+        rows = sum(created.values())
+        summary = ', '.join(f'{kind} {count}'
+                            for kind, count in created.items())
+        self.stdout.write(
+            f'\r{summary}: {elapsed:.1f} с, {rows / elapsed:.0f} строк/с')
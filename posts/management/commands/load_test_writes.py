@@ -0,0 +1,161 @@
+import statistics
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections, transaction
+
+from posts.models import Post
+from posts.task_queue import run_pending
+from posts.tasks import fan_out
+
+User = get_user_model()
+
+USERNAME = 'load-test-writer-{}'
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Writer(threading.Thread):
+    """Пишет посты так же, как new_post: пост со счётчиками — отдельная
+    транзакция, а раскладка по лентам и поисковый индекс после коммита
+    ставятся в очередь задач."""
+
+    def __init__(self, author, writes):
+        super().__init__()
+        self.author = author
+        self.writes = writes
+        self.latencies = []
+        self.errors = 0
+
+    def run(self):
+        try:
+            for number in range(self.writes):
+                started = time.perf_counter()
+                try:
+                    with transaction.atomic():
+                        post = Post.objects.create(
+                            text=f'Нагрузочный пост {number}',
+                            author=self.author,
+                        )
+                        fan_out.enqueue(post.pk)
+                except DatabaseError:
+                    self.errors += 1
+                else:
+                    self.latencies.append(time.perf_counter() - started)
+        finally:
+            # У каждого потока своё соединение.
+            connections.close_all()
+
+
+class Worker(threading.Thread):
+    """Выполняет задачи, как команда run_tasks, пока писатели работают и
+    пока очередь не опустеет."""
+
+    def __init__(self, writers_done):
+        super().__init__()
+        self.writers_done = writers_done
+        self.processed = 0
+        self.errors = 0
+
+    def run(self):
+        try:
+            while True:
+                # Флаг читаем до выборки: задачи последних постов уже в
+                # очереди, когда он поднят.
+                done = self.writers_done.is_set()
+                try:
+                    count = run_pending(limit=100)
+                except DatabaseError:
+                    self.errors += 1
+                    continue
+                self.processed += count
+                if not count:
+                    if done:
+                        return
+                    time.sleep(0.05)
+        finally:
+            connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест записи: несколько потоков одновременно '
+            'создают посты, а обработчики выполняют их фоновые задачи; '
+            'команда печатает пропускную способность, задержки и число '
+            'ошибок блокировки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8,
+                            help='Сколько потоков пишут одновременно.')
+        parser.add_argument('--writes', type=int, default=200,
+                            help='Сколько постов создаёт каждый поток.')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Сколько потоков выполняют фоновые '
+                                 'задачи; при 0 задачи остаются в '
+                                 'очереди для run_tasks.')
+        parser.add_argument('--keep', action='store_true',
+                            help='Не удалять созданных пользователей '
+                                 'и посты.')
+
+    def handle(self, *args, **options):
+        connection = connections['default']
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise CommandError(
+                'Нагрузочный тест нужен для файловой базы SQLite.')
+
+        authors = [
+            User.objects.get_or_create(username=USERNAME.format(number))[0]
+            for number in range(options['writers'])
+        ]
+        writers = [Writer(author, options['writes']) for author in authors]
+
+        writers_done = threading.Event()
+        workers = [Worker(writers_done) for _ in range(options['workers'])]
+
+        started = time.perf_counter()
+        for thread in writers + workers:
+            thread.start()
+        for writer in writers:
+            writer.join()
+        elapsed = time.perf_counter() - started
+        writers_done.set()
+        for worker in workers:
+            worker.join()
+        drained = time.perf_counter() - started
+
+        latencies = [latency for writer in writers
+                     for latency in writer.latencies]
+        errors = sum(writer.errors for writer in writers)
+        self.stdout.write(
+            f'Потоков: {len(writers)}, постов: {len(latencies)}, '
+            f'ошибок: {errors}\n'
+            f'Время: {elapsed:.2f} с, '
+            f'записей в секунду: {len(latencies) / elapsed:.0f}'
+        )
+        if workers:
+            self.stdout.write(
+                f'Фоновых задач выполнено: '
+                f'{sum(worker.processed for worker in workers)}, '
+                f'ошибок: {sum(worker.errors for worker in workers)}, '
+                f'очередь опустела через {drained:.2f} с')
+        if latencies:
+            self.stdout.write(
+                'Задержка, мс: медиана {:.1f}, p95 {:.1f}, p99 {:.1f}, '
+                'максимум {:.1f}'.format(
+                    statistics.median(latencies) * 1000,
+                    percentile(latencies, 0.95) * 1000,
+                    percentile(latencies, 0.99) * 1000,
+                    max(latencies) * 1000,
+                )
+            )
+
+        if not options['keep']:
+            User.objects.filter(pk__in=[author.pk for author in authors]) \
+                .delete()
+            if workers:
+                # Удаление постов ставит задачи убрать их из поиска.
+                run_pending()
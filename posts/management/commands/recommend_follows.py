@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.recommendations import rebuild_suggestions
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рекомендации «Кого почитать» по всему графу '
+            'подписок.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Сколько авторов сохранить каждому пользователю.',
+        )
+        parser.add_argument(
+            '--block-size',
+            type=int,
+            default=1000,
+            help='Сколько пользователей считать за один шаг.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rebuild_suggestions(options['limit'], options['block_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Рекомендаций: {count}, '
+            f'{time.perf_counter() - started:.1f} с'))
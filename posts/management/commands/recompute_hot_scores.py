@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.ranking import recompute_hot_scores
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рейтинги ленты «Горячее».'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--every',
+            type=float,
+            help='Пересчитывать раз в столько секунд, пока не остановят.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            count = recompute_hot_scores()
+            self.stdout.write(self.style.SUCCESS(
+                f'Постов в ленте: {count}, '
+                f'{time.perf_counter() - started:.2f} с'))
+            if not options['every']:
+                return
+            time.sleep(options['every'])
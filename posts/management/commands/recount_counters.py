@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from posts.counters import (actual_group_counts, actual_post_counts,
+                            actual_user_counts, recount_groups,
+                            recount_posts, recount_users)
+from posts.models import Group, Post, User, UserCounters
+
+
+def drifted(queryset, actual_counts):
+    annotations = {f'actual_{name}': value
+                   for name, value in actual_counts.items()}
+    matches = {name: F(f'actual_{name}') for name in actual_counts}
+    return queryset.annotate(**annotations).exclude(**matches)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики подписчиков, подписок, записей '
+            'пользователей и групп и комментариев и исправляет '
+            'расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, ничего не меняя.',
+        )
+
+    def handle(self, *args, **options):
+        missing = User.objects.filter(counters__isnull=True)
+        missing_ids = list(missing.values_list('pk', flat=True))
+        users = drifted(UserCounters.objects.all(), actual_user_counts())
+        posts = drifted(Post.objects.all(), actual_post_counts())
+        groups = drifted(Group.objects.all(), actual_group_counts())
+
+        self.stdout.write(
+            f'Пользователей без счётчиков: {len(missing_ids)}\n'
+            f'Пользователей с расхождениями: {users.count()}\n'
+            f'Постов с расхождениями: {posts.count()}\n'
+            f'Групп с расхождениями: {groups.count()}'
+        )
+        if options['dry_run']:
+            return
+
+        with transaction.atomic():
+            updated_users = recount_users(
+                UserCounters.objects.all(), create_user_ids=missing_ids)
+            updated_posts = recount_posts(Post.objects.all())
+            updated_groups = recount_groups(Group.objects.all())
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано пользователей: {updated_users}, '
+            f'постов: {updated_posts}, групп: {updated_groups}'
+        ))
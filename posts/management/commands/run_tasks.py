@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.task_queue import run_pending
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить готовые задачи и выйти.',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=settings.TASK_POLL_INTERVAL,
+            help='Сколько секунд ждать новых задач, когда очередь пуста.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            count = run_pending()
+            if count:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Задач обработано: {count}, '
+                    f'{time.perf_counter() - started:.2f} с'))
+            if options['once']:
+                return
+            if not count:
+                time.sleep(options['sleep'])
@@ -0,0 +1,31 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite на реплики DATABASE_REPLICAS '
+            'через backup API: так две копии файла на одной машине '
+            'заменяют репликацию при локальной проверке.')
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Команда копирует только базы SQLite.')
+        if not settings.DATABASE_REPLICAS:
+            self.stdout.write('Реплики не настроены.')
+            return
+
+        primary.ensure_connection()
+        for alias in settings.DATABASE_REPLICAS:
+            replica = connections[alias]
+            # Открытое соединение читало бы старую копию.
+            replica.close()
+            target = sqlite3.connect(replica.settings_dict['NAME'])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(f'{alias}: {replica.settings_dict["NAME"]}')
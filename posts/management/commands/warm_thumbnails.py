@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails
+
+
+def generate(post_id):
+    try:
+        return generate_thumbnails(post_id)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Готовит миниатюры для картинок уже опубликованных постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.THUMBNAIL_WORKERS,
+            help='Количество параллельных потоков.',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать миниатюры и для постов, где они уже есть.',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image=None)
+        if not options['all']:
+            posts = posts.filter(image_thumbnail='')
+        post_ids = list(posts.values_list('pk', flat=True))
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            done = sum(executor.map(generate, post_ids))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Подготовлены миниатюры для {done} из {len(post_ids)} постов'))
@@ -0,0 +1,159 @@
+"""Хранение и отдача загруженных файлов.
+
+Загруженные картинки сохраняются под именем с хешем содержимого, поэтому
+файл по одному адресу никогда не меняется и браузеры могут кэшировать
+его навсегда. Миниатюры sorl-thumbnail получают имя из хеша исходного
+имени и параметров и тоже не меняются.
+
+В продакшене media лучше отдавать веб-сервером напрямую. Если это
+невозможно, serve_media проверяет путь и условные заголовки, а сам файл
+передаёт nginx (X-Accel-Redirect) или Apache (X-Sendfile), так что
+воркер Django занят только на время stat().
+"""
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.deconstruct import deconstructible
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+from sorl.thumbnail.conf import settings as thumbnail_settings
+
+HASH_LENGTH = 12
+HASHED_NAME = re.compile(r'\.[0-9a-f]{%d}\.[^./]+$' % HASH_LENGTH)
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+@deconstructible
+class HashedMediaStorage(FileSystemStorage):
+    """Добавляет к имени файла первые символы md5 его содержимого:
+    posts/photo.jpg -> posts/photo.1a2b3c4d5e6f.jpg."""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        return super().save(
+            self.hashed_name(name, content), content, max_length)
+
+    def hashed_name(self, name, content):
+        digest = hashlib.md5()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        root, ext = posixpath.splitext(name)
+        return f'{root}.{digest.hexdigest()[:HASH_LENGTH]}{ext}'
+
+
+def is_immutable(path):
+    return bool(HASHED_NAME.search(path)
+                or path.startswith(thumbnail_settings.THUMBNAIL_PREFIX))
+
+
+def _cache_control(path):
+    if is_immutable(path):
+        return f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+
+
+def _byte_range(request, size, etag):
+    """Возвращает (start, end) для запроса одного диапазона, None для
+    ответа целиком и False для диапазона за пределами файла."""
+    match = RANGE.match(request.META.get('HTTP_RANGE', ''))
+    if not match or size == 0:
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is not None and if_range != etag:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def _file_response(request, fullpath, stat, etag):
+    size = stat.st_size
+    byte_range = _byte_range(request, size, etag)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    handle = open(fullpath, 'rb')
+    if byte_range is None:
+        response = FileResponse(handle)
+        response['Content-Length'] = size
+    else:
+        start, end = byte_range
+        handle.seek(start)
+        length = end - start + 1
+        response = FileResponse(_read_range(handle, length), status=206)
+        response['Content-Length'] = length
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _read_range(handle, length, chunk_size=FileResponse.block_size):
+    with handle:
+        while length > 0:
+            chunk = handle.read(min(chunk_size, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(fullpath)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404('Файл не найден')
+    if not os.path.isfile(fullpath):
+        raise Http404('Файл не найден')
+
+    etag = quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        mode = settings.MEDIA_SERVING
+        if mode == 'x-accel-redirect':
+            response = HttpResponse()
+            response['X-Accel-Redirect'] = quote(
+                settings.MEDIA_ACCEL_REDIRECT_LOCATION + path)
+        elif mode == 'x-sendfile':
+            response = HttpResponse()
+            response['X-Sendfile'] = fullpath
+        else:
+            response = _file_response(request, fullpath, stat, etag)
+        content_type, encoding = mimetypes.guess_type(fullpath)
+        response['Content-Type'] = content_type or 'application/octet-stream'
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = _cache_control(path)
+    return response
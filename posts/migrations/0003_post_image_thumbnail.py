@@ -0,0 +1,18 @@
+# Generated by Django 2.2.6 on 2026-10-18 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0002_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='posts/thumbnails/', verbose_name='Миниатюра изображения'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.6 on 2026-10-18 13:10
+
+from django.db import migrations, models
+import posts.media
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_post_image_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Выберите файл изображения', null=True, storage=posts.media.HashedMediaStorage(), upload_to='posts/', verbose_name='Изображение'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.6 on 2026-10-18 14:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_post_search'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'ordering': ('-created', '-id')},
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.6 on 2026-10-18 14:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_comment_ordering'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HotScore',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='hot_score', serialize=False, to='posts.post', verbose_name='Пост')),
+                ('score', models.FloatField(verbose_name='Рейтинг')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['created'], name='comment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hotscore',
+            index=models.Index(fields=['score', 'post'], name='hot_score_idx'),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils import timezone
+
+from .media import HashedMediaStorage
 
 User = get_user_model()
 
@@ -19,11 +22,21 @@ class Group(models.Model):
         verbose_name='Описание',
         help_text='Коротко опишите вашу группу',
     )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество записей',
+    )
 
     def __str__(self):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст заметки',
@@ -51,14 +64,40 @@ class Post(models.Model):
     )
     image = models.ImageField(
         upload_to='posts/',
+        storage=HashedMediaStorage(),
         blank=True,
         null=True,
         verbose_name='Изображение',
         help_text='Выберите файл изображения',
     )
+    image_thumbnail = models.ImageField(
+        upload_to='posts/thumbnails/',
+        blank=True,
+        editable=False,
+        verbose_name='Миниатюра изображения',
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев',
+    )
+    card_version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Версия карточки поста',
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = [
+            models.Index(fields=['pub_date'], name='post_pub_date_idx'),
+            models.Index(fields=['author', 'pub_date'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', 'pub_date'],
+                         name='post_group_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -86,6 +125,14 @@ class Comment(models.Model):
         verbose_name='Дата создания комментария',
     )
 
+    class Meta:
+        ordering = ('-created', '-id')
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+            models.Index(fields=['created'], name='comment_created_idx'),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -108,3 +155,163 @@ class Follow(models.Model):
                 name = 'unique_follows',
             )
         ]
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
+
+
+class UserCounters(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписчиков',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписок',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество записей',
+    )
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель ленты',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост в ленте',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор поста',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации поста',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entries',
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', 'pub_date', 'post'],
+                         name='timeline_user_pub_date_idx'),
+            models.Index(fields=['user', 'author', 'pub_date'],
+                         name='timeline_user_author_idx'),
+        ]
+
+
+class HotScore(models.Model):
+    """Рейтинг поста в ленте «Горячее». Таблицу пересчитывает
+    posts.ranking.recompute_hot_scores(), лента читает её по индексу."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='hot_score',
+        verbose_name='Пост',
+    )
+    score = models.FloatField(
+        verbose_name='Рейтинг',
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['score', 'post'], name='hot_score_idx'),
+        ]
+
+
+class FollowSuggestion(models.Model):
+    """Кого почитать пользователю. Таблицу целиком пересчитывает
+    posts.recommendations.rebuild_suggestions()."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='follow_suggestions',
+        verbose_name='Пользователь, которому советуют',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор, на которого советуют подписаться',
+    )
+    score = models.FloatField(
+        verbose_name='Оценка',
+    )
+    mutual_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписок пользователя, читающих автора',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow_suggestions',
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', 'score'],
+                         name='suggestion_user_score_idx'),
+        ]
+
+
+class Task(models.Model):
+    """Фоновая задача из очереди posts.task_queue. Выполненные задачи
+    удаляются, а у задач, исчерпавших попытки, run_at пустое."""
+    name = models.CharField(
+        max_length=200,
+        verbose_name='Задача',
+    )
+    args = models.JSONField(
+        default=list,
+        verbose_name='Аргументы',
+    )
+    priority = models.SmallIntegerField(
+        default=0,
+        verbose_name='Приоритет',
+    )
+    run_at = models.DateTimeField(
+        null=True,
+        default=timezone.now,
+        verbose_name='Когда выполнить',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток',
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Последняя ошибка',
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата постановки в очередь',
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-priority', 'run_at'],
+                         name='task_queue_idx'),
+        ]
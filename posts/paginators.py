@@ -0,0 +1,180 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+
+class CursorPage:
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<Cursor page of {len(self)} items>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        return self.paginator.encode_cursor(
+            self.object_list[0], reverse=True)
+
+
+class CursorPaginator:
+    """Keyset-пагинатор: страница выбирается по значениям полей сортировки
+    последнего показанного объекта, а не через OFFSET.
+
+    Последнее поле ordering должно быть уникальным (обычно id). Если
+    сортировка идёт по полям связанной модели, keys задаёт атрибуты
+    объекта с теми же значениями.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id'),
+                 keys=None):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.keys = tuple(keys or self._fields())
+
+    def _fields(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    def _model_field(self, path):
+        opts = self.object_list.model._meta
+        field = None
+        for name in path.split('__'):
+            field = opts.get_field(name)
+            if field.related_model is not None:
+                opts = field.related_model._meta
+        return field
+
+    def _position(self, obj):
+        values = []
+        for path in self.keys:
+            value = obj
+            for name in path.split('__'):
+                value = getattr(value, name)
+            values.append(value)
+        return values
+
+    def encode_cursor(self, obj, reverse=False):
+        values = [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in self._position(obj)
+        ]
+        data = json.dumps({'v': values, 'r': reverse}).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padding = '=' * (-len(cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(cursor + padding))
+            values = data['v']
+            reverse = bool(data['r'])
+            if len(values) != len(self.ordering):
+                return None
+            values = [
+                self._model_field(path).to_python(value)
+                for path, value in zip(self.keys, values)
+            ]
+        except (TypeError, ValueError, KeyError, binascii.Error,
+                FieldDoesNotExist, ValidationError):
+            return None
+        return values, reverse
+
+    def _after(self, values, reverse):
+        condition = Q()
+        equal = {}
+        for name, value in zip(self.ordering, values):
+            descending = name.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            path = name.lstrip('-')
+            condition |= Q(**equal, **{f'{path}__{lookup}': value})
+            equal[path] = value
+        # Отдельное условие на первое поле позволяет базе начать чтение
+        # индекса сразу с нужного места, а не отбрасывать строки с начала.
+        name, value = self.ordering[0], values[0]
+        lookup = 'lte' if name.startswith('-') != reverse else 'gte'
+        return Q(**{f'{name.lstrip("-")}__{lookup}': value}) & condition
+
+    def window(self, position=None, reverse=False):
+        """Запрос на страницу после position плюс один объект, чтобы
+        узнать, есть ли следующая страница."""
+        ordering = self.ordering
+        if reverse:
+            ordering = [
+                name[1:] if name.startswith('-') else f'-{name}'
+                for name in ordering
+            ]
+        queryset = self.object_list.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(position, reverse))
+        return queryset[:self.per_page + 1]
+
+    def get_page(self, cursor=None):
+        position = self.decode_cursor(cursor) if cursor else None
+        if position is None:
+            object_list = list(self.window())
+            has_next = len(object_list) > self.per_page
+            return CursorPage(
+                object_list[:self.per_page], self, has_next, False)
+
+        values, reverse = position
+        object_list = list(self.window(values, reverse))
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if not reverse:
+            return CursorPage(object_list, self, has_more, True)
+
+        if not has_more:
+            return self.get_page()
+        object_list.reverse()
+        return CursorPage(object_list, self, True, True)
+
+
+def paginate(request, object_list, **cursor_options):
+    """Возвращает страницу и пагинатор для ленты постов.
+
+    Режим выбирается настройкой FEED_PAGINATION; параметр ?cursor= в
+    запросе всегда включает keyset-пагинацию.
+    """
+    cursor = request.GET.get('cursor')
+    if cursor is not None or settings.FEED_PAGINATION == 'cursor':
+        paginator = CursorPaginator(
+            object_list, settings.POSTS_PER_PAGE, **cursor_options)
+        return paginator.get_page(cursor), paginator
+
+    paginator = Paginator(object_list, settings.POSTS_PER_PAGE)
+    return paginator.get_page(request.GET.get('page')), paginator
@@ -0,0 +1,80 @@
+"""Лента «Горячее».
+
+Рейтинг поста растёт с числом комментариев за последние
+HOT_WINDOW_HOURS часов и с числом подписчиков автора, а с возрастом
+поста убывает вдвое за каждые HOT_HALF_LIFE_HOURS часов.
+
+Рейтинги не считаются при запросе: recompute_hot_scores() периодически
+пересчитывает их пачкой в таблицу HotScore и оставляет только
+HOT_FEED_SIZE лучших. Лента читается по индексу (score, post), поэтому
+страница стоит одинаково при любом числе постов и комментариев.
+"""
+import heapq
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .caching import invalidate
+from .models import Comment, HotScore, Post
+
+BATCH_SIZE = 500
+
+COMMENT_WEIGHT = 1.0
+FOLLOWER_WEIGHT = 0.5
+
+HOT_ORDERING = ('-hot_score__score', '-hot_score__post_id')
+HOT_CURSOR_KEYS = ('hot_score__score', 'id')
+
+
+def hot_score(comments, followers, age):
+    """comments — комментарии за окно, age — возраст поста."""
+    weight = (1 + COMMENT_WEIGHT * comments
+              + FOLLOWER_WEIGHT * math.log1p(followers))
+    half_lives = age / timedelta(hours=settings.HOT_HALF_LIFE_HOURS)
+    return weight * 0.5 ** max(half_lives, 0)
+
+
+def candidates(since):
+    """Посты, которые могут попасть в ленту: обсуждаемые за окно и
+    самые новые, чтобы лента не пустела в тихие дни."""
+    commented = Comment.objects.filter(created__gte=since).values('post')
+    newest = Post.objects.order_by('-pub_date', '-id').values('pk')
+    return Post.objects.filter(
+        Q(pk__in=commented) | Q(pk__in=newest[:settings.HOT_FEED_SIZE]),
+    ).annotate(
+        recent_comments=Count(
+            'comments', filter=Q(comments__created__gte=since)),
+        followers=F('author__counters__followers_count'),
+    ).values_list('pk', 'pub_date', 'recent_comments', 'followers')
+
+
+def recompute_hot_scores(now=None):
+    """Пересчитывает таблицу рейтингов и возвращает число постов в
+    ленте."""
+    now = now or timezone.now()
+    since = now - timedelta(hours=settings.HOT_WINDOW_HOURS)
+    scores = (
+        (hot_score(comments, followers or 0, now - pub_date), post_id)
+        for post_id, pub_date, comments, followers in
+        candidates(since).iterator()
+    )
+    best = heapq.nlargest(settings.HOT_FEED_SIZE, scores)
+
+    with transaction.atomic():
+        HotScore.objects.all().delete()
+        HotScore.objects.bulk_create(
+            [HotScore(post_id=post_id, score=score)
+             for score, post_id in best],
+            batch_size=BATCH_SIZE,
+        )
+    invalidate('hot')
+    return len(best)
+
+
+def hot_posts():
+    return Post.objects.feed().select_related('hot_score').filter(
+        hot_score__isnull=False)
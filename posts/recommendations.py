@@ -0,0 +1,167 @@
+"""Рекомендации «Кого почитать».
+
+Граф подписок целиком загружается в разреженную матрицу A, где
+A[u, a] = 1, если u подписан на a. Оценка кандидата для пользователя
+складывается из двух частей:
+
+* друзья друзей, A @ A: сколько авторов из подписок пользователя сами
+  читают кандидата;
+* совместные подписки: FOLLOW_SUGGESTIONS_NEIGHBOURS самых похожих
+  читателей (косинусная мера по общим подпискам) голосуют за своих
+  авторов с весом, равным сходству.
+  Авторы, у которых больше FOLLOW_SUGGESTIONS_MAX_FOLLOWERS подписчиков,
+  в мере сходства не учитываются: их читают почти все, сходства они не
+  показывают, а строки матрицы сходства делают почти плотными.
+
+Пользователи обрабатываются блоками по block_size строк, поэтому
+память ограничена блоком, а не квадратом числа пользователей. Каждому
+сохраняются FOLLOW_SUGGESTIONS лучших авторов, на которых он ещё не
+подписан. Страницы только читают готовую таблицу FollowSuggestion.
+"""
+from itertools import chain, islice
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+from .models import Follow, FollowSuggestion
+
+BATCH_SIZE = 1000
+
+COFOLLOW_WEIGHT = 1.0
+
+
+def follow_graph():
+    """Идентификаторы пользователей графа и матрица подписок, строки и
+    столбцы которой — номера в этом массиве."""
+    edges = Follow.objects.values_list('user_id', 'author_id').order_by()
+    pairs = np.fromiter(chain.from_iterable(edges.iterator()),
+                        dtype=np.int64).reshape(-1, 2)
+    ids, index = np.unique(pairs, return_inverse=True)
+    index = index.reshape(-1, 2)
+    graph = sparse.csr_matrix(
+        (np.ones(len(index), dtype=np.float32), (index[:, 0], index[:, 1])),
+        shape=(len(ids), len(ids)),
+    )
+    return ids, graph
+
+
+def similarity_graph(graph, max_followers):
+    """Подписки без популярных авторов, строки нормированы так, что
+    произведение строк двух читателей — косинусная мера их сходства."""
+    followers = np.asarray(graph.sum(axis=0)).ravel()
+    pruned = graph @ sparse.diags(
+        (followers <= max_followers).astype(np.float32))
+    degrees = np.asarray(pruned.sum(axis=1)).ravel()
+    scale = np.divide(1, np.sqrt(degrees), out=np.zeros_like(degrees),
+                      where=degrees > 0)
+    return (sparse.diags(scale) @ pruned).tocsr()
+
+
+def nearest(similar, similar_t, rows, count):
+    """Для каждой строки rows — count самых похожих читателей, кроме
+    самого пользователя."""
+    similarity = (similar[rows] @ similar_t).tocsr()
+    indptr, indices, data = [0], [], []
+    for row, user_index in enumerate(rows):
+        start, end = similarity.indptr[row], similarity.indptr[row + 1]
+        columns = similarity.indices[start:end]
+        values = similarity.data[start:end]
+        keep = columns != user_index
+        columns, values = columns[keep], values[keep]
+        if len(values) > count:
+            best = np.argpartition(-values, count - 1)[:count]
+            columns, values = columns[best], values[best]
+        indices.append(columns)
+        data.append(values)
+        indptr.append(indptr[-1] + len(columns))
+    return sparse.csr_matrix(
+        (np.concatenate(data), np.concatenate(indices), indptr),
+        shape=similarity.shape,
+    )
+
+
+def score_block(graph, similar, similar_t, rows):
+    """Оценки кандидатов и число общих связей для строк rows."""
+    block = graph[rows]
+    neighbours = nearest(similar, similar_t, rows,
+                         settings.FOLLOW_SUGGESTIONS_NEIGHBOURS)
+    mutual = (block @ graph).tocsr()
+    scores = (block + COFOLLOW_WEIGHT * neighbours) @ graph
+
+    # Сам пользователь и уже прочитанные авторы не предлагаются.
+    own = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32),
+         (np.arange(len(rows)), rows)),
+        shape=block.shape,
+    )
+    scores = scores - scores.multiply(block + own)
+    scores = scores.tocsr()
+    scores.eliminate_zeros()
+    mutual.sort_indices()
+    return scores, mutual
+
+
+def top_candidates(scores, mutual, row, limit):
+    start, end = scores.indptr[row], scores.indptr[row + 1]
+    values = scores.data[start:end]
+    columns = scores.indices[start:end]
+    if len(values) > limit:
+        best = np.argpartition(-values, limit - 1)[:limit]
+        values, columns = values[best], columns[best]
+    order = np.argsort(-values, kind='stable')
+    values, columns = values[order], columns[order]
+
+    # Кандидат мог прийти только через совместные подписки, тогда общих
+    # связей у него нет.
+    start, end = mutual.indptr[row], mutual.indptr[row + 1]
+    mutual_columns = mutual.indices[start:end]
+    counts = np.zeros(len(columns), dtype=np.int64)
+    if len(mutual_columns):
+        positions = np.searchsorted(mutual_columns, columns).clip(
+            max=len(mutual_columns) - 1)
+        found = mutual_columns[positions] == columns
+        counts[found] = mutual.data[start:end][positions[found]]
+    return columns, values, counts
+
+
+def suggestions(limit=None, block_size=1000):
+    """Генератор кортежей (user_id, author_id, score, mutual_count)."""
+    limit = limit or settings.FOLLOW_SUGGESTIONS
+    ids, graph = follow_graph()
+    if not len(ids):
+        return
+    similar = similarity_graph(
+        graph, settings.FOLLOW_SUGGESTIONS_MAX_FOLLOWERS)
+    similar_t = similar.T.tocsr()
+    for start in range(0, len(ids), block_size):
+        rows = np.arange(start, min(start + block_size, len(ids)))
+        scores, mutual = score_block(graph, similar, similar_t, rows)
+        for row, user_index in enumerate(rows):
+            columns, values, counts = top_candidates(
+                scores, mutual, row, limit)
+            user_id = int(ids[user_index])
+            for column, value, count in zip(columns, values, counts):
+                yield user_id, int(ids[column]), float(value), int(count)
+
+
+def rebuild_suggestions(limit=None, block_size=1000):
+    """Пересчитывает таблицу рекомендаций и возвращает число строк.
+    Оценки считаются до транзакции, чтобы не держать запись открытой
+    на время расчёта."""
+    rows = list(suggestions(limit, block_size))
+    with transaction.atomic():
+        FollowSuggestion.objects.all().delete()
+        entries = iter(rows)
+        while True:
+            batch = [
+                FollowSuggestion(user_id=user_id, author_id=author_id,
+                                 score=score, mutual_count=mutual_count)
+                for user_id, author_id, score, mutual_count
+                in islice(entries, BATCH_SIZE)
+            ]
+            if not batch:
+                break
+            FollowSuggestion.objects.bulk_create(batch)
+    return len(rows)
@@ -0,0 +1,231 @@
+"""Полнотекстовый поиск по постам.
+
+Бэкенд выбирается настройкой SEARCH_BACKEND. SQLiteFTSBackend держит
+индекс в виртуальной таблице FTS5 posts_search: rowid строки равен id
+поста, в колонках лежат текст поста и название группы. При сохранении
+и удалении постов и групп сигналы ставят в очередь задачи из
+posts.tasks, которые обновляют индекс, а команда rebuild_search_index
+пересобирает его целиком.
+"""
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+WORD = re.compile(r'\w+')
+# Символы из области частного использования не встречаются в текстах
+# постов, ими отмечаются совпадения до экранирования HTML.
+MARK_START, MARK_END = '\ue000', '\ue001'
+SNIPPET_WORDS = 32
+
+
+def highlight(text):
+    """Экранирует текст и заменяет отметки совпадений на <mark>."""
+    text = escape(text)
+    text = text.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+    return mark_safe(text)
+
+
+class SearchHit:
+    def __init__(self, post, highlight):
+        self.post = post
+        self.highlight = highlight
+
+
+class SearchResults:
+    """Ленивый список найденных постов для Paginator: каждый срез
+    выполняет один запрос к индексу и один запрос за постами."""
+
+    def __init__(self, backend, query):
+        self.backend = backend
+        self.query = query
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count(self.query)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        offset = index.start or 0
+        limit = (index.stop - offset) if index.stop is not None else -1
+        matches = self.backend.matches(self.query, limit, offset)
+        posts = Post.objects.feed().in_bulk(
+            [post_id for post_id, _ in matches])
+        return [
+            SearchHit(posts[post_id], highlight(snippet))
+            for post_id, snippet in matches
+            if post_id in posts
+        ]
+
+
+class BaseSearchBackend:
+    """Бэкенд определяет count(query) — число найденных постов,
+    matches(query, limit, offset) — список пар (id поста, фрагмент текста
+    с отметками) в порядке релевантности и filter(queryset, query) —
+    queryset только с подходящими постами. Обновлять индекс нужно не
+    каждому бэкенду, поэтому эти методы по умолчанию ничего не делают."""
+
+    def search(self, query):
+        return SearchResults(self, query)
+
+    def index(self, posts):
+        pass
+
+    def remove(self, post_ids):
+        pass
+
+    def set_group_title(self, group_id, title):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """Поиск через LIKE без индекса для баз без FTS5. Совпадения
+    сортируются по дате, а не по релевантности."""
+
+    def _queryset(self, query):
+        condition = Q()
+        for word in WORD.findall(query):
+            condition &= (Q(text__icontains=word)
+                          | Q(group__title__icontains=word))
+        if not condition:
+            return Post.objects.none()
+        return Post.objects.filter(condition)
+
+    def count(self, query):
+        return self._queryset(query).count()
+
+    def matches(self, query, limit, offset):
+        posts = self._queryset(query).values_list('id', 'text')
+        if limit >= 0:
+            posts = posts[offset:offset + limit]
+        else:
+            posts = posts[offset:]
+        words = WORD.findall(query)
+        pattern = re.compile('|'.join(map(re.escape, words)), re.IGNORECASE)
+        return [
+            (post_id, pattern.sub(
+                lambda match: MARK_START + match.group() + MARK_END, text))
+            for post_id, text in posts
+        ]
+
+    def filter(self, queryset, query):
+        return queryset.filter(pk__in=self._queryset(query).values('pk'))
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    table = 'posts_search'
+
+    @staticmethod
+    def match_expression(query):
+        """Превращает ввод пользователя в запрос FTS5: каждое слово
+        берётся в кавычки, последнее ищется как префикс."""
+        words = [f'"{word}"' for word in WORD.findall(query)]
+        if words:
+            words[-1] += '*'
+        return ' '.join(words)
+
+    def _execute(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def count(self, query):
+        match = self.match_expression(query)
+        if not match:
+            return 0
+        return self._execute(
+            f'SELECT count(*) FROM {self.table} WHERE {self.table} MATCH %s',
+            [match],
+        )[0][0]
+
+    def matches(self, query, limit, offset):
+        match = self.match_expression(query)
+        if not match:
+            return []
+        # Совпадение в названии группы весит вдвое меньше, чем в тексте.
+        return self._execute(
+            f'SELECT rowid, snippet({self.table}, 0, %s, %s, %s, %s) '
+            f'FROM {self.table} WHERE {self.table} MATCH %s '
+            f'ORDER BY bm25({self.table}, 1.0, 0.5), rowid DESC '
+            f'LIMIT %s OFFSET %s',
+            [MARK_START, MARK_END, '…', SNIPPET_WORDS, match, limit,
+             offset],
+        )
+
+    def filter(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s',
+            [match],
+        ))
+
+    def _placeholders(self, values):
+        return ', '.join(['%s'] * len(values))
+
+    def _insert(self, where='', params=()):
+        self._execute(
+            f'INSERT INTO {self.table} (rowid, text, group_title) '
+            f'SELECT post.id, post.text, coalesce(grp.title, \'\') '
+            f'FROM posts_post post '
+            f'LEFT JOIN posts_group grp ON grp.id = post.group_id {where}',
+            params,
+        )
+
+    def index(self, posts):
+        post_ids = [post.pk for post in posts]
+        if not post_ids:
+            return
+        self.remove(post_ids)
+        self._insert(
+            f'WHERE post.id IN ({self._placeholders(post_ids)})', post_ids)
+
+    def remove(self, post_ids):
+        post_ids = list(post_ids)
+        if not post_ids:
+            return
+        self._execute(
+            f'DELETE FROM {self.table} '
+            f'WHERE rowid IN ({self._placeholders(post_ids)})',
+            post_ids,
+        )
+
+    def set_group_title(self, group_id, title):
+        self._execute(
+            f'UPDATE {self.table} SET group_title = %s WHERE rowid IN '
+            f'(SELECT id FROM posts_post WHERE group_id = %s)',
+            [title, group_id],
+        )
+
+    def rebuild(self):
+        self._execute(f'DELETE FROM {self.table}')
+        self._insert()
+        self._execute(
+            f'INSERT INTO {self.table} ({self.table}) VALUES (\'optimize\')')
+
+
+@lru_cache(maxsize=None)
+def _backend(path):
+    return import_string(path)()
+
+
+def get_backend():
+    return _backend(settings.SEARCH_BACKEND)
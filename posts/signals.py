@@ -0,0 +1,152 @@
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from .caching import (group_namespace, invalidate, invalidate_post,
+                      invalidate_profiles)
+from .counters import (change_comments_count, change_group_posts_count,
+                       change_user_counters, increase_user_counters)
+from .group_feed import forget_group, forget_headers, groups_changed
+from .models import Comment, Follow, Group, Post, User, UserCounters
+from .search import get_backend
+from .tasks import index_group_title, index_posts
+
+
+@receiver(post_save, sender=User)
+def create_user_counters(sender, instance, created, **kwargs):
+    if created:
+        UserCounters.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        increase_user_counters(instance.author_id, posts_count=1)
+
+
+@receiver(post_save, sender=Post)
+def bump_card_version(sender, instance, created, **kwargs):
+    if not created:
+        Post.objects.filter(pk=instance.pk).update(
+            card_version=F('card_version') + 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    change_user_counters(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        change_comments_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    change_comments_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        increase_user_counters(instance.author_id, followers_count=1)
+        increase_user_counters(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    change_user_counters(instance.author_id, followers_count=-1)
+    change_user_counters(instance.user_id, following_count=-1)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_group(sender, instance, **kwargs):
+    instance._previous_group_id = None
+    if instance.pk is not None:
+        instance._previous_group_id = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def count_group_posts(sender, instance, created, **kwargs):
+    previous = instance._previous_group_id
+    if not created and previous == instance.group_id:
+        return
+    change_group_posts_count(previous, -1)
+    change_group_posts_count(instance.group_id, 1)
+    groups_changed([previous, instance.group_id])
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_group_post(sender, instance, **kwargs):
+    change_group_posts_count(instance.group_id, -1)
+    groups_changed([instance.group_id])
+
+
+@receiver(post_save, sender=Post)
+def invalidate_saved_post_pages(sender, instance, **kwargs):
+    invalidate_post(instance, instance._previous_group_id)
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post_pages(sender, instance, **kwargs):
+    invalidate_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    post = Post.objects.filter(pk=instance.post_id).first()
+    if post is not None:
+        invalidate_post(post)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, instance, **kwargs):
+    invalidate_profiles(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_pages(sender, instance, **kwargs):
+    invalidate('index', 'hot', group_namespace(instance.slug))
+
+
+@receiver(pre_save, sender=Group)
+def forget_previous_header(sender, instance, **kwargs):
+    if instance.pk is not None:
+        forget_headers(*Group.objects.filter(pk=instance.pk).values_list(
+            'slug', flat=True))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def forget_group_caches(sender, instance, **kwargs):
+    forget_group(instance)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'text', 'group'} & set(update_fields):
+        index_posts.enqueue(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    index_posts.enqueue(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def reindex_group_title(sender, instance, created, **kwargs):
+    if not created:
+        index_group_title.enqueue(instance.pk)
+
+
+@receiver(pre_delete, sender=Group)
+def unindex_group_title(sender, instance, **kwargs):
+    # После удаления группы у постов обнулится group_id, и найти их
+    # будет нельзя, поэтому название стираем заранее.
+    get_backend().set_group_title(instance.pk, '')
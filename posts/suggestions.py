@@ -0,0 +1,19 @@
+"""Чтение рекомендаций «Кого почитать».
+
+Таблицу FollowSuggestion заполняет posts.recommendations, которому
+нужны numpy и scipy; страницам и проверкам планов запросов достаточно
+этого модуля.
+"""
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+
+from .models import Follow, FollowSuggestion
+
+
+def follow_suggestions(user):
+    """Лучшие рекомендации без авторов, на которых пользователь
+    подписался после пересчёта."""
+    followed = Follow.objects.filter(user=user, author=OuterRef('author'))
+    return FollowSuggestion.objects.filter(user=user).filter(
+        ~Exists(followed)).select_related('author').order_by(
+        '-score')[:settings.FOLLOW_SUGGESTIONS_SHOWN]
@@ -0,0 +1,331 @@
+"""Синтетические данные для замеров производительности.
+
+Набор воспроизводим по seed и описывается планом (Plan): сколько строк
+каждого вида создать и с какими распределениями. Популярность авторов
+и групп подчиняется степенному закону: у немногих авторов много
+подписчиков и постов, у большинства — единицы. Авторы пишут сериями
+постов подряд, а между сериями бывают долгие паузы.
+
+Строки создаются кусками по chunk_size через bulk_create мимо
+сигналов. Первичные ключи пользователей, групп и постов назначаются
+заранее, поэтому каждый кусок строится независимо от остальных, не
+держит в памяти весь набор и может выполняться в отдельном процессе.
+После загрузки счётчики, ленты подписок и поисковый индекс
+пересчитываются целиком.
+"""
+import io
+import math
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image
+
+from .counters import recount_groups, recount_posts, recount_users
+from .models import Comment, Follow, Group, Post, User, UserCounters
+from .search import get_backend
+from .timeline import rebuild_timelines
+
+BATCH_SIZE = 1000
+USERNAME = 'user{:08d}'
+WORDS = ('утро', 'город', 'кофе', 'дорога', 'книга', 'море', 'код',
+         'музыка', 'дождь', 'кот', 'лес', 'поезд', 'ужин', 'снег')
+# Перемешивает номера постов при выборе обсуждаемых: популярными
+# оказываются посты из разных месяцев, а не только самые старые.
+SCRAMBLE = 2654435761
+
+
+class Dataset:
+    """Сгенерированный набор и самые тяжёлые для страниц объекты."""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Позволяет задать значения полям с auto_now_add при bulk_create."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def power_law_index(rng, count, exponent):
+    """Номер от 0 до count - 1, где вероятность номера r убывает как
+    1 / (r + 1) ** exponent. Выбор обращает функцию распределения и не
+    хранит весов, поэтому годится для миллионов номеров."""
+    u = rng.random()
+    if exponent == 1:
+        value = count ** u
+    else:
+        power = 1 - exponent
+        value = ((count ** power - 1) * u + 1) ** (1 / power)
+    return min(count - 1, int(value) - 1)
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def make_images(count, rng):
+    storage = Post._meta.get_field('image').storage
+    names = []
+    for number in range(count):
+        color = tuple(rng.randrange(256) for _ in range(3))
+        content = io.BytesIO()
+        Image.new('RGB', (960, 540), color).save(content, 'PNG')
+        names.append(storage.save(f'posts/synthetic_{number}.png',
+                                  ContentFile(content.getvalue())))
+    return names
+
+
+def _next_pk(model):
+    last = model.objects.order_by('-pk').values_list('pk', flat=True)
+    return (last.first() or 0) + 1
+
+
+class Plan:
+    """Параметры набора и диапазоны ключей. Передаётся в процессы,
+    поэтому хранит только простые значения."""
+
+    def __init__(self, users=300, groups=10, posts=6000, comments=12000,
+                 follows=30, images=0.2, days=365, seed=1, exponent=1.1,
+                 burst=5, chunk_size=10000):
+        self.users = users
+        self.groups = groups
+        self.posts = posts
+        self.comments = comments
+        self.follows = follows
+        self.images = images
+        self.seed = seed
+        self.exponent = exponent
+        self.burst = burst
+        self.chunk_size = chunk_size
+        self.now = timezone.now()
+        self.span = timedelta(days=days)
+        self.user_base = _next_pk(User)
+        self.group_base = _next_pk(Group)
+        self.post_base = _next_pk(Post)
+        self.image_names = []
+        self.scramble = SCRAMBLE
+        while math.gcd(self.scramble, max(posts, 1)) != 1:
+            self.scramble += 1
+
+    def rng(self, kind, start):
+        return random.Random(f'{self.seed}:{kind}:{start}')
+
+    def chunks(self, kind):
+        total = {
+            'users': self.users,
+            'groups': self.groups,
+            'posts': self.posts,
+            'comments': self.comments,
+            # Подписки строятся по подписчикам.
+            'follows': self.users,
+        }[kind]
+        return [(kind, start, min(start + self.chunk_size, total))
+                for start in range(0, total, self.chunk_size)]
+
+    def author_id(self, rng):
+        return self.user_base + power_law_index(rng, self.users,
+                                                self.exponent)
+
+    def window(self, start, stop):
+        """Отрезок времени, на который приходятся посты с номерами
+        от start до stop: номера постов растут вместе с датой."""
+        begin = self.now - self.span
+        return (begin + self.span * start / self.posts,
+                begin + self.span * stop / self.posts)
+
+    def published_before(self, index):
+        """Момент, раньше которого опубликован пост с номером index."""
+        chunk = index // self.chunk_size
+        stop = min(self.posts, (chunk + 1) * self.chunk_size)
+        return self.window(0, stop)[1]
+
+
+def build_users(plan, start, stop):
+    ids = range(plan.user_base + start, plan.user_base + stop)
+    return [
+        (User, [User(pk=pk, username=USERNAME.format(pk), password='!')
+                for pk in ids]),
+        (UserCounters, [UserCounters(user_id=pk) for pk in ids]),
+    ]
+
+
+def build_groups(plan, start, stop):
+    rng = plan.rng('groups', start)
+    return [(Group, [
+        Group(pk=plan.group_base + index,
+              title=f'Группа {plan.group_base + index}',
+              slug=f'group-{plan.group_base + index}',
+              description=sentence(rng))
+        for index in range(start, stop)
+    ])]
+
+
+def post_dates(plan, rng, start, stop):
+    """Даты серий постов: внутри серии посты идут с разницей в минуты,
+    между сериями — долгие паузы. Растянуты на окно куска."""
+    gaps = []
+    while len(gaps) < stop - start:
+        gaps.append(rng.expovariate(1 / (plan.burst * 60)))
+        series = 1 + int(rng.expovariate(1 / plan.burst))
+        gaps.extend(rng.expovariate(1 / 300) for _ in range(series - 1))
+    gaps = gaps[:stop - start]
+    begin, end = plan.window(start, stop)
+    scale = (end - begin) / sum(gaps)
+    date = begin
+    for gap in gaps:
+        date += scale * gap
+        yield date
+
+
+def build_posts(plan, start, stop):
+    rng = plan.rng('posts', start)
+    posts = []
+    author_id, series_left = None, 0
+    for index, pub_date in zip(range(start, stop),
+                               post_dates(plan, rng, start, stop)):
+        if not series_left:
+            author_id = plan.author_id(rng)
+            series_left = 1 + int(rng.expovariate(1 / plan.burst))
+        series_left -= 1
+        post = Post(
+            pk=plan.post_base + index,
+            text=sentence(rng, rng.randint(3, 40)),
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        if plan.groups and rng.random() < 0.7:
+            post.group_id = plan.group_base + power_law_index(
+                rng, plan.groups, plan.exponent)
+        if plan.image_names and rng.random() < plan.images:
+            post.image = rng.choice(plan.image_names)
+        posts.append(post)
+    return [(Post, posts)]
+
+
+def build_comments(plan, start, stop):
+    rng = plan.rng('comments', start)
+    comments = []
+    for _ in range(start, stop):
+        # Обсуждают в основном немногие посты.
+        rank = power_law_index(rng, plan.posts, plan.exponent)
+        index = rank * plan.scramble % plan.posts
+        delay = timedelta(minutes=rng.randrange(60 * 24 * 7))
+        comments.append(Comment(
+            post_id=plan.post_base + index,
+            author_id=plan.user_base + rng.randrange(plan.users),
+            text=sentence(rng, rng.randint(2, 15)),
+            created=min(plan.published_before(index) + delay, plan.now),
+        ))
+    return [(Comment, comments)]
+
+
+def build_follows(plan, start, stop):
+    rng = plan.rng('follows', start)
+    follows = []
+    most = plan.users // 2
+    for index in range(start, stop):
+        user_id = plan.user_base + index
+        # Число подписок тоже с длинным хвостом, в среднем plan.follows.
+        count = int(rng.paretovariate(1.5) * plan.follows / 3)
+        count = min(max(count, 1), most)
+        authors = set()
+        while len(authors) < count:
+            author_id = plan.author_id(rng)
+            if author_id != user_id:
+                authors.add(author_id)
+        follows.extend(Follow(user_id=user_id, author_id=author_id)
+                       for author_id in sorted(authors))
+    return [(Follow, follows)]
+
+
+BUILDERS = {
+    'users': build_users,
+    'groups': build_groups,
+    'posts': build_posts,
+    'comments': build_comments,
+    'follows': build_follows,
+}
+# Куски одной фазы не зависят друг от друга, фазы идут по порядку.
+PHASES = (('users', 'groups'), ('posts',), ('comments', 'follows'))
+
+
+def create_chunk(plan, kind, start, stop):
+    # Строки готовятся до транзакции: пока кусок строится, другие
+    # процессы могут писать.
+    batches = BUILDERS[kind](plan, start, stop)
+    dates = (Post._meta.get_field('pub_date'),
+             Comment._meta.get_field('created'))
+    with explicit_dates(*dates), transaction.atomic():
+        for model, objects in batches:
+            model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+    _, objects = batches[0]
+    return kind, len(objects)
+
+
+def reset_sequences():
+    """Ключи назначены вручную: для баз с последовательностями их нужно
+    передвинуть за последнюю строку."""
+    statements = connection.ops.sequence_reset_sql(
+        no_style(), [User, Group, Post])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def rebuild_derived(plan, timelines=True, search=True):
+    recount_users(UserCounters.objects.filter(user_id__gte=plan.user_base))
+    recount_posts(Post.objects.filter(pk__gte=plan.post_base))
+    recount_groups(Group.objects.filter(pk__gte=plan.group_base))
+    if timelines:
+        rebuild_timelines()
+    if search:
+        get_backend().rebuild()
+
+
+def prepare(plan):
+    if plan.images and plan.posts:
+        plan.image_names = make_images(5, plan.rng('images', 0))
+
+
+def generate(users=300, groups=10, posts=6000, comments=12000, follows=30,
+             images=0.2, days=365, seed=1):
+    """Создаёт набор в текущем процессе и возвращает самые тяжёлые для
+    страниц объекты."""
+    plan = Plan(users=users, groups=groups, posts=posts, comments=comments,
+                follows=follows, images=images, days=days, seed=seed)
+    prepare(plan)
+    for phase in PHASES:
+        for kind in phase:
+            for _, start, stop in plan.chunks(kind):
+                create_chunk(plan, kind, start, stop)
+    reset_sequences()
+    rebuild_derived(plan)
+
+    created_users = User.objects.filter(pk__gte=plan.user_base)
+    return Dataset(
+        reader=created_users.order_by('-counters__following_count').first(),
+        author=created_users.order_by('-counters__posts_count').first(),
+        group=Group.objects.filter(pk=plan.group_base).first(),
+        post=Post.objects.select_related('author').filter(
+            pk__gte=plan.post_base).order_by('-comments_count').first(),
+        counts={
+            'users': users,
+            'groups': groups,
+            'posts': posts,
+            'comments': comments,
+            'follows': Follow.objects.filter(
+                user_id__gte=plan.user_base).count(),
+        },
+    )
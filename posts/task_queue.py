@@ -0,0 +1,131 @@
+"""Очередь фоновых задач в базе данных.
+
+Задача — функция, объявленная декоратором @task. Вызов
+fan_out.enqueue(post.pk) ничего не выполняет в запросе: после коммита
+транзакции в таблицу Task добавляется строка с именем функции и
+аргументами в JSON, а если транзакция откатилась, задачи нет. Команда
+run_tasks берёт задачи по убыванию приоритета, а при равном приоритете
+— в порядке постановки.
+
+Свободная задача захватывается условным UPDATE: run_at переносится на
+TASK_LEASE_SECONDS вперёд, и другой обработчик её уже не возьмёт. Если
+обработчик умер, аренда истекает и задача выполняется снова. Упавшая
+задача повторяется через TASK_RETRY_DELAY * 2**(попытка - 1) секунд,
+после max_attempts попыток run_at очищается и ошибка остаётся в
+last_error. Строка задачи удаляется после её выполнения, и если
+обработчик упадёт между ними, задача выполнится ещё раз. Поэтому задачи
+должны быть идемпотентны и получать идентификаторы, а не объекты: к
+выполнению строка может измениться или пропасть.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+class TaskFunction:
+    def __init__(self, func, priority, max_attempts):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args):
+        return self.func(*args)
+
+    def enqueue(self, *args, priority=None):
+        """Ставит задачу в очередь после коммита текущей транзакции."""
+        if priority is None:
+            priority = self.priority
+        transaction.on_commit(lambda: Task.objects.create(
+            name=self.name, args=list(args), priority=priority))
+
+
+def task(priority=0, max_attempts=None):
+    """Регистрирует функцию как фоновую задачу. Чем больше priority,
+    тем раньше задача выполняется."""
+    def decorator(func):
+        task_function = TaskFunction(
+            func, priority, max_attempts or settings.TASK_MAX_ATTEMPTS)
+        _registry[task_function.name] = task_function
+        return task_function
+    return decorator
+
+
+def claim():
+    """Захватывает следующую готовую задачу или возвращает None."""
+    while True:
+        now = timezone.now()
+        candidate = Task.objects.filter(run_at__lte=now).order_by(
+            '-priority', 'run_at', 'id').values_list('id', 'run_at').first()
+        if candidate is None:
+            return None
+        task_id, run_at = candidate
+        claimed = Task.objects.filter(pk=task_id, run_at=run_at).update(
+            run_at=now + timedelta(seconds=settings.TASK_LEASE_SECONDS),
+            attempts=F('attempts') + 1,
+        )
+        # Задачу между чтением и UPDATE мог захватить другой обработчик.
+        if claimed:
+            return Task.objects.get(pk=task_id)
+
+
+def _fail(task_row, task_function, error):
+    max_attempts = (task_function.max_attempts if task_function
+                    else settings.TASK_MAX_ATTEMPTS)
+    if task_row.attempts >= max_attempts:
+        run_at = None
+        logger.error('Задача %s (%s) не выполнена за %s попыток',
+                     task_row.name, task_row.pk, task_row.attempts)
+    else:
+        delay = settings.TASK_RETRY_DELAY * 2 ** (task_row.attempts - 1)
+        run_at = timezone.now() + timedelta(seconds=delay)
+    Task.objects.filter(pk=task_row.pk).update(
+        run_at=run_at, last_error=error)
+
+
+def execute(task_row):
+    """Выполняет захваченную задачу и возвращает True, если она
+    выполнена.
+
+    Задача выполняется вне транзакции: с transaction_mode IMMEDIATE
+    транзакция держала бы блокировку записи SQLite всё время работы
+    задачи, например пока готовится миниатюра, и публикации ждали бы её.
+    Задача, которой нужна атомарность, сама открывает transaction.atomic().
+    """
+    task_function = _registry.get(task_row.name)
+    if task_function is None:
+        _fail(task_row, None, f'Неизвестная задача {task_row.name}')
+        return False
+    try:
+        task_function(*task_row.args)
+    except Exception:
+        logger.exception('Задача %s (%s) упала', task_row.name, task_row.pk)
+        _fail(task_row, task_function, traceback.format_exc())
+        return False
+    Task.objects.filter(pk=task_row.pk).delete()
+    return True
+
+
+def run_pending(limit=None):
+    """Выполняет готовые задачи, пока они есть (не больше limit), и
+    возвращает число обработанных."""
+    processed = 0
+    while limit is None or processed < limit:
+        task_row = claim()
+        if task_row is None:
+            break
+        execute(task_row)
+        processed += 1
+    return processed
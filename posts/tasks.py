@@ -0,0 +1,64 @@
+"""Фоновые задачи, которые запись поста ставит в очередь
+posts.task_queue вместо того, чтобы выполнять их в запросе."""
+from django.db import transaction
+
+from .models import Group, Post
+from .search import get_backend
+from .task_queue import task
+from .thumbnails import generate_thumbnails
+from .timeline import backfill, catch_up_followers, fan_out_posts
+
+# Подписчики ждут пост в ленте раньше, чем миниатюру или поиск.
+FAN_OUT_PRIORITY = 20
+THUMBNAILS_PRIORITY = 10
+SEARCH_PRIORITY = 0
+
+
+@task(priority=FAN_OUT_PRIORITY)
+def fan_out(*post_ids):
+    """Раскладывает посты по лентам подписчиков их авторов."""
+    by_author = {}
+    for post in Post.objects.select_related('author').filter(
+            pk__in=post_ids):
+        by_author.setdefault(post.author, []).append(post)
+    for author, posts in by_author.items():
+        fan_out_posts(author, posts)
+
+
+@task(priority=FAN_OUT_PRIORITY)
+def backfill_timeline(user_id, *author_ids):
+    """Докладывает в ленту посты авторов, на которых подписались."""
+    backfill(user_id, author_ids)
+
+
+@task(priority=FAN_OUT_PRIORITY)
+def catch_up(author_id):
+    catch_up_followers(author_id)
+
+
+@task(priority=THUMBNAILS_PRIORITY)
+def make_thumbnails(post_id):
+    generate_thumbnails(post_id)
+
+
+def schedule_thumbnails(post):
+    if post.image:
+        make_thumbnails.enqueue(post.pk)
+
+
+@task(priority=SEARCH_PRIORITY)
+def index_posts(*post_ids):
+    """Переиндексирует посты; удалённые посты пропадают из индекса."""
+    backend = get_backend()
+    # Поиск не должен видеть пост между удалением и вставкой.
+    with transaction.atomic():
+        backend.remove(post_ids)
+        backend.index(Post.objects.filter(pk__in=post_ids).only('pk'))
+
+
+@task(priority=SEARCH_PRIORITY)
+def index_group_title(group_id):
+    title = Group.objects.filter(pk=group_id).values_list(
+        'title', flat=True).first()
+    if title is not None:
+        get_backend().set_group_title(group_id, title)
@@ -0,0 +1,149 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from posts.management.commands import check_query_plans
+from posts.models import Comment, Follow, Group, Post, User, UserCounters
+from posts.search import get_backend
+from posts.tests.utils import SMALL_GIF, use_file_database
+
+
+class RecountCountersTest(TestCase):
+    def setUp(self):
+        self.user_igor = User.objects.create_user(username='Igor')
+        self.user_olga = User.objects.create_user(username='Olga')
+
+        self.test_post = Post.objects.create(
+            text='Test post',
+            author=self.user_igor,
+        )
+        Comment.objects.create(
+            post=self.test_post,
+            author=self.user_olga,
+            text='Test comment',
+        )
+        Follow.objects.create(user=self.user_olga, author=self.user_igor)
+
+    def test_recount_repairs_drift(self):
+        """Команда пересчёта исправляет разошедшиеся счётчики."""
+        UserCounters.objects.update(
+            followers_count=7, following_count=7, posts_count=7)
+        Post.objects.update(comments_count=7)
+        UserCounters.objects.filter(user=self.user_olga).delete()
+
+        call_command('recount_counters', stdout=StringIO())
+
+        expected = {
+            self.user_igor.pk: (1, 0, 1),
+            self.user_olga.pk: (0, 1, 0),
+        }
+        actual = {
+            counters.user_id: (counters.followers_count,
+                               counters.following_count,
+                               counters.posts_count)
+            for counters in UserCounters.objects.all()
+        }
+        msg = 'Команда не исправляет счётчики пользователей'
+        self.assertEqual(actual, expected, msg)
+
+        self.test_post.refresh_from_db()
+        msg = 'Команда не исправляет счётчик комментариев'
+        self.assertEqual(self.test_post.comments_count, 1, msg)
+
+    def test_recount_group_posts(self):
+        """Команда исправляет число записей группы."""
+        group = Group.objects.create(title='Группа', slug='group',
+                                     description='Описание')
+        Post.objects.filter(pk=self.test_post.pk).update(group=group)
+
+        call_command('recount_counters', stdout=StringIO())
+
+        group.refresh_from_db()
+        msg = 'Команда не исправляет счётчик записей группы'
+        self.assertEqual(group.posts_count, 1, msg)
+
+    def test_dry_run_changes_nothing(self):
+        """С --dry-run команда только сообщает о расхождениях."""
+        Post.objects.update(comments_count=7)
+
+        out = StringIO()
+        call_command('recount_counters', dry_run=True, stdout=out)
+
+        self.test_post.refresh_from_db()
+        msg = 'Команда с --dry-run не должна менять счётчики'
+        self.assertEqual(self.test_post.comments_count, 7, msg)
+        self.assertIn('Постов с расхождениями: 1', out.getvalue(), msg)
+
+
+class CheckQueryPlansTest(TestCase):
+    def test_view_queries_use_indexes(self):
+        """Запросы страниц используют индексы без полного сканирования."""
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('Все планы используют индексы', out.getvalue())
+
+    def test_filtered_index_scan_fails(self):
+        """Обход индекса целиком с фильтром не проходит проверку."""
+        queries = {'unlisted': Post.objects.filter(
+            text='Пост').order_by('-pub_date')[:10]}
+        with patch.object(check_query_plans, 'view_queries',
+                          return_value=queries):
+            with self.assertRaisesMessage(CommandError, 'unlisted: SCAN'):
+                call_command('check_query_plans', stdout=StringIO())
+
+
+class WarmThumbnailsTest(TransactionTestCase):
+    def setUp(self):
+        use_file_database(self)
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+
+        user = User.objects.create_user(username='Igor')
+        self.posts = [
+            Post.objects.create(
+                text='Test post',
+                author=user,
+                image=SimpleUploadedFile('small.gif', SMALL_GIF,
+                                         content_type='image/gif'),
+            )
+            for _ in range(3)
+        ]
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_warm_thumbnails(self):
+        """Команда готовит миниатюры для существующих постов."""
+        call_command('warm_thumbnails', workers=2, stdout=StringIO())
+
+        for post in self.posts:
+            with self.subTest(post=post.pk):
+                post.refresh_from_db()
+                msg = 'Команда не подготовила миниатюру поста'
+                self.assertTrue(post.image_thumbnail, msg)
+                self.assertTrue(post.image_thumbnail.storage.exists(
+                    post.image_thumbnail.name), msg)
+
+
+class RebuildSearchIndexTest(TestCase):
+    def test_rebuild(self):
+        """Пересборка возвращает в индекс посты, изменённые в обход
+        сигналов."""
+        user = User.objects.create_user(username='Igor')
+        post = Post.objects.create(text='Старый текст', author=user)
+        Post.objects.filter(pk=post.pk).update(text='Новый текст')
+        backend = get_backend()
+        self.assertEqual(backend.count('новый'), 0)
+
+        call_command('rebuild_search_index', stdout=StringIO())
+
+        msg = 'Команда не пересобирает поисковый индекс'
+        self.assertEqual(backend.count('новый'), 1, msg)
+        self.assertEqual(backend.count('старый'), 0, msg)
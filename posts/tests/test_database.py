@@ -0,0 +1,283 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+from io import StringIO
+
+from asgiref.sync import async_to_sync
+
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, router
+from django.http import HttpResponse
+from django.test import (Client, RequestFactory, SimpleTestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import reverse
+
+from posts.caching import cache_anonymous_page
+from posts.concurrency import gather_queries
+from posts.models import Follow, Post, User
+from posts.tests.utils import use_file_database
+from yatube.backends.sqlite3.base import DatabaseWrapper
+from yatube.replicas import ReplicaMiddleware
+
+
+class SQLiteBackendTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def wrapper(self, **options):
+        settings_dict = dict(connection.settings_dict)
+        settings_dict['NAME'] = os.path.join(self.directory, 'db.sqlite3')
+        settings_dict['OPTIONS'] = {
+            'timeout': 0,
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {'journal_mode': 'wal', 'synchronous': 'normal'},
+            **options,
+        }
+        settings_dict['CONN_HEALTH_CHECKS'] = True
+        wrapper = DatabaseWrapper(settings_dict)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        """Новое соединение получает PRAGMA из настроек."""
+        wrapper = self.wrapper()
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        # synchronous=NORMAL
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+
+    def test_immediate_transactions(self):
+        """Транзакция сразу берёт блокировку записи, и второй писатель
+        получает отказ при входе в транзакцию, а не посреди неё."""
+        first, second = self.wrapper(), self.wrapper()
+        with first.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id integer)')
+
+        first._start_transaction_under_autocommit()
+        self.assertTrue(first.connection.in_transaction)
+        with self.assertRaisesMessage(OperationalError, 'locked'):
+            second.ensure_connection()
+            second._start_transaction_under_autocommit()
+        first.connection.rollback()
+
+    def test_health_check(self):
+        """Сломанное соединение заменяется при первом обращении к базе в
+        следующем запросе."""
+        wrapper = self.wrapper()
+        wrapper.ensure_connection()
+        broken = wrapper.connection
+        broken.close()
+
+        wrapper.close_if_unusable_or_obsolete()
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertIsNot(wrapper.connection, broken)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(SimpleTestCase):
+    def request(self, url, method='get', write=False, model=Post,
+                **cookies):
+        """Пропускает запрос через ReplicaMiddleware и возвращает ответ и
+        базу, с которой читала бы страница."""
+        routes = []
+
+        def view(request):
+            routes.append(router.db_for_read(model))
+            if write:
+                router.db_for_write(model)
+                routes.append(router.db_for_read(model))
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)(url)
+        request.COOKIES.update(cookies)
+        response = ReplicaMiddleware(view)(request)
+        return response, routes
+
+    def test_read_views_use_replica(self):
+        """Ленты читают с реплики, остальные страницы — с основной
+        базы."""
+        username = 'Igor'
+        cases = {
+            reverse('index'): 'replica',
+            reverse('group', args=['group']): 'replica',
+            reverse('profile', args=[username]): 'replica',
+            reverse('post', args=[username, 1]): 'replica',
+            reverse('follow_index'): 'replica',
+            reverse('new_post'): 'default',
+            reverse('post_edit', args=[username, 1]): 'default',
+            reverse('search'): 'default',
+        }
+        for url, database in cases.items():
+            with self.subTest(url=url):
+                _, routes = self.request(url)
+                self.assertEqual(routes, [database])
+        self.assertEqual(router.db_for_read(Post), 'default',
+                         'Вне запроса чтение идёт не с основной базы')
+
+    def test_write_pins_primary(self):
+        """После записи запрос и следующие несколько секунд чтения
+        пользователя идут на основную базу."""
+        url = reverse('add_comment', args=['Igor', 1])
+        response, routes = self.request(url, method='post', write=True)
+        self.assertEqual(routes, ['default', 'default'])
+        cookie = response.cookies['primary_pin']
+
+        _, routes = self.request(reverse('index'),
+                                 primary_pin=cookie.value)
+        msg = 'Только что писавший пользователь читает с реплики'
+        self.assertEqual(routes, ['default'], msg)
+
+        _, routes = self.request(reverse('index'), primary_pin='0')
+        self.assertEqual(routes, ['replica'])
+
+    def test_write_inside_read_view(self):
+        """Запись на странице ленты уходит на основную базу, и дальше
+        страница читает оттуда же."""
+        response, routes = self.request(reverse('index'), write=True)
+        self.assertEqual(routes, ['replica', 'default'])
+        self.assertIn('primary_pin', response.cookies)
+
+    def test_async_request(self):
+        """Под ASGI middleware маршрутизирует так же, не уходя в поток."""
+        routes = []
+
+        async def view(request):
+            routes.append(router.db_for_read(Post))
+            router.db_for_write(Post)
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(view)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(
+            RequestFactory().get(reverse('index')))
+        self.assertEqual(routes, ['replica'])
+        self.assertIn('primary_pin', response.cookies)
+
+    def test_cached_pages_read_primary(self):
+        """Страница для кэша гостей собирается с основной базы, а
+        пользователю — с реплики."""
+        routes = []
+
+        @cache_anonymous_page(lambda: 'index')
+        def view(request):
+            routes.append(router.db_for_read(Post))
+            return HttpResponse()
+
+        cache.clear()
+        for user in (AnonymousUser(), User(username='Igor')):
+            request = RequestFactory().get(reverse('index'))
+            request.user = user
+            ReplicaMiddleware(view)(request)
+        msg = 'Страница для кэша собрана с реплики'
+        self.assertEqual(routes, ['default', 'replica'], msg)
+
+    def test_sessions_use_primary(self):
+        """Сессии читаются с основной базы даже на страницах лент."""
+        _, routes = self.request(reverse('index'), model=Session)
+        self.assertEqual(routes, ['default'])
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], TIMELINE_FAN_OUT_LIMIT=0)
+class ReplicaDatabaseTest(TransactionTestCase):
+    """Основная тестовая база и реплика в отдельном файле SQLite."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        # Как в настройках: реплика не открывает BEGIN IMMEDIATE.
+        options = dict(connections.databases['default']['OPTIONS'])
+        del options['transaction_mode']
+        connections.databases['replica'] = {
+            **connections.databases['default'],
+            'NAME': os.path.join(directory, 'replica.sqlite3'),
+            'OPTIONS': options,
+        }
+        self.addCleanup(self.remove_replica)
+
+        self.user_igor = User.objects.create_user(username='Igor')
+        self.user_olga = User.objects.create_user(username='Olga')
+        Follow.objects.create(user=self.user_igor, author=self.user_olga)
+        self.post = Post.objects.create(text='На реплике',
+                                        author=self.user_olga)
+        call_command('sync_replicas', stdout=StringIO())
+        Post.objects.create(text='Только на основной', author=self.user_olga)
+
+        self.client = Client()
+        self.client.force_login(self.user_igor)
+
+    def remove_replica(self):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.databases['replica']
+
+    def test_feeds_read_replica(self):
+        """Ленты читают с реплики и не пишут, поэтому пользователь не
+        закрепляется за основной базой."""
+        for url in (reverse('index'), reverse('follow_index')):
+            for _ in range(3):
+                with self.subTest(url=url):
+                    response = self.client.get(url)
+                    self.assertEqual(list(response.context['page']),
+                                     [self.post])
+                    self.assertNotIn('primary_pin', response.cookies)
+
+    def test_guest_pages_cached_from_primary(self):
+        """Кэш страниц гостей не заполняется с отставшей реплики."""
+        cache.clear()
+        for _ in range(2):
+            response = Client().get(reverse('index'))
+            self.assertContains(response, 'Только на основной')
+
+    def test_write_pins_primary(self):
+        """После записи пользователь читает свой пост с основной базы."""
+        response = self.client.post(reverse('new_post'),
+                                    data={'text': 'Новый пост'})
+        self.assertIn('primary_pin', response.cookies)
+
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['page'][0].text, 'Новый пост')
+
+
+class GatherQueriesTest(TransactionTestCase):
+    """Основная база в файле, поэтому gather_queries выполняет функции
+    в разных потоках с разными соединениями, как в работе."""
+
+    def setUp(self):
+        use_file_database(self)
+        self.user = User.objects.create_user(username='Olga')
+        self.post = Post.objects.create(text='Пост', author=self.user)
+
+    def test_functions_run_concurrently(self):
+        """Функции выполняются одновременно, каждая в своём потоке."""
+        # Барьер пропустит функции, только если обе ждут у него сразу.
+        barrier = threading.Barrier(2, timeout=5)
+
+        def count(model):
+            def query():
+                barrier.wait()
+                return threading.get_ident(), model.objects.count()
+            return query
+
+        (first, posts), (second, users) = async_to_sync(gather_queries)(
+            count(Post), count(User))
+        self.assertNotEqual(first, second)
+        self.assertEqual((posts, users), (1, 1))
+
+    def test_profile(self):
+        """Страница, собранная из параллельных запросов, верна."""
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('profile', args=['Olga']))
+        self.assertEqual(response.context['author'], self.user)
+        self.assertEqual(list(response.context['page']), [self.post])
+        self.assertFalse(response.context['is_follow'])
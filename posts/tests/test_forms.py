@@ -1,9 +1,14 @@
+import shutil
+import tempfile
+from io import BytesIO
+
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from posts.forms import Comment, Post
-from posts.models import Group, User
+from posts.models import Group, Task, User
 
 
 class TestCommentForm(TestCase):
@@ -171,3 +176,69 @@ class TestPostForm(TestCase):
         expected = reverse('post', args=[self.user_igor, self.test_post.id])
         msg = 'Форма редактирования поста с фото не редиректит на главную'
         self.assertRedirects(response, expected, msg_prefix=msg)
+
+
+@override_settings(IMAGE_MAX_DIMENSION=100, IMAGE_MAX_PIXELS=100 * 1000)
+class TestPostImageUpload(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+
+        self.user_igor = User.objects.create_user(username='Igor')
+        self.user_igor_client = Client()
+        self.user_igor_client.force_login(self.user_igor)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload(self, size, url=None, text='Пост с фото'):
+        content = BytesIO()
+        Image.new('RGB', size, 'red').save(content, 'PNG')
+        uploaded = SimpleUploadedFile(
+            name='big.png',
+            content=content.getvalue(),
+            content_type='image/png',
+        )
+        return self.user_igor_client.post(
+            url or reverse('new_post'),
+            data={'text': text, 'image': uploaded},
+        )
+
+    def test_big_image_downscaled(self):
+        """Крупная картинка сохраняется уменьшенной копией."""
+        self.upload((400, 40))
+
+        post = Post.objects.get()
+        with Image.open(post.image) as image:
+            actual = image.size
+        msg = 'Крупная картинка не уменьшается при загрузке'
+        self.assertEqual(actual, (100, 10), msg)
+
+    def test_too_many_pixels_rejected(self):
+        """Картинка со слишком большим разрешением не принимается."""
+        response = self.upload((1000, 1000))
+
+        msg = 'Форма принимает картинку со слишком большим разрешением'
+        self.assertFalse(Post.objects.exists(), msg)
+        self.assertFormError(response, 'form', 'image',
+                             'Слишком большое разрешение изображения.')
+
+    def test_thumbnails_only_for_new_image(self):
+        """Миниатюры пересоздаются, только если картинку заменили."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload((40, 40))
+        post = Post.objects.get()
+        thumbnails = Task.objects.filter(name='posts.tasks.make_thumbnails')
+        thumbnails.delete()
+        url = reverse('post_edit', args=[self.user_igor, post.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user_igor_client.post(url, data={'text': 'Новый текст'})
+        msg = 'Правка текста ставит задачу миниатюр'
+        self.assertFalse(thumbnails.exists(), msg)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload((50, 50), url=url, text='Новая картинка')
+        self.assertEqual(thumbnails.count(), 1)
@@ -0,0 +1,157 @@
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.test import AsyncClient, Client, TestCase
+from django.urls import reverse
+
+from posts.bulk import create_posts
+from posts.live import LIVE_PREFIX, live_application
+from posts.models import Follow, Group, Post, User
+from yatube.asgi import application
+
+
+class LiveFeedTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user_igor = User.objects.create_user(username='Igor')
+        self.user_olga = User.objects.create_user(username='Olga')
+        self.group = Group.objects.create(
+            title='Test Group',
+            slug='group',
+            description='Description',
+        )
+
+    async def connect(self, path, headers=()):
+        communicator = ApplicationCommunicator(live_application, {
+            'type': 'http',
+            'method': 'GET',
+            'path': path,
+            'headers': list(headers),
+        })
+        await communicator.send_input({'type': 'http.request'})
+        start = await communicator.receive_output()
+        if start['status'] == 200:
+            await communicator.receive_output()
+        return communicator, start['status']
+
+    async def receive_event(self, communicator):
+        message = await communicator.receive_output()
+        return message['body'].decode()
+
+    @sync_to_async
+    def post_as(self, user, url, data):
+        client = Client()
+        client.force_login(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(url, data=data)
+
+    async def disconnect(self, communicator):
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait()
+
+    async def test_new_post_card(self):
+        """Новый пост приходит в потоки общей ленты и ленты группы
+        карточкой со счётчиком новых записей."""
+        index, _ = await self.connect(LIVE_PREFIX + 'index/')
+        group, _ = await self.connect(LIVE_PREFIX + 'group/group/')
+        other, _ = await self.connect(LIVE_PREFIX + 'group/other/')
+
+        await self.post_as(
+            self.user_igor,
+            reverse('new_post'),
+            {'text': 'Живой пост', 'group': self.group.id},
+        )
+
+        for communicator in (index, group):
+            body = await self.receive_event(communicator)
+            self.assertIn('event: post', body)
+            self.assertIn('Живой пост', body)
+            self.assertIn('event: new_posts\ndata: {"count": 1}', body)
+        msg = 'Пост приходит в поток чужой группы'
+        self.assertTrue(await other.receive_nothing(), msg)
+
+        for communicator in (index, group, other):
+            await self.disconnect(communicator)
+
+    async def test_bulk_posts(self):
+        """Посты, созданные пачкой, тоже приходят в открытые потоки."""
+        index, _ = await self.connect(LIVE_PREFIX + 'index/')
+
+        @sync_to_async
+        def create():
+            with self.captureOnCommitCallbacks(execute=True):
+                create_posts(self.user_igor, [Post(text='Пачка 1'),
+                                              Post(text='Пачка 2')])
+
+        await create()
+        bodies = [await self.receive_event(index) for _ in range(2)]
+        for text in ('Пачка 1', 'Пачка 2'):
+            self.assertTrue(any(text in body for body in bodies))
+        await self.disconnect(index)
+
+    async def test_follow_stream(self):
+        """Поток подписок доступен только после входа и получает новое
+        число комментариев постов избранных авторов."""
+        _, status = await self.connect(LIVE_PREFIX + 'follow/')
+        self.assertEqual(status, 404)
+
+        post = await sync_to_async(Post.objects.create)(
+            text='Пост', author=self.user_igor)
+        await sync_to_async(Follow.objects.create)(
+            user=self.user_olga, author=self.user_igor)
+        session = SessionStore()
+        session['_auth_user_id'] = str(self.user_olga.pk)
+        session['_auth_user_backend'] = (
+            'django.contrib.auth.backends.ModelBackend')
+        session['_auth_user_hash'] = (
+            self.user_olga.get_session_auth_hash())
+        await sync_to_async(session.save)()
+        cookie = f'sessionid={session.session_key}'.encode()
+        follow, status = await self.connect(
+            LIVE_PREFIX + 'follow/', headers=[(b'cookie', cookie)])
+        self.assertEqual(status, 200)
+
+        await self.post_as(
+            self.user_olga,
+            reverse('add_comment', args=['Igor', post.id]),
+            {'text': 'Комментарий'},
+        )
+
+        body = await self.receive_event(follow)
+        self.assertIn('event: update', body)
+        self.assertIn(f'"id": {post.id}, "comments_count": 1', body)
+        await self.disconnect(follow)
+
+    def test_stream_only_under_asgi(self):
+        """Страница подключает поток, только если её отдал ASGI-сервер:
+        под WSGI адрес потока попал бы в обычные view."""
+        url = reverse('follow_index')
+        stream = LIVE_PREFIX + 'follow/'
+        client = Client()
+        client.force_login(self.user_igor)
+        self.assertNotContains(client.get(url), stream)
+
+        async_client = AsyncClient()
+        async_client.force_login(self.user_igor)
+
+        async def get():
+            return await async_client.get(url)
+
+        self.assertContains(async_to_sync(get)(), stream)
+
+    async def test_user_named_live(self):
+        """Профиль пользователя live под ASGI открывает Django, а не
+        поток."""
+        await sync_to_async(User.objects.create_user)(username='live')
+        communicator = ApplicationCommunicator(application, {
+            'type': 'http',
+            'method': 'GET',
+            'path': '/live/',
+            'query_string': b'',
+            'headers': [],
+        })
+        await communicator.send_input({'type': 'http.request'})
+        start = await communicator.receive_output()
+        self.assertEqual(start['status'], 200)
+        await communicator.wait()
@@ -0,0 +1,194 @@
+import logging
+import random
+import re
+import shutil
+import tempfile
+from collections import Counter
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import benchmark, synthetic
+from posts.models import Comment, Follow, Post, TimelineEntry, User
+
+
+class PerformanceMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='Igor')
+        Post.objects.create(text='Пост', author=self.user)
+
+    def timing(self, response):
+        timing = {}
+        for part in response['Server-Timing'].split(', '):
+            name, _, description = part.partition(';')
+            timing[name] = description
+        return timing
+
+    def numbers(self, description):
+        return [int(number)
+                for number in re.findall(r'\b(\d+) \w+', description)]
+
+    @override_settings(SERVER_TIMING=True)
+    def test_server_timing(self):
+        """Ответ несёт замеры базы, шаблонов и кэша."""
+        url = reverse('profile', args=[self.user.username])
+        timing = self.timing(self.client.get(url))
+
+        self.assertEqual(set(timing), {'total', 'db', 'tpl', 'cache'})
+        self.assertGreater(self.numbers(timing['db'])[0], 0)
+        self.assertNotEqual(timing['tpl'], 'dur=0.0')
+        hits, misses = self.numbers(timing['cache'])
+        self.assertGreater(misses, 0)
+
+        timing = self.timing(self.client.get(url))
+        msg = 'Страница из кэша не считается попаданием'
+        self.assertGreater(self.numbers(timing['cache'])[0], hits, msg)
+        self.assertEqual(self.numbers(timing['db']), [0])
+
+    @override_settings(SERVER_TIMING=True)
+    async def test_async_request(self):
+        """Под ASGI цепочка middleware не уходит в потоки, а запросы к
+        базе из потоков view попадают в замеры."""
+        with override_settings(DEBUG=True), \
+                self.assertLogs('django.request', 'DEBUG') as logs:
+            ASGIHandler()
+            logging.getLogger('django.request').debug('Цепочка собрана')
+        adapted = [line for line in logs.output if 'adapted' in line]
+        self.assertEqual(adapted, [])
+
+        url = reverse('profile', args=[self.user.username])
+        timing = self.timing(await self.async_client.get(url))
+        self.assertGreater(self.numbers(timing['db'])[0], 0)
+
+    def test_server_timing_disabled(self):
+        """Без SERVER_TIMING замеры не видны клиентам."""
+        response = self.client.get(reverse('index'))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics(self):
+        """/metrics/ отдаёт накопленные замеры по страницам."""
+        self.client.get(reverse('index'))
+        response = self.client.get(reverse('metrics'),
+                                   HTTP_AUTHORIZATION='Bearer secret')
+
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn(
+            'yatube_requests_total{view="index",method="GET",status="200"}',
+            body)
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="index"}', body)
+        self.assertIn('yatube_db_queries_total{view="index"}', body)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_forbidden(self):
+        """Метрики не видны с посторонних адресов и без токена."""
+        cases = {
+            'чужой адрес': {'REMOTE_ADDR': '10.0.0.1',
+                            'HTTP_AUTHORIZATION': 'Bearer secret'},
+            'без токена': {},
+            'чужой токен': {'HTTP_AUTHORIZATION': 'Bearer другой'},
+        }
+        for case, headers in cases.items():
+            with self.subTest(case=case):
+                response = self.client.get(reverse('metrics'), **headers)
+                self.assertEqual(response.status_code, 404)
+
+        with override_settings(METRICS_TOKEN=''):
+            response = self.client.get(reverse('metrics'),
+                                       HTTP_AUTHORIZATION='Bearer ')
+        msg = 'Метрики открыты, когда токен не задан'
+        self.assertEqual(response.status_code, 404, msg)
+
+    @override_settings(SLOW_REQUEST_SECONDS=0)
+    def test_slow_request_log(self):
+        """Медленный запрос пишется в лог со списком SQL."""
+        with self.assertLogs('yatube.performance', 'WARNING') as logs:
+            self.client.get(reverse('index'))
+        self.assertIn('posts_post', logs.output[0])
+
+
+class BenchmarkTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_synthetic_data(self):
+        """Набор воспроизводим по seed, а счётчики и ленты согласованы с
+        данными."""
+        dataset = synthetic.generate(users=30, groups=3, posts=200,
+                                     comments=300, follows=5, seed=7)
+
+        reader = dataset.reader
+        self.assertEqual(reader.counters.following_count,
+                         Follow.objects.filter(user=reader).count())
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=reader).count(),
+            Post.objects.filter(author__following__user=reader).count())
+        msg = 'Самый обсуждаемый пост без комментариев'
+        self.assertGreater(dataset.post.comments_count, 1, msg)
+
+        first = list(Post.objects.values_list('text', flat=True))
+        User.objects.all().delete()
+        synthetic.generate(users=30, groups=3, posts=200, comments=300,
+                           follows=5, seed=7)
+        second = list(Post.objects.values_list('text', flat=True))
+        self.assertEqual(first, second)
+
+    def test_power_law(self):
+        """Первые номера выпадают намного чаще последних."""
+        rng = random.Random(1)
+        counts = Counter(synthetic.power_law_index(rng, 1000, 1.1)
+                         for _ in range(20000))
+        self.assertTrue(set(counts) <= set(range(1000)))
+        self.assertGreater(counts[0], 20 * counts.get(500, 1))
+
+    def test_generate_data_command(self):
+        """Команда создаёт набор кусками и пересчитывает счётчики."""
+        output = StringIO()
+        call_command('generate_data', users=40, groups=4, posts=250,
+                     comments=400, follows=5, images=0, chunk_size=60,
+                     workers=1, skip_search=True, stdout=output)
+
+        self.assertEqual(User.objects.count(), 40)
+        self.assertEqual(Post.objects.count(), 250)
+        self.assertEqual(Comment.objects.count(), 400)
+        self.assertEqual(len(set(Post.objects.values_list('pub_date'))), 250)
+        author = User.objects.order_by('-counters__posts_count').first()
+        self.assertEqual(author.counters.posts_count,
+                         Post.objects.filter(author=author).count())
+        self.assertIn('posts 250', output.getvalue())
+
+    @override_settings(SERVER_TIMING=False)
+    def test_run_and_compare(self):
+        """Замеры покрывают страницы на разной глубине и считают запросы
+        без заголовка Server-Timing, а сравнение находит рост задержки и
+        числа запросов."""
+        dataset = synthetic.generate(users=30, groups=3, posts=200,
+                                     comments=300, follows=5, images=0)
+        self.client.force_login(dataset.reader)
+
+        results = benchmark.run(self.client, dataset, depths=(1, 2),
+                                repeat=2, warmup=0)
+
+        self.assertIn('post_view', results)
+        self.assertIn('index:pages:2', results)
+        self.assertIn('index:cursor:2', results)
+        self.assertGreater(results['index:pages:1']['queries'], 0)
+
+        slower = {key: dict(result, p50=result['p50'] * 2 + 10)
+                  for key, result in results.items()}
+        slower['index:pages:1']['queries'] += 1
+        regressions = benchmark.compare(slower, results)
+        self.assertEqual(len(regressions), len(results) + 1)
+        self.assertEqual(benchmark.compare(results, results), [])
@@ -0,0 +1,109 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Follow, HotScore, Post, User, UserCounters
+from posts.ranking import hot_score, recompute_hot_scores
+
+
+class HotFeedTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user_igor = User.objects.create_user(username='Igor')
+        self.user_olga = User.objects.create_user(username='Olga')
+        self.quiet = Post.objects.create(text='Тихий пост',
+                                         author=self.user_olga)
+        self.discussed = Post.objects.create(text='Обсуждаемый пост',
+                                             author=self.user_igor)
+        for _ in range(3):
+            Comment.objects.create(post=self.discussed, author=self.user_olga,
+                                   text='Комментарий')
+
+    def test_score(self):
+        """Рейтинг растёт с комментариями и подписчиками и убывает с
+        возрастом."""
+        fresh = hot_score(comments=2, followers=10, age=timedelta())
+        self.assertGreater(hot_score(5, 10, timedelta()), fresh)
+        self.assertGreater(hot_score(2, 100, timedelta()), fresh)
+        with override_settings(HOT_HALF_LIFE_HOURS=12):
+            self.assertAlmostEqual(hot_score(2, 10, timedelta(hours=12)),
+                                   fresh / 2)
+
+    def test_recompute(self):
+        """Обсуждаемый пост выше тихого, старые комментарии не
+        учитываются."""
+        self.assertEqual(recompute_hot_scores(), 2)
+        scores = HotScore.objects.order_by('-score').values_list(
+            'post', flat=True)
+        self.assertEqual(list(scores), [self.discussed.id, self.quiet.id])
+
+        later = timezone.now() + timedelta(days=2)
+        comment = Comment.objects.create(post=self.quiet,
+                                         author=self.user_igor,
+                                         text='Свежий комментарий')
+        Comment.objects.filter(pk=comment.pk).update(created=later)
+        recompute_hot_scores(now=later)
+        self.assertEqual(HotScore.objects.order_by('-score').first().post,
+                         self.quiet)
+
+    @override_settings(HOT_FEED_SIZE=1)
+    def test_feed_size(self):
+        recompute_hot_scores()
+        self.assertEqual(
+            list(HotScore.objects.values_list('post', flat=True)),
+            [self.discussed.id])
+
+    def test_followers(self):
+        """При равных комментариях выше пост автора с подписчиками."""
+        Comment.objects.all().delete()
+        Follow.objects.create(user=self.user_igor, author=self.user_olga)
+        UserCounters.objects.filter(user=self.user_olga).update(
+            followers_count=50)
+        recompute_hot_scores()
+        self.assertEqual(HotScore.objects.order_by('-score').first().post,
+                         self.quiet)
+
+    def test_hot_page(self):
+        """Лента идёт по рейтингу, а число запросов не зависит от числа
+        постов и комментариев."""
+        call_command('recompute_hot_scores', stdout=StringIO())
+        response = self.client.get(reverse('hot'))
+        posts = list(response.context['page'])
+        self.assertEqual(posts, [self.discussed, self.quiet])
+
+        with CaptureQueriesContext(connection) as expected:
+            cache.clear()
+            self.client.get(reverse('hot'))
+        for _ in range(15):
+            post = Post.objects.create(text='Ещё пост', author=self.user_olga)
+            Comment.objects.create(post=post, author=self.user_igor,
+                                   text='Комментарий')
+        recompute_hot_scores()
+        with CaptureQueriesContext(connection) as actual:
+            cache.clear()
+            response = self.client.get(reverse('hot'))
+
+        self.assertEqual(len(actual), len(expected))
+        page = response.context['page']
+        self.assertTrue(page.has_next())
+        response = self.client.get(reverse('hot'),
+                                   {'cursor': page.next_cursor})
+        following = response.context['page']
+        self.assertEqual(len(page) + len(following), 17)
+        self.assertFalse(set(page) & set(following))
+
+    def test_hot_page_cache(self):
+        """Пересчёт сбрасывает закэшированную для гостей страницу."""
+        self.assertNotContains(self.client.get(reverse('hot')),
+                               'Обсуждаемый пост')
+        with self.captureOnCommitCallbacks(execute=True):
+            recompute_hot_scores()
+        self.assertContains(self.client.get(reverse('hot')),
+                            'Обсуждаемый пост')
@@ -0,0 +1,72 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Follow, FollowSuggestion, User
+from posts.recommendations import rebuild_suggestions, suggestions
+
+
+class FollowSuggestionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = {
+            name: User.objects.create_user(username=name)
+            for name in ('Igor', 'Olga', 'Anna', 'Petr', 'Max')
+        }
+        for user, author in (('Igor', 'Olga'), ('Olga', 'Anna'),
+                             ('Olga', 'Igor'), ('Petr', 'Olga'),
+                             ('Petr', 'Max')):
+            Follow.objects.create(user=self.users[user],
+                                  author=self.users[author])
+        self.client.force_login(self.users['Igor'])
+
+    def suggested(self, username):
+        return dict(FollowSuggestion.objects.filter(
+            user__username=username,
+        ).values_list('author__username', 'mutual_count'))
+
+    def test_rebuild(self):
+        """Советуются друзья друзей и авторы похожих читателей, но не сам
+        пользователь и не те, на кого он уже подписан."""
+        call_command('recommend_follows', stdout=StringIO())
+
+        self.assertEqual(self.suggested('Igor'), {'Anna': 1, 'Max': 0})
+        self.assertNotIn('Olga', self.suggested('Petr'))
+
+    def test_blocks(self):
+        """Результат не зависит от размера блока."""
+        self.assertEqual(sorted(suggestions(block_size=1)),
+                         sorted(suggestions(block_size=1000)))
+
+    def test_limit(self):
+        rebuild_suggestions(limit=1)
+        self.assertEqual(
+            FollowSuggestion.objects.filter(user=self.users['Igor']).count(),
+            1)
+        self.assertEqual(
+            FollowSuggestion.objects.get(user=self.users['Igor']).author,
+            self.users['Anna'])
+
+    def test_pages(self):
+        """Рекомендации видны в своём профиле и в ленте подписок и
+        пропадают после подписки."""
+        rebuild_suggestions()
+        profile_url = reverse('profile', args=['Igor'])
+        response = self.client.get(profile_url)
+        self.assertContains(response, 'Кого почитать')
+        self.assertEqual(
+            [suggestion.author.username
+             for suggestion in response.context['suggestions']],
+            ['Anna', 'Max'])
+        self.assertContains(self.client.get(reverse('follow_index')), '@Anna')
+        self.assertNotContains(
+            self.client.get(reverse('profile', args=['Olga'])),
+            'Кого почитать')
+
+        self.client.get(reverse('profile_follow', args=['Anna']))
+        response = self.client.get(profile_url)
+        self.assertNotContains(response, '@Anna')
+        self.assertContains(response, '@Max')
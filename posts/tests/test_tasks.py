@@ -0,0 +1,148 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Follow, Post, Task, TimelineEntry, User
+from posts.task_queue import claim, run_pending, task
+
+calls = []
+
+
+@task(priority=1)
+def remember(value):
+    calls.append(value)
+
+
+@task(priority=5)
+def remember_first(value):
+    calls.append(value)
+
+
+@task(max_attempts=2)
+def fail(value):
+    calls.append(value)
+    raise ValueError('Не получилось')
+
+
+@task()
+def remember_depth():
+    calls.append(len(connection.savepoint_ids))
+
+
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def enqueue(self, task_function, *args):
+        with self.captureOnCommitCallbacks(execute=True):
+            task_function.enqueue(*args)
+
+    def test_priority(self):
+        """Задачи выполняются по убыванию приоритета, при равном — в
+        порядке постановки, и удаляются после выполнения."""
+        self.enqueue(remember, 'a')
+        self.enqueue(remember_first, 'b')
+        self.enqueue(remember, 'c')
+
+        self.assertEqual(run_pending(), 3)
+        self.assertEqual(calls, ['b', 'a', 'c'])
+        self.assertFalse(Task.objects.exists())
+
+    def test_on_commit(self):
+        """Задача попадает в очередь только после коммита."""
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                remember.enqueue('a')
+                self.assertFalse(Task.objects.exists())
+            try:
+                with transaction.atomic():
+                    remember.enqueue('b')
+                    raise ValueError
+            except ValueError:
+                pass
+
+        self.assertEqual(list(Task.objects.values_list('args', flat=True)),
+                         [['a']])
+
+    @override_settings(TASK_RETRY_DELAY=10)
+    def test_retry(self):
+        """Упавшая задача откладывается, а после последней попытки
+        остаётся в таблице с ошибкой."""
+        self.enqueue(fail, 'x')
+        with self.assertLogs('posts.task_queue', 'ERROR'):
+            self.assertEqual(run_pending(), 1)
+        queued = Task.objects.get()
+        self.assertEqual(queued.attempts, 1)
+        self.assertGreater(queued.run_at,
+                           timezone.now() + timedelta(seconds=5))
+        self.assertIn('Не получилось', queued.last_error)
+        self.assertEqual(run_pending(), 0)
+
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs('posts.task_queue', 'ERROR') as logs:
+            run_pending()
+        self.assertIn('не выполнена за 2 попыток', logs.output[-1])
+        queued.refresh_from_db()
+        self.assertEqual(calls, ['x', 'x'])
+        self.assertEqual(queued.attempts, 2)
+        self.assertIsNone(queued.run_at)
+
+    def test_runs_outside_transaction(self):
+        """Задача не выполняется в транзакции обработчика, иначе она
+        держала бы блокировку записи всё время работы."""
+        self.enqueue(remember_depth)
+        depth = len(connection.savepoint_ids)
+        run_pending()
+        self.assertEqual(calls, [depth])
+        self.assertFalse(Task.objects.exists())
+
+    def test_expired_lease(self):
+        """Захваченную задачу не берёт другой обработчик, пока не истекла
+        аренда."""
+        self.enqueue(remember, 'a')
+        self.assertIsNotNone(claim())
+        self.assertIsNone(claim())
+
+        Task.objects.update(run_at=timezone.now())
+        self.assertEqual(claim().attempts, 2)
+
+    def test_command(self):
+        self.enqueue(remember, 'a')
+        out = StringIO()
+        call_command('run_tasks', once=True, stdout=out)
+        self.assertEqual(calls, ['a'])
+        self.assertIn('Задач обработано: 1', out.getvalue())
+
+
+class PostTasksTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='Olga')
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def publish(self):
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('new_post'), data={'text': 'New'})
+        return len(queries)
+
+    def test_new_post_constant_time(self):
+        """Публикация не раскладывает пост по лентам в запросе, поэтому
+        число запросов не зависит от числа подписчиков."""
+        expected = self.publish()
+        for number in range(20):
+            reader = User.objects.create_user(username=f'reader{number}')
+            Follow.objects.create(user=reader, author=self.author)
+        self.assertEqual(self.publish(), expected)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+        run_pending()
+        post = Post.objects.latest('pub_date')
+        self.assertEqual(
+            TimelineEntry.objects.filter(post=post).count(), 20)
@@ -1,14 +1,24 @@
 import os
 import shutil
 import tempfile
+from contextlib import contextmanager
 
 from django import forms
 from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.db import connection, transaction
+from django.test import AsyncClient, Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from posts.models import Comment, Follow, Group, Post, User
+from posts.models import (Comment, Follow, Group, Post, Task, TimelineEntry,
+                          User, UserCounters)
+from posts.task_queue import run_pending
+from posts.tests.utils import SMALL_GIF
+from posts.thumbnails import generate_thumbnails
+from posts.timeline import fan_out_post, rebuild_timelines
 
 
 class TemplatesTest(TestCase):
@@ -91,7 +101,9 @@ class TemplatesTest(TestCase):
         )
 
         follow = reverse('profile_follow', args=[self.user_olga])
-        self.user_igor_client.get(follow)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user_igor_client.get(follow)
+        run_pending()
 
         url = reverse('follow_index')
 
@@ -140,17 +152,73 @@ class TemplatesTest(TestCase):
 
     def test_cache(self):
         """Главная страница корректно кэширует список записей."""
+        cache.clear()
         first_response = self.guest_client.get(reverse('index'))
-        first_post = first_response.context['page'][0]
 
-        self.test_post.text = 'Surprise'
+        Post.objects.filter(pk=self.test_post.pk).update(text='Surprise')
 
         second_response = self.guest_client.get(reverse('index'))
-        second_post = second_response.context['page'][0]
 
         msg = 'На главной странице не работает кэширование'
 
-        self.assertEqual(first_post, second_post, msg)
+        self.assertEqual(first_response.content, second_response.content, msg)
+
+    def test_cache_invalidation(self):
+        """Кэш страниц гостя сбрасывается при изменении данных."""
+        cache.clear()
+        urls = (
+            reverse('index'),
+            reverse('group', args=[self.test_group.slug]),
+            reverse('profile', args=[self.user_igor]),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+
+        self.test_post.text = 'Surprise'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.test_post.save()
+
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                msg = f'Страница {url} не обновилась после правки поста'
+                self.assertContains(response, 'Surprise', msg_prefix=msg)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user_olga_client.get(
+                reverse('profile_follow', args=[self.user_igor]))
+        response = self.guest_client.get(urls[2])
+        msg = 'Профиль не обновился после новой подписки'
+        self.assertContains(response, 'Подписчиков: 1', msg_prefix=msg)
+
+    def test_cache_invalidated_on_commit(self):
+        """Поколение страниц сдвигается только после фиксации записи."""
+        cache.clear()
+        url = reverse('index')
+        self.guest_client.get(url)
+
+        self.test_post.text = 'Surprise'
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.test_post.save()
+        msg = 'Кэш сброшен до фиксации транзакции'
+        self.assertNotContains(self.guest_client.get(url), 'Surprise',
+                               msg_prefix=msg)
+
+        for callback in callbacks:
+            callback()
+        self.assertContains(self.guest_client.get(url), 'Surprise')
+
+    def test_thumbnail_served_when_ready(self):
+        """Карточка показывает заранее подготовленную миниатюру."""
+        cache.clear()
+        generate_thumbnails(self.test_post.id)
+        self.test_post.refresh_from_db()
+
+        response = self.guest_client.get(reverse('index'))
+
+        msg = 'Карточка поста не показывает подготовленную миниатюру'
+        self.assertContains(
+            response, self.test_post.image_thumbnail.url, msg_prefix=msg)
 
     def test_url_templates(self):
         """Вызываемые шаблоны соответствуют задуманному."""
@@ -272,7 +340,7 @@ class TemplatesTest(TestCase):
         """На странице другой группы не отображается новый пост."""
         path = reverse('group', args=['second-group'])
         response = self.user_igor_client.get(path)
-        response = response.context['page'].object_list.count()
+        response = len(response.context['page'])
         expected = 0
         msg = 'На странице другой группы не должен отображаться новый пост'
         self.assertEqual(response, expected, msg)
@@ -330,3 +398,702 @@ class PaginatorViewTest(TestCase):
                 expected = 5
                 msg = f'На второй странице не {expected} сообщений'
                 self.assertEqual(response, expected, msg)
+
+    def test_cursor_pages(self):
+        """Keyset-пагинация проходит ленту без пропусков и повторов."""
+        Post.objects.update(pub_date=Post.objects.first().pub_date)
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        slug = self.test_group.slug
+
+        pages = (
+            reverse('index'),
+            reverse('group', args=[slug])
+        )
+
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.user_igor_client.get(page + '?cursor=')
+                first = response.context['page']
+                response = self.user_igor_client.get(
+                    f'{page}?cursor={first.next_cursor}')
+                second = response.context['page']
+                msg = f'На странице {page} keyset-пагинация теряет посты'
+                self.assertEqual(list(first) + list(second), expected, msg)
+                self.assertFalse(second.has_next(), msg)
+
+                response = self.user_igor_client.get(
+                    f'{page}?cursor={second.previous_cursor}')
+                msg = f'На странице {page} не работает переход назад'
+                self.assertEqual(list(response.context['page']),
+                                 list(first), msg)
+
+
+class FeedQueriesTest(TestCase):
+    def setUp(self):
+        self.user_igor = User.objects.create_user(username='Igor')
+        self.user_igor_client = Client()
+        self.user_igor_client.force_login(self.user_igor)
+
+        self.user_olga = User.objects.create_user(username='Olga')
+        Follow.objects.create(user=self.user_igor, author=self.user_olga)
+
+        self.test_group = Group.objects.create(
+            title='Test Group',
+            slug='group',
+            description='Description',
+        )
+
+        self.urls = (
+            reverse('index'),
+            reverse('group', args=[self.test_group.slug]),
+            reverse('profile', args=[self.user_olga]),
+            reverse('follow_index'),
+        )
+
+    def create_posts(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(count):
+                post = Post.objects.create(
+                    text='Test post',
+                    author=self.user_olga,
+                    group=self.test_group,
+                )
+                Comment.objects.create(
+                    post=post,
+                    author=self.user_igor,
+                    text='Test comment',
+                )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.user_igor_client.get(url)
+        return len(queries)
+
+    def test_feed_queries_do_not_depend_on_page_size(self):
+        """Количество запросов к БД не зависит от числа постов на странице."""
+        self.create_posts(1)
+        expected = {url: self.count_queries(url) for url in self.urls}
+
+        self.create_posts(settings.POSTS_PER_PAGE)
+
+        for url in self.urls:
+            with self.subTest(url=url):
+                actual = self.count_queries(url)
+                msg = f'На странице {url} лишние запросы для каждого поста'
+                self.assertEqual(actual, expected[url], msg)
+
+
+class TimelineTest(TestCase):
+    def setUp(self):
+        self.user_igor = User.objects.create_user(username='Igor')
+        self.user_igor_client = Client()
+        self.user_igor_client.force_login(self.user_igor)
+
+        self.user_olga = User.objects.create_user(username='Olga')
+        self.user_olga_client = Client()
+        self.user_olga_client.force_login(self.user_olga)
+
+        self.user_igor_client.get(
+            reverse('profile_follow', args=[self.user_olga]))
+
+    def publish(self):
+        """Публикует пост и выполняет поставленные после коммита задачи."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user_olga_client.post(
+                reverse('new_post'), data={'text': 'New'})
+        run_pending()
+
+    def follow_page(self):
+        response = self.user_igor_client.get(reverse('follow_index'))
+        return list(response.context['page'])
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост автора попадает в материализованные ленты подписчиков."""
+        self.publish()
+        post = Post.objects.get(text='New')
+
+        actual = TimelineEntry.objects.filter(
+            user=self.user_igor, post=post).exists()
+        msg = 'Новый пост не разложен по лентам подписчиков'
+        self.assertTrue(actual, msg)
+        self.assertEqual(self.follow_page(), [post], msg)
+
+    def test_follow_backfills_in_background(self):
+        """Посты автора докладываются в ленту задачей, а не в запросе на
+        подписку, даже если fan-out нового поста успел раньше."""
+        anna = User.objects.create_user(username='Anna')
+        old = Post.objects.create(text='Старый', author=anna)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user_igor_client.get(reverse('profile_follow', args=[anna]))
+        entries = TimelineEntry.objects.filter(user=self.user_igor,
+                                               author=anna)
+        self.assertFalse(entries.exists())
+
+        new = Post.objects.create(text='Новый', author=anna)
+        fan_out_post(new)
+        run_pending()
+        self.assertEqual({entry.post for entry in entries}, {old, new})
+
+    def test_unfollow_trims_timeline(self):
+        """После отписки посты автора пропадают из ленты подписок."""
+        self.publish()
+        self.user_igor_client.get(
+            reverse('profile_unfollow', args=[self.user_olga]))
+
+        msg = 'После отписки в ленте остались посты автора'
+        self.assertFalse(TimelineEntry.objects.exists(), msg)
+        self.assertEqual(self.follow_page(), [], msg)
+
+    @override_settings(TIMELINE_FAN_OUT_LIMIT=0)
+    def test_popular_author_posts_read_on_demand(self):
+        """Посты популярного автора добираются в ленту при чтении."""
+        self.publish()
+        post = Post.objects.get(text='New')
+
+        msg = 'Посты популярного автора не должны раскладываться по лентам'
+        self.assertFalse(TimelineEntry.objects.exists(), msg)
+        msg = 'Посты популярного автора не попадают в ленту подписок'
+        self.assertEqual(self.follow_page(), [post], msg)
+
+    def test_rebuild_without_counters(self):
+        """Автор без строки счётчиков считается автором без подписчиков и
+        при пересборке лент."""
+        self.publish()
+        UserCounters.objects.filter(user=self.user_olga).delete()
+        expected = list(TimelineEntry.objects.values_list('user', 'post'))
+
+        rebuild_timelines()
+
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('user', 'post')), expected)
+        self.assertEqual(len(expected), 1)
+
+    @override_settings(TIMELINE_FAN_OUT_LIMIT=2)
+    def test_author_leaving_popular(self):
+        """Когда подписчиков становится меньше порога, посты, вышедшие
+        без раскладки, докладываются в ленты фоновой задачей."""
+        readers = []
+        for name in ('Petr', 'Max'):
+            reader = Client()
+            reader.force_login(User.objects.create_user(username=name))
+            reader.get(reverse('profile_follow', args=[self.user_olga]))
+            readers.append(reader)
+        self.publish()
+        post = Post.objects.get(text='New')
+        self.assertFalse(TimelineEntry.objects.exists())
+
+        unfollow_url = reverse('profile_unfollow', args=[self.user_olga])
+        with self.captureOnCommitCallbacks(execute=True):
+            readers[0].get(unfollow_url)
+        msg = 'На пороге посты автора ещё подмешиваются в ленту'
+        self.assertFalse(Task.objects.exists(), msg)
+        self.assertEqual(self.follow_page(), [post], msg)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            readers[1].get(unfollow_url)
+        run_pending()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user_igor, post=post).exists())
+        self.assertEqual(self.follow_page(), [post])
+
+    @override_settings(TIMELINE_FAN_OUT_LIMIT=1)
+    def test_follow_page_does_not_write(self):
+        """Посты популярных авторов подмешиваются в ленту при чтении, и
+        чтение ленты ничего не пишет в базу."""
+        popular = User.objects.create_user(username='Max')
+        for name in ('Igor', 'Petr'):
+            reader = Client()
+            reader.force_login(User.objects.get_or_create(username=name)[0])
+            reader.get(reverse('profile_follow', args=[popular]))
+        self.publish()
+        popular_post = Post.objects.create(text='Popular', author=popular)
+
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(3):
+                page = self.follow_page()
+        writes = [query['sql'] for query in queries
+                  if not query['sql'].startswith('SELECT')]
+        self.assertEqual(writes, [], 'Чтение ленты подписок пишет в базу')
+        self.assertEqual(page, [popular_post, Post.objects.get(text='New')])
+
+    def test_cursor_pages(self):
+        """Лента подписок листается keyset-пагинацией по материализованной
+        ленте."""
+        for _ in range(settings.POSTS_PER_PAGE + 1):
+            self.publish()
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+
+        url = reverse('follow_index')
+        first = self.user_igor_client.get(url + '?cursor=').context['page']
+        second = self.user_igor_client.get(
+            f'{url}?cursor={first.next_cursor}').context['page']
+
+        msg = 'Keyset-пагинация ленты подписок теряет посты'
+        self.assertEqual(list(first) + list(second), expected, msg)
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        self.user_igor = User.objects.create_user(username='Igor')
+        self.user_igor_client = Client()
+        self.user_igor_client.force_login(self.user_igor)
+
+        self.user_olga = User.objects.create_user(username='Olga')
+
+    def counters(self, user):
+        counters = UserCounters.objects.get(user=user)
+        return (counters.followers_count, counters.following_count,
+                counters.posts_count)
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются вместе с постами, комментариями и подписками."""
+        self.user_igor_client.post(reverse('new_post'), data={'text': 'New'})
+        post = Post.objects.get()
+        self.user_igor_client.post(
+            reverse('add_comment', args=[self.user_igor, post.id]),
+            data={'text': 'Comment'},
+        )
+        self.user_igor_client.get(
+            reverse('profile_follow', args=[self.user_olga]))
+
+        post.refresh_from_db()
+        msg = 'Счётчики не обновляются при записи'
+        self.assertEqual(post.comments_count, 1, msg)
+        self.assertEqual(self.counters(self.user_igor), (0, 1, 1), msg)
+        self.assertEqual(self.counters(self.user_olga), (1, 0, 0), msg)
+
+        self.user_igor_client.get(
+            reverse('profile_unfollow', args=[self.user_olga]))
+        post.comments.all().delete()
+        post.delete()
+
+        msg = 'Счётчики не обновляются при удалении'
+        self.assertEqual(self.counters(self.user_igor), (0, 0, 0), msg)
+        self.assertEqual(self.counters(self.user_olga), (0, 0, 0), msg)
+
+
+class PostCardCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        self.user_igor = User.objects.create_user(username='Igor')
+        self.user_igor_client = Client()
+        self.user_igor_client.force_login(self.user_igor)
+
+        self.user_olga = User.objects.create_user(username='Olga')
+        self.user_olga_client = Client()
+        self.user_olga_client.force_login(self.user_olga)
+
+        self.test_post = Post.objects.create(
+            text='Test post',
+            author=self.user_igor,
+        )
+        self.edit_url = reverse(
+            'post_edit', args=[self.user_igor, self.test_post.id])
+
+    def test_card_is_shared_between_viewers(self):
+        """Закэшированная карточка не содержит кнопок другого пользователя."""
+        self.user_igor_client.get(reverse('index'))
+        response = self.user_olga_client.get(reverse('index'))
+
+        msg = 'Кнопка редактирования попала в общую карточку поста'
+        self.assertNotContains(response, self.edit_url, msg_prefix=msg)
+
+    def test_cached_card_is_balanced(self):
+        """Закэшированный фрагмент закрывает все открытые в нём блоки."""
+        self.user_igor_client.get(reverse('index'))
+        fragment = cache.get(make_template_fragment_key(
+            'post_card', [self.test_post.id, self.test_post.card_version]))
+
+        self.assertIsNotNone(fragment)
+        self.assertEqual(fragment.count('<div'), fragment.count('</div>'))
+
+    def test_card_version_bumps_on_edit_and_comment(self):
+        """Карточка перерисовывается после правки поста и нового
+        комментария."""
+        self.user_olga_client.get(reverse('index'))
+
+        self.user_igor_client.post(self.edit_url, data={'text': 'Edited'})
+        self.user_olga_client.post(
+            reverse('add_comment', args=[self.user_igor, self.test_post.id]),
+            data={'text': 'Comment'},
+        )
+        response = self.user_olga_client.get(reverse('index'))
+
+        msg = 'Карточка поста не обновилась после правки'
+        self.assertContains(response, 'Edited', msg_prefix=msg)
+        msg = 'Карточка поста не обновилась после комментария'
+        self.assertContains(response, 'Комментариев: 1', msg_prefix=msg)
+
+
+class MediaServingTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+
+        self.client = Client()
+        user = User.objects.create_user(username='Igor')
+        self.post = Post.objects.create(
+            text='Пост с фото',
+            author=user,
+            image=SimpleUploadedFile('photo.gif', SMALL_GIF, 'image/gif'),
+        )
+        self.url = self.post.image.url
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_hashed_name_cached_forever(self):
+        """Картинка сохраняется под хешем содержимого и кэшируется
+        браузером без перепроверки."""
+        response = self.client.get(self.url)
+
+        msg = 'В имени загруженной картинки нет хеша содержимого'
+        self.assertRegex(self.post.image.name,
+                         r'^posts/photo\.[0-9a-f]{12}\.gif$', msg)
+        self.assertEqual(b''.join(response.streaming_content), SMALL_GIF)
+        self.assertEqual(response['Content-Type'], 'image/gif')
+        msg = 'Картинка с хешем в имени не помечена как неизменяемая'
+        self.assertIn('immutable', response['Cache-Control'], msg)
+
+    def test_not_modified(self):
+        """Повторный запрос с ETag или датой получает 304 без тела."""
+        response = self.client.get(self.url)
+
+        for headers in (
+            {'HTTP_IF_NONE_MATCH': response['ETag']},
+            {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']},
+        ):
+            with self.subTest(headers=headers):
+                cached = self.client.get(self.url, **headers)
+                msg = 'Неизменённый файл отдаётся повторно'
+                self.assertEqual(cached.status_code, 304, msg)
+
+    def test_range(self):
+        """Запрос диапазона получает только нужные байты."""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-5')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), SMALL_GIF[2:6])
+        self.assertEqual(response['Content-Range'],
+                         f'bytes 2-5/{len(SMALL_GIF)}')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=1000-')
+        self.assertEqual(response.status_code, 416)
+
+    @override_settings(MEDIA_SERVING='x-accel-redirect')
+    def test_x_accel_redirect(self):
+        """В режиме x-accel-redirect файл отдаёт nginx."""
+        response = self.client.get(self.url)
+
+        msg = 'Django не передаёт отдачу файла nginx'
+        self.assertEqual(response['X-Accel-Redirect'],
+                         f'/protected-media/{self.post.image.name}', msg)
+        self.assertEqual(response.content, b'')
+
+    def test_outside_media_root(self):
+        """Файлы вне MEDIA_ROOT не отдаются."""
+        response = self.client.get('/media/../manage.py')
+
+        self.assertEqual(response.status_code, 404)
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user_igor = User.objects.create_user(username='Igor')
+        with self.indexing():
+            self.group = Group.objects.create(
+                title='Котики',
+                slug='cats',
+                description='Description',
+            )
+            self.cat_post = Post.objects.create(
+                text='Кот <b>спит</b> на диване', author=self.user_igor)
+            self.dog_post = Post.objects.create(
+                text='Собака гуляет', author=self.user_igor, group=self.group)
+
+    @contextmanager
+    def indexing(self):
+        """Индекс обновляют задачи, поставленные после коммита."""
+        with self.captureOnCommitCallbacks(execute=True):
+            yield
+        run_pending()
+
+    def search(self, query, **params):
+        return self.client.get(reverse('search'), {'q': query, **params})
+
+    def found(self, query):
+        return [hit.post for hit in self.search(query).context['page']]
+
+    def test_search_highlights_matches(self):
+        """Поиск находит пост по слову и подсвечивает совпадение, экранируя
+        остальной текст."""
+        response = self.search('спит')
+
+        msg = 'Поиск не находит пост по слову из текста'
+        self.assertEqual(self.found('спит'), [self.cat_post], msg)
+        self.assertContains(response, '<mark>спит</mark>')
+        self.assertContains(response, '&lt;b&gt;')
+
+    def test_search_by_group_title_and_prefix(self):
+        """Посты находятся по названию группы и по началу слова."""
+        msg = 'Поиск не учитывает название группы'
+        self.assertEqual(self.found('котики'), [self.dog_post], msg)
+        msg = 'Поиск не находит слово по началу'
+        self.assertEqual(self.found('гуля'), [self.dog_post], msg)
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при правке, удалении поста и группы."""
+        with self.indexing():
+            self.cat_post.text = 'Кот проснулся'
+            self.cat_post.save()
+        self.assertEqual(self.found('спит'), [])
+        self.assertEqual(self.found('проснулся'), [self.cat_post])
+
+        with self.indexing():
+            self.group.title = 'Собачки'
+            self.group.save()
+        self.assertEqual(self.found('котики'), [])
+        self.assertEqual(self.found('собачки'), [self.dog_post])
+
+        with self.indexing():
+            self.group.delete()
+        self.assertEqual(self.found('собачки'), [])
+
+        with self.indexing():
+            self.cat_post.delete()
+        msg = 'Удалённый пост остаётся в поисковом индексе'
+        self.assertEqual(self.found('проснулся'), [], msg)
+
+    @override_settings(POSTS_PER_PAGE=1)
+    def test_pages_keep_query(self):
+        """Ссылки на страницы результатов сохраняют запрос."""
+        with self.indexing():
+            Post.objects.create(text='Собака спит', author=self.user_igor)
+
+        response = self.search('собака')
+
+        query = '%D1%81%D0%BE%D0%B1%D0%B0%D0%BA%D0%B0'
+        self.assertContains(response, f'?q={query}&amp;page=2')
+        self.assertEqual(len(self.search('собака', page=2).context['page']), 1)
+
+    def test_search_with_syntax_characters(self):
+        """Кавычки и операторы FTS в запросе не ломают поиск."""
+        response = self.search('"кот" AND (OR')
+        self.assertEqual(response.status_code, 200)
+
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user_igor = User.objects.create_user(username='Igor')
+        self.user_olga = User.objects.create_user(username='Olga')
+        self.group = Group.objects.create(
+            title='Test Group',
+            slug='group',
+            description='Description',
+        )
+        self.post = Post.objects.create(
+            text='Асинхронный пост', author=self.user_igor, group=self.group)
+
+    async def test_async_client(self):
+        """Ленты и страница поста отдаются через ASGI-обработчик."""
+        client = AsyncClient()
+        urls = (
+            reverse('index'),
+            reverse('group', args=[self.group.slug]),
+            reverse('profile', args=[self.user_igor.username]),
+            reverse('post', args=[self.user_igor.username, self.post.id]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = await client.get(url)
+                self.assertContains(response, 'Асинхронный пост')
+
+        response = await client.get(reverse('group', args=['unknown']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_post_view_queries_do_not_depend_on_comments(self):
+        """Авторы комментариев загружаются вместе с комментариями."""
+        url = reverse('post', args=[self.user_igor.username, self.post.id])
+        Comment.objects.create(post=self.post, author=self.user_olga,
+                               text='Комментарий')
+        with CaptureQueriesContext(connection) as expected:
+            Client().get(url)
+
+        for _ in range(3):
+            Comment.objects.create(post=self.post, author=self.user_igor,
+                                   text='Ещё комментарий')
+        with CaptureQueriesContext(connection) as actual:
+            Client().get(url)
+
+        msg = 'Страница поста делает запрос на каждый комментарий'
+        self.assertEqual(len(actual), len(expected), msg)
+
+
+@override_settings(COMMENTS_PER_PAGE=2)
+class CommentPaginationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user_igor = User.objects.create_user(username='Igor')
+        self.post = Post.objects.create(text='Обсуждаемый пост',
+                                        author=self.user_igor)
+        for number in range(5):
+            Comment.objects.create(post=self.post, author=self.user_igor,
+                                   text=f'Комментарий {number}')
+        self.url = reverse('post', args=['Igor', self.post.id])
+        self.fragment_url = reverse('post_comments',
+                                    args=['Igor', self.post.id])
+
+    def comment_texts(self, response):
+        return [comment.text for comment in response.context['comments']]
+
+    def test_first_page(self):
+        """На странице поста только новые комментарии и кнопка
+        «Показать ещё»."""
+        response = self.client.get(self.url)
+
+        self.assertEqual(self.comment_texts(response),
+                         ['Комментарий 4', 'Комментарий 3'])
+        self.assertContains(response, 'Показать ещё')
+        self.assertContains(response, self.fragment_url + '?cursor=')
+
+    def test_load_more(self):
+        """Фрагмент продолжает ветку с места, где остановилась
+        страница, и на последней странице кнопки нет."""
+        page = self.client.get(self.url).context['comments']
+        response = self.client.get(self.fragment_url,
+                                   {'cursor': page.next_cursor})
+
+        self.assertTemplateUsed(response, 'posts/comment_list.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertEqual(self.comment_texts(response),
+                         ['Комментарий 2', 'Комментарий 1'])
+
+        page = response.context['comments']
+        response = self.client.get(self.fragment_url,
+                                   {'cursor': page.next_cursor})
+        self.assertEqual(self.comment_texts(response), ['Комментарий 0'])
+        self.assertNotContains(response, 'Показать ещё')
+
+    def test_page_without_js(self):
+        """Кнопка ведёт на страницу поста со следующими комментариями."""
+        page = self.client.get(self.url).context['comments']
+        response = self.client.get(self.url, {'cursor': page.next_cursor})
+
+        self.assertEqual(self.comment_texts(response),
+                         ['Комментарий 2', 'Комментарий 1'])
+        self.assertContains(response, 'К новым комментариям')
+
+    def test_unknown_post(self):
+        url = reverse('post_comments', args=['Olga', self.post.id])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class GroupFeedCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user_igor = User.objects.create_user(username='Igor')
+        self.client.force_login(self.user_igor)
+        self.group = Group.objects.create(title='Первая', slug='first',
+                                          description='Описание')
+        self.other = Group.objects.create(title='Вторая', slug='second',
+                                          description='Описание')
+        self.posts = [
+            Post.objects.create(text=f'Пост {number}', author=self.user_igor,
+                                group=self.group)
+            for number in range(15)
+        ]
+        self.url = reverse('group', args=['first'])
+
+    def page_texts(self, url, **params):
+        response = self.client.get(url, params)
+        return [post.text for post in response.context['page']]
+
+    def test_cached_header_and_ring(self):
+        """Повторный запрос не читает группу и не считает посты."""
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('"posts_group"."slug" =', sql)
+        self.assertEqual(response.context['paginator'].count, 15)
+        self.assertEqual(response.context['group'].title, 'Первая')
+        self.assertEqual(self.page_texts(self.url),
+                         [f'Пост {number}' for number in range(14, 4, -1)])
+
+    def test_create_move_delete(self):
+        """Кольцо и число записей обновляются при создании, переносе и
+        удалении поста."""
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('new_post'),
+                             {'text': 'Новый пост', 'group': self.group.id})
+        self.assertEqual(self.page_texts(self.url)[0], 'Новый пост')
+
+        moved = self.posts[-1]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('post_edit', args=['Igor', moved.id]),
+                             {'text': moved.text, 'group': self.other.id})
+        self.assertNotIn(moved.text, self.page_texts(self.url))
+        self.assertEqual(
+            self.page_texts(reverse('group', args=['second'])), [moved.text])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.posts[-2].delete()
+        self.assertNotIn(self.posts[-2].text, self.page_texts(self.url))
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['paginator'].count, 14)
+        self.group.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.group.posts_count, self.other.posts_count),
+                         (14, 1))
+
+    def test_rolled_back_post(self):
+        """Пост откатившейся транзакции не попадает в кольцо."""
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Post.objects.create(text='Откатится',
+                                        author=self.user_igor,
+                                        group=self.group)
+                    raise ValueError
+            except ValueError:
+                pass
+
+        self.assertEqual(self.page_texts(self.url),
+                         [f'Пост {number}' for number in range(14, 4, -1)])
+
+    @override_settings(GROUP_RECENT_POSTS=12)
+    def test_pages_beyond_ring(self):
+        self.assertEqual(self.page_texts(self.url, page=2),
+                         [f'Пост {number}' for number in range(4, -1, -1)])
+
+    @override_settings(FEED_PAGINATION='cursor')
+    def test_cursor_pages(self):
+        response = self.client.get(self.url)
+        page = response.context['page']
+        self.assertTrue(page.has_next())
+        self.assertEqual(
+            self.page_texts(self.url, cursor=page.next_cursor),
+            [f'Пост {number}' for number in range(4, -1, -1)])
+
+    def test_group_changes(self):
+        """Переименование и удаление группы сбрасывают шапку."""
+        self.client.get(self.url)
+        self.group.slug = 'renamed'
+        self.group.title = 'Переименованная'
+        self.group.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        response = self.client.get(reverse('group', args=['renamed']))
+        self.assertEqual(response.context['group'].title, 'Переименованная')
+
+        self.other.delete()
+        response = self.client.get(reverse('group', args=['second']))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,45 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from django.db import connection
+
+SMALL_GIF = (b'\x47\x49\x46\x38\x39\x61\x02\x00'
+             b'\x01\x00\x80\x00\x00\x00\x00\x00'
+             b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+             b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+             b'\x0A\x00\x3B')
+
+
+def use_file_database(test_case):
+    """Переносит основную тестовую базу из памяти в файл до конца теста.
+
+    С базой в памяти gather_queries работает в одном потоке, а её
+    блокировки таблиц не ждут busy timeout. В файле каждый поток получает
+    своё соединение, как в работе. Вызывается в setUp TransactionTestCase
+    до создания данных.
+    """
+    directory = tempfile.mkdtemp()
+    test_case.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+    # Схему копируем из тестовой базы в памяти.
+    connection.ensure_connection()
+    in_memory = connection.connection
+    target = sqlite3.connect(os.path.join(directory, 'db.sqlite3'))
+    in_memory.backup(target)
+    target.close()
+
+    saved = dict(connection.settings_dict)
+
+    def restore():
+        connection.close()
+        connection.settings_dict.update(saved)
+        connection.connection = in_memory
+
+    test_case.addCleanup(restore)
+    # Настройки общие с соединениями потоков. CONN_MAX_AGE=0, чтобы
+    # потоки закрывали свои соединения.
+    connection.settings_dict.update(
+        NAME=os.path.join(directory, 'db.sqlite3'), CONN_MAX_AGE=0)
+    connection.connection = None
@@ -0,0 +1,28 @@
+"""Миниатюры изображений постов готовит фоновая задача
+posts.tasks.make_thumbnails после сохранения поста, а шаблоны только
+показывают готовый файл."""
+from django.db.models import F
+from sorl.thumbnail import get_thumbnail
+
+from .caching import invalidate_post
+from .models import Post
+
+CARD_THUMBNAIL = ('960x339', {'crop': 'center', 'upscale': True})
+
+
+def generate_thumbnails(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return False
+
+    geometry, options = CARD_THUMBNAIL
+    thumbnail = get_thumbnail(post.image, geometry, **options)
+    # Если пока готовилась миниатюра картинку заменили, не трогаем пост:
+    # для новой картинки уже поставлена своя задача.
+    updated = Post.objects.filter(pk=post.pk, image=post.image.name).update(
+        image_thumbnail=thumbnail.name,
+        card_version=F('card_version') + 1,
+    )
+    if updated:
+        invalidate_post(post)
+    return bool(updated)
@@ -0,0 +1,171 @@
+"""Материализованная лента подписок.
+
+Посты авторов, у которых не больше TIMELINE_FAN_OUT_LIMIT подписчиков,
+раскладываются по лентам подписчиков фоновой задачей после публикации
+(fan-out-on-write).
+Посты более популярных авторов подмешиваются в ленту при чтении
+(fan-out-on-read) без записи в таблицу. Лента читателя без популярных
+авторов читается одним диапазоном индекса (user, pub_date).
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, FilteredRelation, Max, Q
+
+from .models import Follow, Post, TimelineEntry, UserCounters
+
+BATCH_SIZE = 500
+
+TIMELINE_ORDERING = ('-timeline_date', '-timeline_post')
+TIMELINE_CURSOR_KEYS = ('pub_date', 'id')
+
+
+def followers_count(author):
+    counters = UserCounters.objects.filter(user=author)
+    return counters.values_list('followers_count', flat=True).first() or 0
+
+
+def is_fan_out_author(author):
+    return followers_count(author) <= settings.TIMELINE_FAN_OUT_LIMIT
+
+
+def _add_entries(entries):
+    entries = iter(entries)
+    while True:
+        batch = [
+            TimelineEntry(user_id=user_id, post_id=post_id,
+                          author_id=author_id, pub_date=pub_date)
+            for user_id, post_id, author_id, pub_date
+            in islice(entries, BATCH_SIZE)
+        ]
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_posts(author, posts):
+    if not is_fan_out_author(author):
+        return
+    followers = Follow.objects.filter(
+        author=author).values_list('user_id', flat=True)
+    _add_entries(
+        (user_id, post.id, author.id, post.pub_date)
+        for user_id in followers.iterator()
+        for post in posts
+    )
+
+
+def fan_out_post(post):
+    fan_out_posts(post.author, [post])
+
+
+def pull_author_posts(user_id, author_id):
+    """Докладывает в ленту посты автора, вышедшие после последнего
+    уже разложенного."""
+    latest = TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id,
+    ).aggregate(latest=Max('pub_date'))['latest']
+    posts = Post.objects.filter(author_id=author_id)
+    if latest is not None:
+        posts = posts.filter(pub_date__gte=latest)
+    posts = posts.values_list('id', 'pub_date')
+    _add_entries(
+        (user_id, post_id, author_id, pub_date)
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def backfill(user_id, author_ids):
+    """Докладывает в ленту все посты авторов, на которых подписался
+    пользователь. Выполняется в фоне, поэтому берёт все посты, а не
+    только новее последнего в ленте: fan-out мог успеть положить туда
+    свежий пост автора."""
+    posts = Post.objects.filter(author_id__in=author_ids).values_list(
+        'id', 'author_id', 'pub_date')
+    _add_entries(
+        (user_id, post_id, author_id, pub_date)
+        for post_id, author_id, pub_date in posts.iterator()
+    )
+
+
+def rebuild_timelines():
+    """Раскладывает заново все ленты, например после загрузки данных
+    мимо сигналов. Посты популярных авторов, как и при публикации,
+    добираются при чтении."""
+    TimelineEntry.objects.all().delete()
+    # Автор без строки счётчиков, как и в followers_count(), считается
+    # автором без подписчиков.
+    entries = Follow.objects.filter(
+        Q(author__counters__isnull=True)
+        | Q(author__counters__followers_count__lte=(
+            settings.TIMELINE_FAN_OUT_LIMIT)),
+        author__posts__isnull=False,
+    ).values_list('user_id', 'author__posts', 'author_id',
+                  'author__posts__pub_date')
+    # Строки не проходят через Python: INSERT ... SELECT одним запросом.
+    select, params = entries.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TimelineEntry._meta.db_table} '
+            f'(user_id, post_id, author_id, pub_date) {select}',
+            params,
+        )
+
+
+def trim(user, author):
+    TimelineEntry.objects.filter(user=user, author=author).delete()
+
+
+def left_popular(author):
+    """Автор только что перестал подмешиваться в ленты при чтении.
+
+    Посты автора ровно с TIMELINE_FAN_OUT_LIMIT подписчиками и
+    раскладываются по лентам, и подмешиваются при чтении. Поэтому, пока
+    число подписчиков колеблется вокруг порога, ленты дособирать не
+    нужно: это требуется, только когда подписчиков стало меньше порога.
+    """
+    return followers_count(author) == settings.TIMELINE_FAN_OUT_LIMIT - 1
+
+
+def catch_up_followers(author_id):
+    """Докладывает подписчикам посты, вышедшие, пока автор был
+    популярным и его посты не раскладывались по лентам."""
+    followers = Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)
+    for user_id in followers.iterator():
+        pull_author_posts(user_id, author_id)
+
+
+def popular_authors(user):
+    return Follow.objects.filter(
+        user=user,
+        author__counters__followers_count__gte=(
+            settings.TIMELINE_FAN_OUT_LIMIT),
+    ).values_list('author', flat=True)
+
+
+def timeline_posts(user, popular=None):
+    """Лента подписок. Чтение ничего не пишет: посты популярных авторов
+    не докладываются в ленту, а подмешиваются в запрос."""
+    if popular is None:
+        popular = list(popular_authors(user))
+    posts = Post.objects.feed().annotate(
+        entry=FilteredRelation(
+            'timeline_entries',
+            condition=Q(timeline_entries__user=user),
+        ),
+    )
+    if not popular:
+        return posts.filter(entry__isnull=False).annotate(
+            timeline_date=F('entry__pub_date'),
+            timeline_post=F('entry__post'),
+        ).order_by(*TIMELINE_ORDERING)
+    # Посты идут по индексу pub_date, а запись в ленте для каждого
+    # находится по уникальному индексу (user, post).
+    return posts.filter(
+        Q(entry__isnull=False) | Q(author_id__in=popular),
+    ).annotate(
+        timeline_date=F('pub_date'),
+        timeline_post=F('id'),
+    ).order_by(*TIMELINE_ORDERING)
@@ -1,16 +1,59 @@
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
 
+from .caching import (cache_anonymous_page, group_namespace,
+                      profile_namespace)
+from .concurrency import gather_queries
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .group_feed import group_header, group_page
+from .live import publish_comment, publish_post
+from .models import Comment, Follow, Post, User, UserCounters
+from .paginators import CursorPaginator, paginate
+from .ranking import HOT_CURSOR_KEYS, HOT_ORDERING, hot_posts
+from .search import get_backend
+from .suggestions import follow_suggestions
+from .tasks import (backfill_timeline, catch_up, fan_out,
+                    schedule_thumbnails)
+from .timeline import (TIMELINE_CURSOR_KEYS, TIMELINE_ORDERING, left_popular,
+                       timeline_posts, trim)
 
 
-def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, settings.POSTS_PER_PAGE)
-    page = paginator.get_page(request.GET.get('page'))
+render_async = sync_to_async(render)
+
+
+def evaluated_page(request, post_list, **cursor_options):
+    """paginate(), сразу загружающий посты страницы."""
+    page, paginator = paginate(request, post_list, **cursor_options)
+    # len() загружает queryset страницы и оставляет его в кэше queryset.
+    len(page.object_list)
+    return page, paginator
+
+
+def comments_page(request, post_id):
+    """Страница комментариев поста, от новых к старым. Следующие
+    страницы читаются по курсору и стоят одинаково на любой глубине."""
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author')
+    paginator = CursorPaginator(comments, settings.COMMENTS_PER_PAGE,
+                                ordering=Comment._meta.ordering)
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+@sync_to_async
+def authenticated_user(request):
+    user = request.user
+    return user if user.is_authenticated else None
+
+
+@cache_anonymous_page(lambda: 'index')
+async def index(request):
+    post_list = Post.objects.feed()
+    page, paginator = await sync_to_async(evaluated_page)(request, post_list)
 
     context = {
         'page': page,
@@ -18,14 +61,45 @@ def index(request):
         'index': True,
     }
 
-    return render(request, 'index.html', context)
+    return await render_async(request, 'index.html', context)
 
 
-def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, settings.POSTS_PER_PAGE)
-    page = paginator.get_page(request.GET.get('page'))
+def hot_page(request):
+    # Таблица рейтингов ограничена HOT_FEED_SIZE, страницы всегда
+    # читаются по курсору.
+    paginator = CursorPaginator(hot_posts(), settings.POSTS_PER_PAGE,
+                                ordering=HOT_ORDERING, keys=HOT_CURSOR_KEYS)
+    return paginator.get_page(request.GET.get('cursor')), paginator
+
+
+@cache_anonymous_page(lambda: 'hot')
+async def hot(request):
+    page, paginator = await sync_to_async(hot_page)(request)
+
+    context = {
+        'page': page,
+        'paginator': paginator,
+        'hot': True,
+    }
+
+    return await render_async(request, 'hot.html', context)
+
+
+@sync_to_async
+def group_feed_page(request, slug):
+    group = group_header(slug)
+    if group is None:
+        raise Http404('Группа не найдена')
+    page, paginator = group_page(request, group)
+    # Посты загружаются здесь, в потоке, а не при отрисовке шаблона.
+    page.object_list = list(page.object_list)
+    return group, page, paginator
+
+
+@cache_anonymous_page(group_namespace)
+async def group_posts(request, slug):
+    # Шапка группы и первые страницы ленты читаются из кэша.
+    group, page, paginator = await group_feed_page(request, slug)
 
     context = {
         'group': group,
@@ -33,7 +107,7 @@ def group_posts(request, slug):
         'paginator': paginator,
     }
 
-    return render(request, 'group.html', context)
+    return await render_async(request, 'group.html', context)
 
 
 @login_required
@@ -44,6 +118,12 @@ def new_post(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        # Раскладка по лентам, миниатюры и поисковый индекс выполняются
+        # фоновыми задачами, поэтому публикация стоит одинаково при любом
+        # числе подписчиков.
+        fan_out.enqueue(post.pk)
+        schedule_thumbnails(post)
+        transaction.on_commit(lambda: publish_post(post.pk))
         return redirect('index')
 
     return render(request, 'new_post.html', {'form': form, })
@@ -61,7 +141,17 @@ def post_edit(request, username, post_id):
         instance=post,
     )
     if form.is_valid():
-        form.save()
+        # Сохраняем только поля формы, чтобы не затереть счётчики,
+        # изменённые параллельными запросами.
+        post = form.save(commit=False)
+        update_fields = list(form.Meta.fields)
+        image_changed = 'image' in form.changed_data
+        if image_changed:
+            post.image_thumbnail = ''
+            update_fields.append('image_thumbnail')
+        post.save(update_fields=update_fields)
+        if image_changed:
+            schedule_thumbnails(post)
         return redirect('post', username=username, post_id=post_id)
 
     context = {
@@ -73,16 +163,24 @@ def post_edit(request, username, post_id):
     return render(request, 'new_post.html', context)
 
 
-def profile(request, username):
-    user = get_object_or_404(User, username=username)
-    post_list = user.posts.all()
-    paginator = Paginator(post_list, settings.POSTS_PER_PAGE)
-    page = paginator.get_page(request.GET.get('page'))
-
-    is_follow = (
-            request.user.is_authenticated and
-            request.user != user and
-            user.following.filter(user=request.user, author=user).exists()
+@cache_anonymous_page(profile_namespace)
+async def profile(request, username):
+    viewer = await authenticated_user(request)
+    post_list = Post.objects.feed().filter(author__username=username)
+    follows = Follow.objects.filter(user=viewer, author__username=username)
+    own_profile = viewer is not None and viewer.username == username
+    user, (page, paginator), is_follow, suggestions = await gather_queries(
+        lambda: get_object_or_404(
+            User.objects.select_related('counters'),
+            username=username,
+        ),
+        lambda: evaluated_page(request, post_list),
+        lambda: (
+            viewer is not None and
+            viewer.username != username and
+            follows.exists()
+        ),
+        lambda: list(follow_suggestions(viewer)) if own_profile else [],
     )
 
     context = {
@@ -90,22 +188,57 @@ def profile(request, username):
         'paginator': paginator,
         'author': user,
         'is_follow': is_follow,
+        'suggestions': suggestions,
     }
 
-    return render(request, 'profile.html', context)
+    return await render_async(request, 'profile.html', context)
 
 
-def post_view(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, id=post_id)
+async def post_view(request, username, post_id):
+    # Пост, комментарии и счётчики автора читаются параллельно.
+    post, comments, counters = await gather_queries(
+        lambda: get_object_or_404(
+            Post.objects.feed(),
+            author__username=username,
+            id=post_id,
+        ),
+        lambda: comments_page(request, post_id),
+        lambda: UserCounters.objects.filter(
+            user__username=username).first(),
+    )
+    if counters is not None:
+        post.author.counters = counters
 
     context = {
         'post': post,
         'author': post.author,
-        'comments': post.comments.all(),
+        'comments': comments,
         'form': CommentForm(),
     }
 
-    return render(request, 'post.html', context)
+    return await render_async(request, 'post.html', context)
+
+
+async def post_comments(request, username, post_id):
+    """Фрагмент со следующей страницей комментариев для кнопки
+    «Показать ещё»."""
+    post, comments = await gather_queries(
+        lambda: get_object_or_404(
+            Post.objects.select_related('author').only(
+                'id', 'author__username'),
+            author__username=username,
+            id=post_id,
+        ),
+        lambda: comments_page(request, post_id),
+    )
+
+    context = {
+        'post': post,
+        'author': post.author,
+        'comments': comments,
+    }
+
+    return await render_async(request, 'posts/comment_list.html', context)
 
 
 @login_required
@@ -118,30 +251,53 @@ def add_comment(request, username, post_id):
         comment.post = post
         comment.author = request.user
         comment.save()
+        transaction.on_commit(lambda: publish_comment(post.pk))
 
     return redirect('post', username=username, post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, settings.POSTS_PER_PAGE)
-    page = paginator.get_page(request.GET.get('page'))
+    post_list = timeline_posts(request.user)
+    page, paginator = paginate(request, post_list,
+                               ordering=TIMELINE_ORDERING,
+                               keys=TIMELINE_CURSOR_KEYS)
 
     context = {
         'page': page,
         'paginator': paginator,
+        'suggestions': list(follow_suggestions(request.user)),
     }
 
     return render(request, 'follow.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    # Результаты упорядочены по релевантности, keyset-пагинация к ним
+    # неприменима, поэтому страницы нумерованные.
+    paginator = Paginator(get_backend().search(query),
+                          settings.POSTS_PER_PAGE)
+    page = paginator.get_page(request.GET.get('page'))
+
+    context = {
+        'query': query,
+        'page': page,
+        'paginator': paginator,
+    }
+
+    return render(request, 'search.html', context)
+
+
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user == author:
         return redirect('profile', username=username)
-    Follow.objects.get_or_create(user=request.user, author=author)
+    _, created = Follow.objects.get_or_create(user=request.user,
+                                              author=author)
+    if created:
+        backfill_timeline.enqueue(request.user.id, author.id)
 
     return redirect('profile', username=username)
 
@@ -151,6 +307,9 @@ def profile_unfollow(request, username):
     follow = get_object_or_404(Follow, user=request.user,
                                author__username=username)
     follow.delete()
+    trim(request.user, follow.author)
+    if left_popular(follow.author):
+        catch_up.enqueue(follow.author_id)
 
     return redirect('profile', username=username)
 
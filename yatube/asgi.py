@@ -0,0 +1,26 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+django_application = get_asgi_application()
+
+from posts.live import LIVE_PREFIX, live_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # Django 3.2 не умеет асинхронно отдавать потоковые ответы, поэтому
+    # долгие SSE-соединения обслуживает отдельное ASGI-приложение.
+    if scope['type'] == 'http' and scope['path'].startswith(LIVE_PREFIX):
+        return await live_application(scope, receive, send)
+    return await django_application(scope, receive, send)
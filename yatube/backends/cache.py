@@ -0,0 +1,22 @@
+"""Кэш с подсчётом попаданий и промахов для PerformanceMiddleware."""
+from django.core.cache.backends import filebased, locmem
+
+from yatube.performance import record_cache
+
+_missing = object()
+
+
+class CacheMetricsMixin:
+    # get_many и get_or_set базового класса читают через get.
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _missing, version)
+        record_cache(value is not _missing)
+        return default if value is _missing else value
+
+
+class FileBasedCache(CacheMetricsMixin, filebased.FileBasedCache):
+    pass
+
+
+class LocMemCache(CacheMetricsMixin, locmem.LocMemCache):
+    pass
@@ -0,0 +1,73 @@
+"""SQLite с настройками для параллельной записи.
+
+Каждое новое соединение получает PRAGMA из OPTIONS['pragmas']: журнал
+WAL, при котором читатели не ждут писателя, synchronous=NORMAL и
+отображение файла в память; время ожидания блокировки задаёт
+OPTIONS['timeout'] модуля sqlite3. Транзакции открываются как
+BEGIN IMMEDIATE (OPTIONS['transaction_mode']), чтобы писатель брал
+блокировку сразу, а не получал «database is locked» при попытке
+повысить её посреди транзакции.
+
+Django 3.2 не умеет CONN_HEALTH_CHECKS, поэтому проверка долгоживущих
+соединений (CONN_MAX_AGE) сделана здесь: при первом обращении к базе в
+запросе соединение проверяется запросом SELECT 1 и пересоздаётся, если
+перестало работать.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+
+    @property
+    def pragmas(self):
+        return self.settings_dict['OPTIONS'].get('pragmas', {})
+
+    @property
+    def transaction_mode(self):
+        return self.settings_dict['OPTIONS'].get('transaction_mode')
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
+        else:
+            super()._start_transaction_under_autocommit()
+
+    def is_usable(self):
+        try:
+            self.connection.execute('SELECT 1')
+        except base.Database.Error:
+            return False
+        return True
+
+    def connect(self):
+        super().connect()
+        # Свежее соединение проверять не нужно.
+        self.health_check_done = True
+
+    def ensure_connection(self):
+        if (self.connection is not None and not self.health_check_done
+                and self.settings_dict.get('CONN_HEALTH_CHECKS')):
+            self.health_check_done = True
+            if not self.in_atomic_block and not self.is_usable():
+                self.close()
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        # Вызывается в начале и в конце каждого запроса.
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
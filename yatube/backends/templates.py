@@ -0,0 +1,18 @@
+"""Шаблоны Django с замером времени отрисовки для PerformanceMiddleware."""
+from django.template.backends import django
+
+from yatube.performance import template_timer
+
+
+class Template(django.Template):
+    def render(self, context=None, request=None):
+        with template_timer():
+            return super().render(context, request)
+
+
+class DjangoTemplates(django.DjangoTemplates):
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
@@ -0,0 +1,283 @@
+"""Замеры каждого запроса.
+
+PerformanceMiddleware собирает время ответа, число и время запросов к
+базе, время отрисовки шаблонов и попадания в кэш, отдаёт их заголовком
+Server-Timing, копит по страницам для /metrics/ (текстовый формат
+Prometheus) и пишет в лог медленные запросы со списком SQL.
+
+Шаблоны и кэш замеряются своими бэкендами: yatube.backends.templates и
+yatube.backends.cache. Метрики хранятся в памяти процесса, у каждого
+воркера gunicorn — свои.
+"""
+import asyncio
+import hmac
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import Http404, HttpResponse
+
+logger = logging.getLogger('yatube.performance')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Замеры одного запроса. Потоки sync_to_async получают копию
+    контекста с тем же объектом, поэтому их запросы к базе тоже
+    учитываются."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.duration = 0
+        self.db_queries = 0
+        self.db_time = 0
+        self.queries = []
+        self.template_time = 0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._lock = threading.Lock()
+
+    def add_query(self, sql, duration):
+        with self._lock:
+            self.db_queries += 1
+            self.db_time += duration
+            if len(self.queries) < settings.SLOW_REQUEST_MAX_QUERIES:
+                self.queries.append((sql, duration))
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def server_timing(self):
+        return ', '.join([
+            f'total;dur={self.duration * 1000:.1f}',
+            f'db;dur={self.db_time * 1000:.1f};'
+            f'desc="{self.db_queries} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'cache;desc="{self.cache_hits} hits / '
+            f'{self.cache_misses} misses"',
+        ])
+
+
+def record_cache(hit):
+    metrics = _current.get()
+    if metrics is None:
+        return
+    if hit:
+        metrics.cache_hits += 1
+    else:
+        metrics.cache_misses += 1
+
+
+@contextmanager
+def template_timer():
+    """Замеряет отрисовку шаблона; вложенные render_to_string внутри
+    внешней отрисовки не учитываются второй раз."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    metrics.template_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.template_depth -= 1
+        if not metrics.template_depth:
+            metrics.template_time += time.perf_counter() - started
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, time.perf_counter() - started)
+
+
+def instrument(connection):
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+@receiver(connection_created)
+def instrument_new_connection(sender, connection, **kwargs):
+    # Соединения потоков sync_to_async создаются уже во время запроса.
+    instrument(connection)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+def _labels(**labels):
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"'))
+        for name, value in labels.items()
+    )
+    return '{' + pairs + '}'
+
+
+class MetricsRegistry:
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.requests = defaultdict(int)
+        self.durations = {}
+        self.totals = defaultdict(lambda: defaultdict(float))
+
+    def observe(self, view, method, status, metrics):
+        with self._lock:
+            self.requests[view, method, status] += 1
+            if view not in self.durations:
+                self.durations[view] = Histogram(self.buckets)
+            self.durations[view].observe(metrics.duration)
+            totals = self.totals[view]
+            totals['db_queries_total'] += metrics.db_queries
+            totals['db_duration_seconds_total'] += metrics.db_time
+            totals['template_duration_seconds_total'] += (
+                metrics.template_time)
+            totals['cache_hits_total'] += metrics.cache_hits
+            totals['cache_misses_total'] += metrics.cache_misses
+            if metrics.duration >= settings.SLOW_REQUEST_SECONDS:
+                totals['slow_requests_total'] += 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            lines.append('# TYPE yatube_requests_total counter')
+            for (view, method, status), count in sorted(
+                    self.requests.items()):
+                labels = _labels(view=view, method=method, status=status)
+                lines.append(f'yatube_requests_total{labels} {count}')
+
+            lines.append('# TYPE yatube_request_duration_seconds histogram')
+            for view, histogram in sorted(self.durations.items()):
+                name = 'yatube_request_duration_seconds'
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    labels = _labels(view=view, le=bound)
+                    lines.append(f'{name}_bucket{labels} {count}')
+                labels = _labels(view=view, le='+Inf')
+                lines.append(f'{name}_bucket{labels} {histogram.count}')
+                labels = _labels(view=view)
+                lines.append(f'{name}_sum{labels} {histogram.sum}')
+                lines.append(f'{name}_count{labels} {histogram.count}')
+
+            names = sorted({name for totals in self.totals.values()
+                            for name in totals})
+            for name in names:
+                lines.append(f'# TYPE yatube_{name} counter')
+                for view, totals in sorted(self.totals.items()):
+                    labels = _labels(view=view)
+                    lines.append(f'yatube_{name}{labels} {totals[name]:g}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else '<unresolved>'
+
+
+def _log_slow_request(request, metrics):
+    queries = '\n'.join(
+        f'  {duration * 1000:.1f} ms  {sql}'
+        for sql, duration in metrics.queries
+    )
+    logger.warning(
+        'Медленный запрос %s %s: %.3f с, запросов к базе %d (%.3f с), '
+        'шаблоны %.3f с\n%s',
+        request.method, request.get_full_path(), metrics.duration,
+        metrics.db_queries, metrics.db_time, metrics.template_time, queries,
+    )
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics, token = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics, token = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def start(self):
+        metrics = RequestMetrics()
+        for connection in connections.all():
+            instrument(connection)
+        return metrics, _current.set(metrics)
+
+    def finish(self, request, response, metrics):
+        metrics.finish()
+        registry.observe(_view_name(request), request.method,
+                         response.status_code, metrics)
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = metrics.server_timing()
+        if metrics.duration >= settings.SLOW_REQUEST_SECONDS:
+            _log_slow_request(request, metrics)
+        return response
+
+
+def _metrics_allowed(request):
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return False
+    if not settings.METRICS_TOKEN:
+        return False
+    return hmac.compare_digest(
+        request.META.get('HTTP_AUTHORIZATION', '').encode(),
+        f'Bearer {settings.METRICS_TOKEN}'.encode())
+
+
+def metrics_view(request):
+    """Метрики процесса в текстовом формате Prometheus, только для
+    адресов из METRICS_ALLOWED_IPS с токеном METRICS_TOKEN."""
+    if not _metrics_allowed(request):
+        raise Http404
+    return HttpResponse(registry.render(),
+                        content_type='text/plain; version=0.0.4')
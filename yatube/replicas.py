@@ -0,0 +1,144 @@
+"""Чтение лент с реплик базы.
+
+ReplicaMiddleware отмечает запросы к страницам из REPLICA_READ_VIEWS:
+их чтения ReplicaRouter отправляет на одну из реплик DATABASE_REPLICAS,
+выбранную на весь запрос. Все записи и остальные страницы работают с
+основной базой.
+
+Реплика отстаёт от основной базы, поэтому тот, кто только что писал,
+какое-то время читает с основной базы: если в запросе была запись,
+ответ ставит cookie REPLICA_PIN_COOKIE на REPLICA_PIN_SECONDS секунд.
+По той же причине то, что кладётся в общий кэш, читается внутри
+primary_reads(): иначе устаревшие данные с реплики попали бы в кэш под
+новым поколением и пережили бы отставание реплики.
+"""
+import asyncio
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.urls import Resolver404, resolve
+
+_routing = ContextVar('database_routing', default=None)
+
+# Сессия, не найденная на отставшей реплике, разлогинила бы
+# пользователя, поэтому сессии всегда читаются с основной базы.
+PRIMARY_ONLY_APPS = {'sessions'}
+
+
+class RoutingState:
+    """Маршрутизация одного запроса. Изменяется, а не заменяется, чтобы
+    запись была видна из копий контекста в потоках sync_to_async."""
+
+    def __init__(self, replica=None):
+        self.replica = replica
+        self.wrote = False
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if (state is None or state.wrote or state.replica is None
+                or model._meta.app_label in PRIMARY_ONLY_APPS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            # После записи запрос дочитывает своё с основной базы.
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы, объекты с них связаны между
+        # собой так же.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def primary_reads():
+    """Чтения внутри блока идут на основную базу."""
+    state = _routing.get()
+    if state is None:
+        yield
+        return
+    replica, state.replica = state.replica, None
+    try:
+        yield
+    finally:
+        state.replica = replica
+
+
+def _reads_from_replica(request):
+    if not settings.DATABASE_REPLICAS:
+        return False
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    try:
+        pinned_until = float(request.COOKIES[settings.REPLICA_PIN_COOKIE])
+    except (KeyError, ValueError):
+        pinned_until = 0
+    if pinned_until > time.time():
+        return False
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return False
+    return match.url_name in settings.REPLICA_READ_VIEWS
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Так Django узнаёт, что __call__ возвращает корутину, и не
+            # оборачивает middleware в sync_to_async.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.finish(state, response)
+
+    async def __acall__(self, request):
+        state, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.finish(state, response)
+
+    def start(self, request):
+        replica = None
+        if _reads_from_replica(request):
+            replica = random.choice(settings.DATABASE_REPLICAS)
+        state = RoutingState(replica)
+        return state, _routing.set(state)
+
+    def finish(self, state, response):
+        if state.wrote:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                str(time.time() + settings.REPLICA_PIN_SECONDS),
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
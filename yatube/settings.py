@@ -38,32 +38,38 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django_extensions',
+    'rest_framework',
     'rest_framework.authtoken',
     'sorl.thumbnail',
-    'posts',
+    'posts.apps.PostsConfig',
     'users',
     'about',
-    'debug_toolbar',
+    'api',
 ]
 
 MIDDLEWARE = [
+    'yatube.performance.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'yatube.static.WhiteNoiseMiddleware',
+    'yatube.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'yatube.backends.templates.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -72,24 +78,73 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'posts.live.live_context',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
+ASGI_APPLICATION = 'yatube.asgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Бэкенд yatube.backends.sqlite3 применяет pragmas к каждому новому
+# соединению, открывает транзакции в режиме transaction_mode и проверяет
+# долгоживущие соединения, если включён CONN_HEALTH_CHECKS.
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yatube.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # busy timeout: сколько секунд писатель ждёт чужую блокировку
+            # записи, прежде чем получить «database is locked».
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {
+                'journal_mode': 'wal',
+                'synchronous': 'normal',
+                'mmap_size': 256 * 1024 * 1024,
+                'temp_store': 'memory',
+            },
+        },
     }
 }
 
+# Реплики только для чтения — файлы SQLite через запятую в
+# YATUBE_DATABASE_REPLICAS. Команда sync_replicas копирует на них
+# основную базу. В тестах реплики указывают на тестовую основную базу.
+replica_names = os.environ.get('YATUBE_DATABASE_REPLICAS', '').split(',')
+for number, name in enumerate(filter(None, replica_names)):
+    # Реплики только читают: BEGIN IMMEDIATE брал бы на них блокировку
+    # записи и мешал sync_replicas.
+    replica_options = dict(DATABASES['default']['OPTIONS'])
+    del replica_options['transaction_mode']
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME': name,
+        'OPTIONS': replica_options,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['yatube.replicas.ReplicaRouter']
+
+# Страницы, которые читают с реплик (имена URL).
+REPLICA_READ_VIEWS = ['index', 'hot', 'group', 'profile', 'post',
+                      'post_comments', 'follow_index']
+# Сколько секунд после записи пользователь читает с основной базы.
+REPLICA_PIN_COOKIE = 'primary_pin'
+REPLICA_PIN_SECONDS = 5
+
+
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -133,6 +188,24 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки больше этого размера пишутся на диск кусками, а не в память.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+
+IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+IMAGE_MAX_PIXELS = 50 * 1000 * 1000
+# Картинки больше по стороне или по весу пересохраняются уменьшенными.
+IMAGE_MAX_DIMENSION = 2048
+IMAGE_REENCODE_SIZE = 1024 * 1024
+
+# Как отдавать media, если их не раздаёт веб-сервер напрямую:
+# 'django' — сам Django с ETag и Range, 'x-accel-redirect' — передать
+# файл nginx через internal-location MEDIA_ACCEL_REDIRECT_LOCATION,
+# 'x-sendfile' — передать файл Apache (mod_xsendfile).
+MEDIA_SERVING = os.environ.get('YATUBE_MEDIA_SERVING', 'django')
+MEDIA_ACCEL_REDIRECT_LOCATION = '/protected-media/'
+# Файлы без хеша в имени могут смениться, их кэшируем ненадолго.
+MEDIA_CACHE_MAX_AGE = 60 * 60
+
 # Login
 
 LOGIN_URL = '/auth/login/'
@@ -144,21 +217,131 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 # Cache
 
+# Кэш общий для всех процессов gunicorn: страницы, фрагменты карточек
+# и метаданные миниатюр видны каждому воркеру. Тесты работают со своим
+# кэшем в памяти (yatube.test_runner).
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'yatube.backends.cache.FileBasedCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_LOCATION',
+            os.path.join(BASE_DIR, 'cache'),
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
     }
 }
 
+TEST_RUNNER = 'yatube.test_runner.TestRunner'
+
+# Страницы для гостей сбрасываются по событиям, таймаут лишь
+# ограничивает размер кэша.
+PAGE_CACHE_TIMEOUT = 60 * 60
+
 POSTS_PER_PAGE = 10
 
+# Шапка группы и номера её последних постов хранятся в кэше; первые
+# страницы группы собираются по ним без COUNT(*). Кольцо должно быть
+# длиннее страницы.
+GROUP_RECENT_POSTS = 100
+GROUP_CACHE_TIMEOUT = 60 * 60
+# Комментарии на странице поста; остальные подгружаются кнопкой
+# «Показать ещё».
+COMMENTS_PER_PAGE = 20
+
+# Лента «Горячее»: рейтинг пересчитывает команда recompute_hot_scores
+# (например, раз в несколько минут из cron или с ключом --every).
+HOT_WINDOW_HOURS = 24
+HOT_HALF_LIFE_HOURS = 12
+HOT_FEED_SIZE = 500
+
+# Рекомендации «Кого почитать» пересчитывает команда
+# recommend_follows. Сколько авторов хранить каждому пользователю, сколько
+# показывать, авторы с каким числом подписчиков ещё говорят о сходстве
+# читателей и голоса скольких самых похожих читателей учитывать.
+FOLLOW_SUGGESTIONS = 20
+FOLLOW_SUGGESTIONS_SHOWN = 5
+FOLLOW_SUGGESTIONS_MAX_FOLLOWERS = 1000
+FOLLOW_SUGGESTIONS_NEIGHBOURS = 50
+
+# Потоки команды warm_thumbnails, которая готовит миниатюры картинок
+# уже сохранённых постов.
+THUMBNAIL_WORKERS = 2
+
+# Очередь фоновых задач (posts.task_queue) разбирает команда run_tasks:
+# раскладку постов по лентам, миниатюры и поисковый индекс. Сколько раз
+# пробовать упавшую задачу, через сколько секунд повторить её в первый
+# раз (дальше задержка удваивается), на сколько секунд обработчик
+# захватывает задачу и как часто проверять пустую очередь.
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_DELAY = 10
+TASK_LEASE_SECONDS = 5 * 60
+TASK_POLL_INTERVAL = 1.0
+
+# 'pages' — нумерованные страницы (?page=N), 'cursor' — keyset-пагинация
+# (?cursor=...), стоимость которой не растёт с глубиной ленты.
+FEED_PAGINATION = 'pages'
+
+# Посты авторов с большим числом подписчиков не раскладываются по лентам
+# подписок при публикации, а добираются при чтении ленты.
+TIMELINE_FAN_OUT_LIMIT = 1000
+
+# Потоки живого обновления лент (Server-Sent Events) работают только
+# под ASGI-сервером, например: uvicorn yatube.asgi:application
+# Раз в столько секунд в тихий поток отправляется комментарий, чтобы
+# прокси не закрывали соединение.
+LIVE_KEEPALIVE = 25
+# Сколько карточек может ждать отправки медленному клиенту.
+LIVE_QUEUE_SIZE = 100
+
+# Бэкенд поиска по постам: SQLiteFTSBackend работает на индексе FTS5,
+# SimpleSearchBackend — на LIKE-запросах для других баз.
+SEARCH_BACKEND = 'posts.search.SQLiteFTSBackend'
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
 
+# Performance
+
+# Замеры запроса в заголовке Server-Timing видны в инструментах
+# разработчика браузера. Заголовок показывает каждому клиенту число и
+# время запросов к базе, поэтому по умолчанию он есть только при DEBUG.
+SERVER_TIMING = DEBUG
+# Запросы дольше стольких секунд пишутся в лог yatube.performance
+# вместе с SQL (не больше SLOW_REQUEST_MAX_QUERIES запросов).
+SLOW_REQUEST_SECONDS = 1.0
+SLOW_REQUEST_MAX_QUERIES = 100
+# Кому отдавать /metrics/: запросам с адресов METRICS_ALLOWED_IPS с
+# заголовком "Authorization: Bearer <METRICS_TOKEN>". За прокси адрес
+# у всех запросов 127.0.0.1, поэтому без токена метрики закрыты.
+METRICS_ALLOWED_IPS = INTERNAL_IPS
+METRICS_TOKEN = os.environ.get('YATUBE_METRICS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'yatube.performance': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
+    },
+}
+
 
 # REST
 
+# Сколько объектов можно создать одним запросом к пакетному API.
+API_BULK_MAX_ITEMS = 1000
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSIONS_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -0,0 +1,32 @@
+"""Раздача статики WhiteNoise в асинхронной цепочке middleware.
+
+WhiteNoiseMiddleware 5.x умеет работать только синхронно, и под ASGI
+Django переключал бы ради него каждый запрос в поток и обратно. Без
+DEBUG файлы статики WhiteNoise находит при запуске, поэтому поиск файла
+— обращение к словарю, и его можно делать прямо в цикле событий.
+"""
+import asyncio
+
+from whitenoise import middleware
+
+
+class WhiteNoiseMiddleware(middleware.WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        response = self.process_request(request)
+        if response is None:
+            response = await self.get_response(request)
+        return response
@@ -0,0 +1,29 @@
+"""Запуск тестов с собственным кэшем.
+
+Кэш сайта — файлы, общие для всех процессов. Тесты вызывают
+cache.clear(), поэтому им нужен отдельный кэш в памяти процесса, иначе
+они стирали бы кэш запущенного сайта, а сайт оставлял бы тестам свои
+записи.
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'yatube.backends.cache.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    }
+}
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_settings = override_settings(CACHES=TEST_CACHES)
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -4,8 +4,9 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.urls import include, path, re_path
-from django.views.static import serve
+from posts.media import serve_media
 from rest_framework.authtoken import views
+from yatube.performance import metrics_view
 
 handler404 = 'posts.views.page_not_found'  # noqa
 handler500 = 'posts.views.server_error'  # noqa
@@ -15,20 +16,19 @@ urlpatterns = [
     path('auth/', include('django.contrib.auth.urls')),
     path('administrator/', admin.site.urls),
     path('api-token-auth/', views.obtain_auth_token),
+    path('api/v1/', include('api.urls')),
+    path('metrics/', metrics_view, name='metrics'),
     path('', include('posts.urls')),
     path('about/', include('about.urls'))
 ]
 
 urlpatterns += staticfiles_urlpatterns()
-urlpatterns += [re_path(r'^media/(?P<path>.*)$', serve,
-                        {'document_root': settings.MEDIA_ROOT, }), ]
+urlpatterns += [re_path(r'^media/(?P<path>.*)$', serve_media), ]
 
 if settings.DEBUG:
     import debug_toolbar
 
     urlpatterns += (path('__debug__/', include(debug_toolbar.urls)),)
 
-    urlpatterns += static(settings.MEDIA_URL,
-                          document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL,
                           document_root=settings.STATIC_ROOT)